@@ -4,6 +4,10 @@ import os
 # Add the parent directory to Python path so we can import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# A serverless instance is frozen between requests, so background news
+# fetches would stall; news is fetched on demand instead
+os.environ.setdefault("NEWS_PREFETCH", "0")
+
 from app import app
 
 # This is the WSGI application that Vercel will call
@@ -1,15 +1,26 @@
 import os
 import logging
+import threading
 from flask import Flask
 from flask_login import LoginManager
 
-# Configure logging for debugging
-logging.basicConfig(level=logging.DEBUG)
+# Log level name, e.g. DEBUG while developing
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper())
 
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 
+# Request timing and the /metrics endpoint
+import metrics
+metrics.init_app(app)
+
+# Gzip large pages and JSON, and serve static files fingerprinted and precompressed
+import compression
+import static_assets
+compression.init_app(app)
+static_assets.init_app(app)
+
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -18,8 +29,8 @@ login_manager.login_message = 'Please log in to access this page.'
 
 @login_manager.user_loader
 def load_user(user_id):
-    from data_store import get_user_by_id
-    return get_user_by_id(user_id)
+    from storage import get_storage
+    return get_storage().get_user_by_id(user_id)
 
 # Import and register blueprints
 from auth_routes import auth
@@ -28,5 +39,18 @@ from routes import main_routes
 app.register_blueprint(auth)
 app.register_blueprint(main_routes)
 
+# Render from the templates compiled at build time, if they are current
+from page_cache import use_compiled_templates
+use_compiled_templates(app)
+
+def prefetch_news():
+    from news_service import warm_news_cache
+    warm_news_cache()
+
+# Fetch every news category in the background so early visitors hit a warm
+# cache; news_service is imported there too, keeping it off the startup path
+if os.environ.get("NEWS_PREFETCH", "1") == "1":
+    threading.Thread(target=prefetch_news, daemon=True).start()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
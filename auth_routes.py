@@ -1,7 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required
 from models import User
-from data_store import save_user, get_user_by_username, load_users
+from password_service import HashingBusyError
+from storage import get_storage, UsernameTakenError
 import uuid
 
 auth = Blueprint("auth", __name__)
@@ -17,8 +18,18 @@ def login():
             flash("Please enter both username and password", "error")
             return render_template("login.html")
         
-        user = get_user_by_username(username)
-        if user and user.check_password(password):
+        user = get_storage().get_user_by_username(username)
+        try:
+            authenticated = user is not None and user.check_password(password)
+            if authenticated and user.password_needs_rehash():
+                # Move the stored hash to the current parameters while we have the password
+                user.set_password(password)
+                get_storage().update_password_hash(user.id, user.password_hash)
+        except HashingBusyError:
+            flash("The server is busy right now. Please try again in a moment.", "error")
+            return render_template("login.html"), 503
+        
+        if authenticated:
             login_user(user)
             flash(f"Welcome back, {username}!", "success")
             return redirect(url_for("main_routes.index"))
@@ -51,17 +62,24 @@ def register():
             return render_template("register.html")
         
         # Check if username already exists
-        if get_user_by_username(username):
+        if get_storage().get_user_by_username(username):
             flash("Username already exists", "error")
             return render_template("register.html")
         
         # Create new user
-        users = load_users()
-        user_id = len(users) + 1
-        user = User(user_id, username)
-        user.set_password(password)
+        user = User(None, username)
+        try:
+            user.set_password(password)
+        except HashingBusyError:
+            flash("The server is busy right now. Please try again in a moment.", "error")
+            return render_template("register.html"), 503
         
-        save_user(user)
+        try:
+            get_storage().create_user(user)
+        except UsernameTakenError:
+            # Someone registered the same name while we were hashing
+            flash("Username already exists", "error")
+            return render_template("register.html")
         login_user(user)
         
         flash(f"Account created successfully! Welcome, {username}!", "success")
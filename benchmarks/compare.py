@@ -0,0 +1,67 @@
+"""Compare two load_test.py --output files, route by route.
+
+Prints p50 and p99 latency and throughput from both runs with the
+change between them, and marks routes whose p99 got worse by more than
+--threshold percent. Exits with status 1 if any did, so it can gate a
+change.
+
+Usage: python benchmarks/compare.py BASELINE.json CANDIDATE.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+
+def load_runs(path):
+    with open(path) as f:
+        report = json.load(f)
+    runs = {}
+    for run in report['runs']:
+        for route, stats in run['routes'].items():
+            runs[(run['posts'], run['backend'], run['mode'], route)] = stats
+    return report.get('commit'), runs
+
+
+def change(old, new):
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10, help='p99 slowdown in percent that counts as a regression')
+    args = parser.parse_args()
+
+    old_commit, old_runs = load_runs(args.baseline)
+    new_commit, new_runs = load_runs(args.candidate)
+    print(f"baseline {old_commit or args.baseline}, candidate {new_commit or args.candidate}")
+
+    regressions = 0
+    group = None
+    for key, new in new_runs.items():
+        old = old_runs.get(key)
+        if not old or not old['requests'] or not new['requests']:
+            continue
+        if key[:3] != group:
+            group = key[:3]
+            print(f"\n{group[0]} posts, {group[1]}, {group[2]}")
+            print(f"  {'route':<40} {'p50 ms':>17} {'p99 ms':>17} {'req/s':>17}")
+        p99_change = change(old['p99_ms'], new['p99_ms'])
+        regressed = p99_change is not None and p99_change > args.threshold
+        regressions += regressed
+        print(f"  {key[3]:<40} "
+              f"{old['p50_ms']:>7.2f} {new['p50_ms']:>7.2f}  "
+              f"{old['p99_ms']:>7.2f} {new['p99_ms']:>7.2f}  "
+              f"{old['throughput']:>7.1f} {new['throughput']:>7.1f}  "
+              f"p99 {p99_change:+6.1f}%{'  REGRESSION' if regressed else ''}")
+
+    if regressions:
+        print(f"\n{regressions} routes regressed by more than {args.threshold:g}% at p99")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
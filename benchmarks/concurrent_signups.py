@@ -0,0 +1,89 @@
+"""Stress user registration with concurrent signups from several processes.
+
+Every worker process runs a pool of threads that create users through the
+storage engine. Each username is submitted twice by different processes,
+so exactly one of the two must win. Afterwards the users are checked for
+lost writes, duplicate usernames and duplicate or skipped ids.
+
+Usage: python benchmarks/concurrent_signups.py [--users 400] [--processes 4] [--threads 8]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def register_all(usernames, threads):
+    """Create users in this process; return (created, rejected) counts"""
+    from models import User
+    from storage import get_storage, UsernameTakenError
+
+    storage = get_storage()
+
+    def register(username):
+        try:
+            storage.create_user(User(None, username))
+            return True
+        except UsernameTakenError:
+            return False
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(register, usernames))
+    return results.count(True), results.count(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--backend', default='json', choices=['json', 'sqlite'])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Set before the workers import data_store so they all share data_dir
+        os.environ['DATA_DIR'] = data_dir
+        os.environ['STORAGE_BACKEND'] = args.backend
+
+        usernames = [f"signup{i}!" for i in range(args.users)]
+        # Each process gets a slice, plus the next process's slice as duplicates
+        chunks = [usernames[i::args.processes] for i in range(args.processes)]
+        jobs = [(chunks[i] + chunks[(i + 1) % args.processes], args.threads)
+                for i in range(args.processes)]
+
+        start = time.perf_counter()
+        with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+            results = pool.starmap(register_all, jobs)
+        elapsed = time.perf_counter() - start
+
+        from storage import get_storage
+        storage = get_storage()
+        users = [storage.get_user_by_username(username) for username in usernames]
+        ids = sorted(user.id for user in users if user is not None)
+        created = sum(created for created, rejected in results)
+        rejected = sum(rejected for created, rejected in results)
+
+        print(f"{args.backend}: {created + rejected} signups in {elapsed:.2f}s "
+              f"({(created + rejected) / elapsed:.0f}/s), {created} created, {rejected} rejected as duplicates")
+        problems = []
+        if created != args.users or rejected != args.users:
+            problems.append(f"expected {args.users} created and {args.users} rejected")
+        if len(ids) != args.users:
+            problems.append(f"{args.users - len(ids)} users missing")
+        if ids != list(range(1, len(ids) + 1)):
+            problems.append("ids are not unique and contiguous")
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        if problems:
+            sys.exit(1)
+        print("OK: every username registered once with a unique id")
+
+
+if __name__ == '__main__':
+    main()
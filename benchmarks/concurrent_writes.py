@@ -0,0 +1,122 @@
+"""Stress post writes from several processes and check none are lost.
+
+Every worker process runs a pool of threads that create posts, like posts
+and comment on them through the storage engine, each write made by its own
+user so every one must survive. A small JOURNAL_COMPACT_BYTES keeps
+snapshot compactions running alongside the writes. Afterwards a fresh
+read of the data is checked for lost posts, likes and comments, and the
+write throughput is reported (run with --group-commit-ms to compare
+waiting for more writes to share each fsync).
+
+Usage: python benchmarks/concurrent_writes.py [--writes 600] [--processes 4] [--threads 8] [--group-commit-ms 0]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Posts every worker likes and comments on
+SHARED_POSTS = 10
+
+
+def write_all(worker, writes, threads, post_ids):
+    """Make writes in this process; return the (op, post_id, user_id, comment_id) of each"""
+    from models import Post, Comment
+    from storage import get_storage
+
+    storage = get_storage()
+
+    def write(n):
+        user_id = worker * writes + n + 1
+        post_id = post_ids[n % len(post_ids)]
+        if n % 3 == 0:
+            post = storage.add_post(Post(str(uuid.uuid4()), user_id, f"writer{user_id}", f"post {n}"))
+            return 'post', post.id, user_id, None
+        if n % 3 == 1:
+            storage.like_post(post_id, user_id)
+            return 'like', post_id, user_id, None
+        comment = Comment(str(uuid.uuid4()), post_id, user_id, f"writer{user_id}", f"comment {n}")
+        storage.add_post_comment(post_id, comment.to_dict())
+        return 'comment', post_id, user_id, comment.id
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(write, range(writes)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writes', type=int, default=600, help='writes per process')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--backend', default='json', choices=['json', 'sqlite'])
+    parser.add_argument('--group-commit-ms', type=float, default=0)
+    parser.add_argument('--compact-bytes', type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Set before the workers import data_store so they all share data_dir
+        os.environ['DATA_DIR'] = data_dir
+        os.environ['STORAGE_BACKEND'] = args.backend
+        os.environ['GROUP_COMMIT_WINDOW_MS'] = str(args.group_commit_ms)
+        os.environ['JOURNAL_COMPACT_BYTES'] = str(args.compact_bytes)
+
+        from models import Post
+        from storage import get_storage
+        storage = get_storage()
+        post_ids = [storage.add_post(Post(str(uuid.uuid4()), 0, 'seed', f"shared {i}")).id
+                    for i in range(SHARED_POSTS)]
+
+        jobs = [(worker, args.writes, args.threads, post_ids) for worker in range(args.processes)]
+        start = time.perf_counter()
+        with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+            results = pool.starmap(write_all, jobs)
+        elapsed = time.perf_counter() - start
+        total = args.writes * args.processes
+        print(f"{args.backend}: {total} writes from {args.processes} processes x {args.threads} threads "
+              f"in {elapsed:.2f}s ({total / elapsed:.0f}/s)")
+
+        # Read back in a fresh process, so nothing comes from this one's caches
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            problems = pool.apply(find_lost_writes, ([write for result in results for write in result],))
+        for problem in problems[:20]:
+            print(f"FAIL: {problem}")
+        if problems:
+            print(f"{len(problems)} writes lost")
+            sys.exit(1)
+        print("OK: every post, like and comment was kept")
+
+
+def find_lost_writes(writes):
+    """Describe each of the writes the stored data is missing"""
+    from storage import get_storage
+
+    storage = get_storage()
+    posts = storage.get_posts_by_ids({post_id for _, post_id, _, _ in writes})
+    comment_ids = {post_id: {comment['id'] for comment in storage.get_post_comments(post_id)}
+                   for op, post_id, _, _ in writes if op == 'comment'}
+    problems = []
+    for op, post_id, user_id, comment_id in writes:
+        post = posts.get(post_id)
+        if post is None:
+            problems.append(f"post {post_id} missing")
+        elif op == 'like' and not post.has_liked(user_id):
+            problems.append(f"like by {user_id} on {post_id} missing")
+        elif op == 'comment' and comment_id not in comment_ids[post_id]:
+            problems.append(f"comment {comment_id} on {post_id} missing")
+    expected = {post_id: sum(1 for op, other, _, _ in writes if op == 'comment' and other == post_id)
+                for post_id in comment_ids}
+    for post_id, count in expected.items():
+        if posts[post_id].comment_count != count:
+            problems.append(f"post {post_id} counts {posts[post_id].comment_count} comments, expected {count}")
+    return problems
+
+
+if __name__ == '__main__':
+    main()
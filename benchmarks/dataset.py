@@ -0,0 +1,123 @@
+"""Generate a seeded synthetic dataset into a scratch data directory.
+
+Writes users.json, posts.json, follows.json and the per-post comment
+files the JSON storage engine reads. Activity is skewed the way real feeds are: a few
+users write most posts, and likes, reactions and comments pile up on a
+few popular posts while most get little or none. Post text is drawn from
+a Zipf-distributed vocabulary, so search has common and rare terms. The
+same seed always produces the same dataset.
+
+Every user has the password PASSWORD.
+
+Usage: python benchmarks/dataset.py DATA_DIR [--users 500] [--posts 10000] [--seed 1]
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+
+from models import REACTION_TYPES, Post
+from password_service import PASSWORD_HASH_METHOD
+
+PASSWORD = 'bench-password1'
+VOCABULARY = [f"w{i}" for i in range(5000)]
+# Zipf weights: the word of rank r is drawn with probability proportional to 1/r
+_CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+START = datetime(2025, 1, 1)
+
+
+def username(user_id):
+    return f"user{user_id}!"
+
+
+def words(rng, count):
+    return " ".join(rng.choices(VOCABULARY, cum_weights=_CUM_WEIGHTS, k=count))
+
+
+def skewed_count(rng, alpha, limit):
+    """A heavy-tailed count: usually 0 or 1, occasionally close to limit"""
+    return min(limit, int(rng.paretovariate(alpha)) - 1)
+
+
+def generate(data_dir, user_count, post_count, seed=1):
+    """Write the dataset to data_dir and return its post ids, most popular first"""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(data_dir, 'comments'), exist_ok=True)
+
+    # One hash shared by every user; hashing thousands of passwords would take minutes
+    password_hash = generate_password_hash(PASSWORD, method=PASSWORD_HASH_METHOD)
+    users = [{'id': user_id, 'username': username(user_id), 'password_hash': password_hash,
+              'profile_picture': None, 'created_at': START.isoformat()}
+             for user_id in range(1, user_count + 1)]
+    user_ids = list(range(1, user_count + 1))
+    # Authors and commenters are Zipf-distributed over the users too
+    user_weights = list(itertools.accumulate(1 / rank for rank in range(1, user_count + 1)))
+
+    posts, popularity = [], []
+    for i in range(post_count):
+        author = rng.choices(user_ids, cum_weights=user_weights)[0]
+        timestamp = START + timedelta(seconds=i * 60 + rng.randint(0, 59))
+        post = Post(f"post-{i}", author, username(author), words(rng, rng.randint(5, 30)), timestamp.isoformat(),
+                    likes=rng.sample(user_ids, skewed_count(rng, 1.2, user_count)))
+        for user_id in rng.sample(user_ids, skewed_count(rng, 1.5, user_count)):
+            post.set_reaction(user_id, rng.choice(REACTION_TYPES))
+
+        comments = []
+        for j in range(skewed_count(rng, 1.3, 200)):
+            commenter = rng.choices(user_ids, cum_weights=user_weights)[0]
+            comments.append({
+                'id': f"comment-{i}-{j}",
+                'post_id': post.id,
+                'user_id': commenter,
+                'username': username(commenter),
+                'content': words(rng, rng.randint(3, 15)),
+                'timestamp': (timestamp + timedelta(seconds=j + 1)).isoformat()
+            })
+        if comments:
+            with open(os.path.join(data_dir, 'comments', f"{post.id}.jsonl"), 'w') as f:
+                f.writelines(json.dumps(comment) + "\n" for comment in comments)
+            for comment in comments:
+                post.add_comment(comment)
+        posts.append(post)
+        popularity.append((post.like_count + post.comment_count, post.id))
+
+    # Everyone follows a few users, the prolific authors most often, so they
+    # have the most followers to fan their posts out to
+    follows = {}
+    for user_id in user_ids:
+        followees = set(rng.choices(user_ids, cum_weights=user_weights, k=skewed_count(rng, 1.2, 50) + 1))
+        followees.discard(user_id)
+        if followees:
+            follows[str(user_id)] = sorted(followees)
+
+    with open(os.path.join(data_dir, 'users.json'), 'w') as f:
+        json.dump(users, f)
+    with open(os.path.join(data_dir, 'follows.json'), 'w') as f:
+        json.dump(follows, f)
+    with open(os.path.join(data_dir, 'posts.json'), 'w') as f:
+        json.dump([post.to_dict() for post in posts], f)
+    popularity.sort(reverse=True)
+    return [post_id for _, post_id in popularity]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('data_dir')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    generate(args.data_dir, args.users, args.posts, args.seed)
+    print(f"Wrote {args.users} users and {args.posts} posts to {args.data_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,423 @@
+"""Load-test every route on synthetic datasets of several sizes.
+
+For each dataset size and storage engine, a seeded synthetic dataset
+(see dataset.py) is written to a scratch directory and a fresh process
+serves the app from it, with news coming from a local stub upstream
+(see news_stub.py). Every route is then timed twice: one request at a
+time through the Flask test client, which measures the application
+alone, and under concurrent load against a threaded WSGI server, from
+client threads in this process so they do not compete with the server
+for the GIL. Throughput and p50/p95/p99 latency are reported per route,
+and --output writes them as JSON to diff between commits with compare.py.
+
+Usage: python benchmarks/load_test.py [--sizes 1000,10000] [--backends json,sqlite] [--output results.json]
+"""
+import argparse
+import copy
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dataset
+
+# weight is the route's share of the concurrent mix; revalidate sends the
+# ETag from the previous response; relogin logs the client back in after
+Route = namedtuple('Route', 'name method build weight revalidate relogin', defaults=(False, False))
+
+# Printed by the serving process once it accepts requests
+SERVING = 'serving at'
+
+_new_users = itertools.count(1)
+
+
+def register_form(targets, rng):
+    name = f"bench{os.getpid()}x{next(_new_users)}!"
+    return '/register', {'data': {'username': name, 'password': dataset.PASSWORD,
+                                  'confirm_password': dataset.PASSWORD}}
+
+
+ROUTES = [
+    Route('GET /', 'GET', lambda t, rng: ('/', {}), 10),
+    Route('GET / (revalidate)', 'GET', lambda t, rng: ('/', {}), 10, revalidate=True),
+    Route('GET /?feed=following', 'GET', lambda t, rng: ('/', {'query_string': {'feed': 'following'}}), 4),
+    Route('GET /?feed=trending', 'GET', lambda t, rng: ('/', {'query_string': {'feed': 'trending'}}), 3),
+    Route('GET /news', 'GET', lambda t, rng: ('/news', {}), 3),
+    Route('GET /search', 'GET', lambda t, rng: ('/search', {'query_string': {'q': t.query(rng)}}), 3),
+    Route('GET /profile', 'GET', lambda t, rng: ('/profile', {}), 4),
+    Route('POST /api/posts', 'POST', lambda t, rng: ('/api/posts', {'json': {'content': t.text(rng)}}), 2),
+    Route('POST /api/posts/<post_id>/like', 'POST',
+          lambda t, rng: (f"/api/posts/{t.post(rng)}/like", {}), 6),
+    Route('POST /api/posts/<post_id>/react', 'POST',
+          lambda t, rng: (f"/api/posts/{t.post(rng)}/react", {'json': {'reaction': t.reaction(rng)}}), 4),
+    Route('POST /api/posts/<post_id>/comments', 'POST',
+          lambda t, rng: (f"/api/posts/{t.post(rng)}/comments", {'json': {'content': t.text(rng)}}), 3),
+    Route('GET /api/posts/<post_id>/comments', 'GET',
+          lambda t, rng: (f"/api/posts/{t.post(rng)}/comments", {}), 6),
+    Route('POST /api/batch', 'POST', lambda t, rng: ('/api/batch', {'json': {'operations': t.operations(rng, 20)}}), 2),
+    Route('GET /api/feed', 'GET', lambda t, rng: ('/api/feed', {}), 10),
+    Route('GET /api/feed (revalidate)', 'GET', lambda t, rng: ('/api/feed', {}), 10, revalidate=True),
+    Route('GET /api/timeline', 'GET', lambda t, rng: ('/api/timeline', {}), 6),
+    Route('GET /api/timeline (revalidate)', 'GET', lambda t, rng: ('/api/timeline', {}), 4, revalidate=True),
+    Route('GET /api/trending', 'GET', lambda t, rng: ('/api/trending', {'query_string': {'window': t.window(rng)}}), 3),
+    Route('POST /api/users/<user_id>/follow', 'POST', lambda t, rng: (f"/api/users/{t.followee(rng)}/follow", {}), 2),
+    Route('DELETE /api/users/<user_id>/follow', 'DELETE',
+          lambda t, rng: (f"/api/users/{t.followee(rng)}/follow", {}), 1),
+    Route('GET /api/search', 'GET', lambda t, rng: ('/api/search', {'query_string': {'q': t.query(rng)}}), 4),
+    Route('GET /api/users/<user_id>/posts', 'GET', lambda t, rng: (f"/api/users/{t.user(rng)}/posts", {}), 4),
+    Route('GET /api/stream', 'GET', lambda t, rng: ('/api/stream', {}), 1),
+    Route('GET /api/events', 'GET', lambda t, rng: ('/api/events', {'query_string': {'since': t.event_id()}}), 4),
+    Route('GET /api/news', 'GET', lambda t, rng: ('/api/news', {}), 2),
+    Route('GET /api/news/<category>', 'GET', lambda t, rng: (f"/api/news/{t.category(rng)}", {}), 2),
+    Route('GET /login', 'GET', lambda t, rng: ('/login', {}), 1),
+    Route('POST /login', 'POST', lambda t, rng: ('/login', {'data': {'username': dataset.username(t.user(rng)),
+                                                                       'password': dataset.PASSWORD}}), 1),
+    Route('GET /register', 'GET', lambda t, rng: ('/register', {}), 1),
+    Route('POST /register', 'POST', register_form, 1),
+    Route('GET /logout', 'GET', lambda t, rng: ('/logout', {}), 1, relogin=True),
+    Route('GET /metrics', 'GET', lambda t, rng: ('/metrics', {}), 1),
+]
+
+
+class Targets:
+    """Picks the posts, users and queries requests are made against"""
+
+    def __init__(self, data_dir, last_event_id):
+        from models import REACTION_TYPES
+        from news_service import NEWS_CATEGORIES
+        from trending import TRENDING_WINDOWS
+        with open(os.path.join(data_dir, 'posts.json')) as f:
+            posts = json.load(f)
+        with open(os.path.join(data_dir, 'users.json')) as f:
+            self.user_ids = [user['id'] for user in json.load(f)]
+        # Popular posts get most of the traffic
+        posts.sort(key=lambda post: len(post['likes']) + post.get('comment_count', 0), reverse=True)
+        self.post_ids = [post['id'] for post in posts]
+        self._post_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(posts) + 1)))
+        # Users are Zipf-weighted by id in the dataset, so the first write the most
+        self._user_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(self.user_ids) + 1)))
+        self._last_event_id = last_event_id
+        self._reactions = REACTION_TYPES
+        self._categories = list(NEWS_CATEGORIES)
+        self._windows = list(TRENDING_WINDOWS)
+        # The user requests are made as, set by for_user
+        self.viewer = None
+
+    def for_user(self, user_id):
+        """These targets, for requests made as user_id"""
+        targets = copy.copy(self)
+        targets.viewer = user_id
+        return targets
+
+    def post(self, rng):
+        return rng.choices(self.post_ids, cum_weights=self._post_weights)[0]
+
+    def user(self, rng):
+        return rng.choice(self.user_ids)
+
+    def followee(self, rng):
+        """A user other than the viewer, prolific authors most often"""
+        while True:
+            user_id = rng.choices(self.user_ids, cum_weights=self._user_weights)[0]
+            if user_id != self.viewer:
+                return user_id
+
+    def reaction(self, rng):
+        return rng.choice(self._reactions)
+
+    def category(self, rng):
+        return rng.choice(self._categories)
+
+    def window(self, rng):
+        return rng.choice(self._windows)
+
+    def text(self, rng):
+        return dataset.words(rng, rng.randint(5, 20))
+
+    def operations(self, rng, count):
+        operations = []
+        for _ in range(count):
+            op = rng.choice(('toggle_like', 'react', 'comment'))
+            operation = {'op': op, 'post_id': self.post(rng)}
+            if op == 'react':
+                operation['reaction'] = self.reaction(rng)
+            elif op == 'comment':
+                operation['content'] = self.text(rng)
+            operations.append(operation)
+        return operations
+
+    def query(self, rng):
+        return dataset.words(rng, rng.randint(1, 2))
+
+    def event_id(self):
+        # A client that is a few events behind
+        return self._last_event_id() - 5
+
+
+class TestClient:
+    """Sends requests through the Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self, method, path, **kwargs):
+        response = self.client.open(path, method=method, **kwargs)
+        return response.status_code, response.headers.get('ETag')
+
+
+class HTTPClient:
+    """Sends requests to a running server over HTTP"""
+
+    def __init__(self, base):
+        import requests
+        self.base = base
+        self.session = requests.Session()
+
+    def send(self, method, path, query_string=None, **kwargs):
+        response = self.session.request(method, self.base + path, params=query_string,
+                                        allow_redirects=False, **kwargs)
+        return response.status_code, response.headers.get('ETag')
+
+
+class Client:
+    """One logged-in user making requests"""
+
+    def __init__(self, transport, targets, user_id, seed):
+        self.transport = transport
+        self.targets = targets.for_user(user_id)
+        self.user_id = user_id
+        self.rng = random.Random(seed)
+        self.etags = {}
+        self.login()
+
+    def login(self):
+        status, _ = self.transport.send('POST', '/login', data={'username': dataset.username(self.user_id),
+                                                                'password': dataset.PASSWORD})
+        if status != 302:
+            raise RuntimeError(f"login as user {self.user_id} failed with {status}")
+
+    def request(self, route):
+        """Make one request for route; return (status, seconds)"""
+        path, kwargs = route.build(self.targets, self.rng)
+        if route.revalidate:
+            etag = self.etags.get(path) or self.transport.send(route.method, path, **kwargs)[1]
+            kwargs = dict(kwargs, headers={'If-None-Match': etag})
+        start = time.perf_counter()
+        status, etag = self.transport.send(route.method, path, **kwargs)
+        elapsed = time.perf_counter() - start
+        if etag:
+            self.etags[path] = etag
+        if route.relogin:
+            self.login()
+        return status, elapsed
+
+
+def summarize(timings, errors, seconds):
+    """Throughput and latency percentiles for a list of latencies in seconds"""
+    timings = sorted(timings)
+
+    def percentile(fraction):
+        return round(timings[min(len(timings) - 1, int(len(timings) * fraction))] * 1000, 3) if timings else None
+
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'throughput': round(len(timings) / seconds, 1) if seconds else None,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': round(timings[-1] * 1000, 3) if timings else None
+    }
+
+
+def run_test_client(app, targets, args):
+    """Time each route on its own, one request at a time"""
+    client = Client(TestClient(app), targets, targets.user_ids[0], args.seed)
+    results = {}
+    for route in ROUTES:
+        client.request(route)
+        timings, errors = [], 0
+        for _ in range(args.requests):
+            status, elapsed = client.request(route)
+            timings.append(elapsed)
+            errors += status >= 400
+        results[route.name] = summarize(timings, errors, sum(timings))
+    return results
+
+
+def run_wsgi(base, targets, args):
+    """Time a weighted mix of all routes from concurrent clients over HTTP"""
+    timings = {route.name: [] for route in ROUTES}
+    errors = dict.fromkeys(timings, 0)
+    lock = threading.Lock()
+    cum_weights = list(itertools.accumulate(route.weight for route in ROUTES))
+
+    def client_loop(client, deadline):
+        while time.monotonic() < deadline:
+            route = client.rng.choices(ROUTES, cum_weights=cum_weights)[0]
+            status, elapsed = client.request(route)
+            with lock:
+                timings[route.name].append(elapsed)
+                errors[route.name] += status >= 400
+
+    clients = [Client(HTTPClient(base), targets, targets.user_ids[i % len(targets.user_ids)], args.seed + i)
+               for i in range(args.threads)]
+    start = time.monotonic()
+    threads = [threading.Thread(target=client_loop, args=(client, start + args.seconds)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    results = {name: summarize(timings[name], errors[name], elapsed) for name in timings}
+    results['all'] = summarize([t for route in timings.values() for t in route], sum(errors.values()), elapsed)
+    return results
+
+
+def serve(args):
+    """Measure DATA_DIR through the test client, then serve it over HTTP until stdin closes"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import events
+    import news_stub
+
+    stub, os.environ['NEWS_API_BASE'] = news_stub.start()
+    if os.environ['STORAGE_BACKEND'] == 'sqlite':
+        from sqlite_store import migrate_from_json
+        from storage import SQLITE_PATH
+        migrate_from_json(SQLITE_PATH)
+
+    from app import app
+    from news_service import warm_news_cache
+    # Per-request log lines would cost more than many of the requests
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    warm_news_cache()
+
+    results = run_test_client(app, Targets(os.environ['DATA_DIR'], events.last_event_id), args)
+    with open(args.result, 'w') as f:
+        json.dump(results, f)
+    if not args.threads:
+        return
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"{SERVING} http://127.0.0.1:{server.server_port}", flush=True)
+    sys.stdin.read()
+    server.shutdown()
+    stub.shutdown()
+
+
+def measure(data_dir, backend, args):
+    """Start a server process on data_dir and measure it; return results per mode"""
+    result_file = os.path.join(data_dir, 'result.json')
+    # Streams are on, and end after their first heartbeat instead of holding a thread
+    env = dict(os.environ, DATA_DIR=data_dir, STORAGE_BACKEND=backend, NEWS_PREFETCH='0',
+               NEWS_SNAPSHOT_FILE=os.path.join(data_dir, 'news_snapshot.json'), EVENT_STREAM='1',
+               STREAM_TIMEOUT='0')
+    env.pop('SQLITE_PATH', None)
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', '--result', result_file,
+                               '--requests', str(args.requests), '--threads', str(args.threads),
+                               '--seed', str(args.seed)],
+                              env=env, cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    results = {}
+    try:
+        base = None
+        if args.threads:
+            for line in server.stdout:
+                if line.startswith(SERVING):
+                    base = line.split()[-1]
+                    break
+        if base is not None:
+            # Catching-up clients ask for the events since the concurrent run started
+            start_event_id = HTTPClient(base).session.get(f"{base}/api/events", params={'since': 0}).json()
+            targets = Targets(data_dir, lambda: start_event_id['last_event_id'] + 5)
+            results['wsgi'] = run_wsgi(base, targets, args)
+        server.stdin.close()
+        if server.wait() != 0:
+            raise RuntimeError(f"server process for {data_dir} exited with {server.returncode}")
+    finally:
+        if server.poll() is None:
+            server.kill()
+    with open(result_file) as f:
+        return dict({'test_client': json.load(f)}, **results)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(label, results):
+    print(f"\n{label}")
+    print(f"  {'route':<40} {'reqs':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in results.items():
+        if not stats['requests']:
+            continue
+        print(f"  {name:<40} {stats['requests']:>6} {stats['errors']:>6} {stats['throughput']:>8.1f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000', help='post counts to generate datasets of')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--backends', default='json,sqlite')
+    parser.add_argument('--requests', type=int, default=50, help='requests per route through the test client')
+    parser.add_argument('--threads', type=int, default=8, help='concurrent HTTP clients (0 to skip)')
+    parser.add_argument('--seconds', type=float, default=10, help='length of the concurrent run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    report = {
+        'commit': git_commit(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('serve', 'result', 'output')},
+        'runs': []
+    }
+    for size in [int(s) for s in args.sizes.split(',')]:
+        for backend in args.backends.split(','):
+            with tempfile.TemporaryDirectory() as data_dir:
+                dataset.generate(data_dir, args.users, size, args.seed)
+                results = measure(data_dir, backend, args)
+            for mode, routes in results.items():
+                print_results(f"{size} posts, {args.users} users, {backend}, {mode}", routes)
+                report['runs'].append({'posts': size, 'users': args.users, 'backend': backend,
+                                       'mode': mode, 'routes': routes})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
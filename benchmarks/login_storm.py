@@ -0,0 +1,103 @@
+"""Benchmark feed latency while a burst of logins is being hashed.
+
+Runs the app on a threaded WSGI server against a scratch copy of data/,
+then hammers /login with several threads while other threads time the
+feed. Each hashing mode runs in its own process so HASH_WORKERS takes
+effect before password_service is imported: 0 hashes inline on the
+request thread, anything else uses the process pool.
+
+Usage: python benchmarks/login_storm.py [--logins 4] [--seconds 10] [--workers 0,4]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(args):
+    """Serve the app in this process and measure it under the login storm"""
+    import requests
+    sys.path.insert(0, ROOT)
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    base = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    credentials = {'username': 'stormuser1!', 'password': 'storm-password'}
+    requests.post(f"{base}/register", data=dict(credentials, confirm_password=credentials['password']))
+
+    deadline = time.monotonic() + args.seconds
+    feed_times, login_count, busy_count = [], [0], [0]
+    lock = threading.Lock()
+
+    def login_loop():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            response = session.post(f"{base}/login", data=credentials, allow_redirects=False)
+            with lock:
+                login_count[0] += 1
+                busy_count[0] += response.status_code == 503
+
+    def feed_loop():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            session.get(f"{base}/api/feed")
+            with lock:
+                feed_times.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=login_loop) for _ in range(args.logins)]
+    threads += [threading.Thread(target=feed_loop) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    label = 'inline' if os.environ['HASH_WORKERS'] == '0' else f"pool of {os.environ['HASH_WORKERS']}"
+    print(f"{label:<12} logins {login_count[0]:6d} (503: {busy_count[0]:4d})  feed requests {len(feed_times):6d}  "
+          f"p50 {statistics.median(feed_times) * 1000:8.1f} ms  "
+          f"p95 {percentile(feed_times, 0.95) * 1000:8.1f} ms  "
+          f"p99 {percentile(feed_times, 0.99) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=4, help='threads posting to /login')
+    parser.add_argument('--readers', type=int, default=2, help='threads timing /api/feed')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', default='0,4', help='HASH_WORKERS values to compare')
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(args)
+        return
+
+    for workers in args.workers.split(','):
+        with tempfile.TemporaryDirectory() as data_dir:
+            for name in ('users.json', 'posts.json'):
+                shutil.copy(os.path.join(ROOT, 'data', name), data_dir)
+            env = dict(os.environ, DATA_DIR=data_dir, HASH_WORKERS=workers.strip(),
+                       NEWS_PREFETCH='0', NEWS_SNAPSHOT_FILE=os.path.join(data_dir, 'news_snapshot.json'))
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--run',
+                            '--logins', str(args.logins), '--readers', str(args.readers),
+                            '--seconds', str(args.seconds)], env=env, cwd=ROOT, check=True)
+
+
+if __name__ == '__main__':
+    main()
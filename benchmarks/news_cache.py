@@ -0,0 +1,93 @@
+"""Check the news cache against the local stub upstream (see news_stub.py).
+
+Fetches a category through news_service and checks, from the requests the
+stub answered, that:
+
+- a second read within NEWS_CACHE_TTL is served from the cache
+- a stale entry is served at once while one background refresh revalidates
+  it, and the stub's 304 keeps the cached articles
+- while upstream fails, the last good payload is still served
+
+Exits non-zero on the first failed check.
+
+Usage: python benchmarks/news_cache.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import news_stub
+
+# Seconds entries stay fresh (and failed fetches wait) during the check
+TTL = 1
+CATEGORY = 'sports'
+
+
+def check(condition, message):
+    if not condition:
+        print(f"FAIL: {message}")
+        sys.exit(1)
+    print(f"ok: {message}")
+
+
+def wait_for_refresh(news_service, category, timeout=10):
+    """Wait for the background refresh of category to finish"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with news_service._news_lock:
+            if category not in news_service._refreshing:
+                return
+        time.sleep(0.01)
+    raise RuntimeError(f"refresh of {category} did not finish")
+
+
+def main():
+    server, base = news_stub.start()
+    snapshot_dir = tempfile.mkdtemp(prefix='news-cache-')
+    # Set before importing news_service, which reads them at import
+    os.environ.update(NEWS_API_BASE=base, NEWS_CACHE_TTL=str(TTL), NEWS_RETRY_SECONDS=str(TTL),
+                      NEWS_SNAPSHOT_FILE=os.path.join(snapshot_dir, 'news_snapshot.json'))
+    import news_service
+
+    first = news_service.get_news_by_category(CATEGORY)
+    check('error' not in first and first['articles'], "first read fetches the articles")
+    check(server.requests == [('sports', 200)], "first read makes one upstream request")
+
+    second = news_service.get_news_by_category(CATEGORY)
+    check(second['articles'] == first['articles'] and len(server.requests) == 1,
+          "a fresh entry is served from the cache")
+
+    time.sleep(TTL + 0.1)
+    started = time.perf_counter()
+    stale = news_service.get_news_by_category(CATEGORY)
+    check(stale['articles'] == first['articles'] and time.perf_counter() - started < 0.05,
+          "a stale entry is served without waiting for upstream")
+    wait_for_refresh(news_service, CATEGORY)
+    check(server.requests[1:] == [('sports', 304)], "the background refresh revalidates with a 304")
+    check(news_service.get_news_by_category(CATEGORY)['articles'] == first['articles'] and len(server.requests) == 2,
+          "after a 304 the cached articles are fresh again")
+
+    server.failing = True
+    time.sleep(TTL + 0.1)
+    news_service.get_news_by_category(CATEGORY)
+    wait_for_refresh(news_service, CATEGORY)
+    check(server.requests[2:] == [('sports', 503)], "the next refresh reaches the failing upstream")
+    during = news_service.get_news_by_category(CATEGORY)
+    check('error' not in during and during['articles'] == first['articles'],
+          "the last good payload is served while upstream fails")
+
+    server.failing = False
+    time.sleep(TTL + 0.1)
+    news_service.get_news_by_category(CATEGORY)
+    wait_for_refresh(news_service, CATEGORY)
+    check(server.requests[3:] == [('sports', 304)], "once upstream recovers the payload is revalidated")
+    server.shutdown()
+    print("OK: news cache checks passed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Local stand-in for the news upstream, so benchmarks never touch the network.
+
+Serves /top-headlines/category/<category>/us.json with a fixed set of
+articles and an ETag, answering revalidations with 304 like the real API.
+Point the app at it with NEWS_API_BASE. The server started by start()
+records each request it answers, and fails them while its failing flag is
+set.
+
+Usage: python benchmarks/news_stub.py [--port 8001] [--articles 20]
+"""
+import argparse
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(article_count):
+    bodies = {}
+
+    def body(category):
+        if category not in bodies:
+            articles = [{
+                'title': f"{category.title()} headline {i}",
+                'description': f"Synthetic {category} story number {i} for benchmarking.",
+                'url': f"https://example.com/{category}/{i}",
+                'urlToImage': None,
+                'publishedAt': '2025-01-01T00:00:00Z',
+                'source': {'name': 'Benchmark Wire'},
+                'author': 'Benchmark'
+            } for i in range(article_count)]
+            data = json.dumps({'status': 'ok', 'totalResults': article_count, 'articles': articles}).encode()
+            bodies[category] = (data, '"%s"' % hashlib.sha1(data).hexdigest())
+        return bodies[category]
+
+    class NewsHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            parts = self.path.strip('/').split('/')
+            if len(parts) != 4 or parts[:2] != ['top-headlines', 'category'] or parts[3] != 'us.json':
+                self.send_error(404)
+                return
+            if self.server.failing:
+                self.server.requests.append((parts[2], 503))
+                self.send_error(503)
+                return
+            data, etag = body(parts[2])
+            if self.headers.get('If-None-Match') == etag:
+                self.server.requests.append((parts[2], 304))
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.server.requests.append((parts[2], 200))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return NewsHandler
+
+
+def start(port=0, article_count=20):
+    """Serve the stub on a background thread; return (server, base url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(article_count))
+    server.daemon_threads = True
+    # (upstream category, status) of each request answered
+    server.requests = []
+    server.failing = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--articles', type=int, default=20)
+    args = parser.parse_args()
+
+    server, base = start(args.port, args.articles)
+    print(f"Serving stub news at {base} (NEWS_API_BASE={base})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Measure the bytes and estimated load time of first and repeat page views.
+
+Serves pages of a synthetic dataset (see dataset.py) through the Flask
+test client to a simulated browser that keeps an HTTP cache, and compares
+two ways of loading each page and the static files it links to:
+
+- plain: no compression, and static files from /static/, which the
+  browser revalidates on every view (as before fingerprinting)
+- optimized: gzip/Brotli, and fingerprinted static files from /assets/,
+  which the browser keeps for a year without asking again
+
+Load time is estimated for a connection of --rtt-ms and --mbps: a round
+trip and the transfer of the page, then one more for its static files
+(fetched in parallel) if any are requested.
+
+Usage: python benchmarks/page_weight.py [--posts 2000] [--rtt-ms 100] [--mbps 10]
+"""
+import argparse
+import gzip
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataset
+
+PAGES = ['/', '/profile', '/search?q=w1']
+ACCEPT_ENCODING = 'gzip, deflate, br'
+ASSET_URL = re.compile(r'(?:href|src)="(/assets/[^"]+)"')
+
+
+def plain_url(url):
+    """The /static/ URL the templates linked to before fingerprinting"""
+    root, extension = os.path.splitext(url[len('/assets/'):])
+    return '/static/' + os.path.splitext(root)[0] + extension
+
+
+def decode(body, encoding):
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'br':
+        import brotli
+        return brotli.decompress(body)
+    return body
+
+
+class Browser:
+    """Loads pages and their static files, keeping responses in an HTTP cache"""
+
+    def __init__(self, client, optimized):
+        self.client = client
+        self.optimized = optimized
+        # url -> (response headers, decoded body)
+        self.cache = {}
+
+    def fetch(self, url):
+        """Request url unless it is cached as immutable; return (requests, bytes)"""
+        cached = self.cache.get(url)
+        if cached is not None and 'immutable' in cached[0].get('Cache-Control', ''):
+            return 0, 0
+        headers = {'Accept-Encoding': ACCEPT_ENCODING} if self.optimized else {}
+        if cached is not None and cached[0].get('ETag'):
+            headers['If-None-Match'] = cached[0]['ETag']
+        response = self.client.get(url, headers=headers)
+        body = response.get_data()
+        if response.status_code == 200:
+            self.cache[url] = (response.headers, decode(body, response.content_encoding))
+        elif response.status_code != 304:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        head = len(f"HTTP/1.1 {response.status}\r\n") + sum(len(f"{k}: {v}\r\n") for k, v in response.headers)
+        return 1, head + len(body)
+
+    def view(self, page):
+        """Load a page and its static files; return the (requests, bytes) of each"""
+        html = self.fetch(page)
+        assets = [0, 0]
+        for url in ASSET_URL.findall(self.cache[page][1].decode()):
+            requests, size = self.fetch(url if self.optimized else plain_url(url))
+            assets[0] += requests
+            assets[1] += size
+        return html, tuple(assets)
+
+
+def load_ms(html, assets, rtt_ms, mbps):
+    bytes_per_ms = mbps * 1e6 / 8 / 1000
+    ms = rtt_ms + html[1] / bytes_per_ms
+    if assets[0]:
+        ms += rtt_ms + assets[1] / bytes_per_ms
+    return ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--rtt-ms', type=float, default=100)
+    parser.add_argument('--mbps', type=float, default=10)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='page-weight-')
+    try:
+        dataset.generate(data_dir, args.users, args.posts, args.seed)
+        os.environ.update(DATA_DIR=data_dir, STORAGE_BACKEND='json', NEWS_PREFETCH='0', HASH_WORKERS='0')
+        from app import app
+
+        print(f"{'mode':<10} {'visit':<7} {'page':<14} {'requests':>8} {'bytes':>8} {'est ms':>7}")
+        for optimized in (False, True):
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = '1'
+                session['_fresh'] = True
+            browser = Browser(client, optimized)
+            for visit in ('first', 'repeat'):
+                for page in PAGES:
+                    html, assets = browser.view(page)
+                    print(f"{'optimized' if optimized else 'plain':<10} {visit:<7} {page:<14} "
+                          f"{html[0] + assets[0]:>8} {html[1] + assets[1]:>8} "
+                          f"{load_ms(html, assets, args.rtt_ms, args.mbps):>7.0f}")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
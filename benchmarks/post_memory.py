@@ -0,0 +1,96 @@
+"""Measure the memory and load time of the posts the JSON engine keeps.
+
+Generates a synthetic posts.json (see dataset.py), then decodes it and
+builds Post objects eagerly and lazily (likes and reactions left
+serialized until first used). Reports the time to build them from the
+decoded JSON, the bytes retained per post as counted by tracemalloc, and
+the bytes a feed page adds by materializing its posts.
+
+Usage: python benchmarks/post_memory.py [--posts 100000] [--users 5000] [--data-dir DIR]
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataset
+from models import Post
+
+PAGE_SIZE = 20
+
+
+def build(raw, lazy):
+    return [Post.from_dict(record, lazy=lazy) for record in json.loads(raw)]
+
+
+def touch(posts):
+    """Read what a feed card shows, materializing lazy posts"""
+    for post in posts:
+        post.like_count, post.has_liked(1), post.reaction_counts
+
+
+def best_seconds(function, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def retained_bytes(raw, lazy):
+    """Bytes held by the posts once built, and after touching a feed page"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    posts = build(raw, lazy)
+    gc.collect()
+    built = tracemalloc.get_traced_memory()[0] - before
+    touch(posts[-PAGE_SIZE:])
+    touched = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return len(posts), built, touched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3, help='load timings to take the best of')
+    parser.add_argument('--data-dir', help='reuse a dataset generated there instead of a temporary one')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix='post-memory-')
+    try:
+        posts_file = os.path.join(data_dir, 'posts.json')
+        if not os.path.exists(posts_file):
+            print(f"Generating {args.posts} posts...")
+            dataset.generate(data_dir, args.users, args.posts, args.seed)
+        with open(posts_file, 'rb') as f:
+            raw = f.read()
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    records = json.loads(raw)
+    decode = best_seconds(lambda: json.loads(raw), args.repeat)
+    print(f"posts.json: {len(raw) / 1e6:.1f} MB, {len(records)} posts, decoded in {decode * 1000:.1f} ms")
+    print(f"{'mode':<8} {'build ms':>9} {'bytes/post':>11} {'page bytes':>11}")
+    for mode, lazy in (('eager', False), ('lazy', True)):
+        seconds = best_seconds(lambda: [Post.from_dict(record, lazy=lazy) for record in records], args.repeat)
+        count, built, touched = retained_bytes(raw, lazy)
+        print(f"{mode:<8} {seconds * 1000:>9.1f} {built / count:>11.0f} {touched - built:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Microbenchmark like/reaction toggles and counts on a viral post.
+
+Compares the user-keyed maps in models.Post with the list-per-type storage
+the routes used to mutate directly (membership tests and list.remove).
+
+Usage: python benchmarks/post_reactions.py [--reactions 100000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Post, REACTION_TYPES
+
+
+def list_toggle_like(likes, user_id):
+    if user_id in likes:
+        likes.remove(user_id)
+    else:
+        likes.append(user_id)
+
+
+def list_react(reactions, user_id, reaction):
+    for reaction_list in reactions.values():
+        if user_id in reaction_list:
+            reaction_list.remove(user_id)
+    reactions[reaction].append(user_id)
+
+
+def post_toggle_like(post, user_id):
+    if not post.remove_like(user_id):
+        post.add_like(user_id)
+
+
+def report(label, seconds, number):
+    print(f"{label:<28} {seconds / number * 1e6:12.2f} us/op")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reactions', type=int, default=100000)
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    n = args.reactions
+    user_ids = list(range(1, n + 1))
+    reactions = {reaction: [] for reaction in REACTION_TYPES}
+    for user_id in user_ids:
+        reactions[REACTION_TYPES[user_id % len(REACTION_TYPES)]].append(user_id)
+    post = Post('viral', 1, 'user1!', 'viral post', likes=user_ids, reactions=reactions)
+    likes = list(user_ids)
+
+    # The first user sits at the front of every list, the worst case for remove
+    print(f"{n} likes and {n} reactions")
+    report('list toggle like', timeit.timeit(lambda: list_toggle_like(likes, 1), number=args.number), args.number)
+    report('map toggle like', timeit.timeit(lambda: post_toggle_like(post, 1), number=args.number), args.number)
+    report('list switch reaction',
+           timeit.timeit(lambda: list_react(reactions, 1, 'love'), number=args.number), args.number)
+    report('map switch reaction',
+           timeit.timeit(lambda: post.set_reaction(1, 'love'), number=args.number), args.number)
+    report('list reaction counts',
+           timeit.timeit(lambda: {k: len(v) for k, v in reactions.items()}, number=args.number), args.number)
+    report('map reaction counts',
+           timeit.timeit(lambda: dict(post.reaction_counts), number=args.number), args.number)
+
+
+if __name__ == '__main__':
+    main()
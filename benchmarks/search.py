@@ -0,0 +1,92 @@
+"""Benchmark search queries on a large synthetic inverted index.
+
+Posts are generated from a Zipf-distributed vocabulary, so a few terms
+appear in a large share of posts and most are rare, then indexed with
+search_index.SearchIndex the way data_store does. Queries of each kind
+are timed for a first page and for the page after it.
+
+Usage: python benchmarks/search.py [--posts 1000000] [--queries 200]
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import SearchIndex
+
+PAGE_SIZE = 20
+
+
+def build_index(post_count, vocabulary, rng):
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+    start = datetime(2025, 1, 1)
+    index = SearchIndex()
+    for i in range(post_count):
+        timestamp = (start + timedelta(seconds=i * 30)).isoformat()
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(6, 14))
+        index.add_post(f"post-{i}", timestamp, " ".join(words))
+        if i % 10 == 0:
+            index.add_comment(f"post-{i}", " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=6)))
+    return index
+
+
+def time_queries(index, queries):
+    """Return first-page and second-page latencies in milliseconds"""
+    first, second = [], []
+    for terms in queries:
+        started = time.perf_counter()
+        results = index.search(terms, PAGE_SIZE + 1)
+        first.append((time.perf_counter() - started) * 1000)
+        if len(results) > PAGE_SIZE:
+            started = time.perf_counter()
+            index.search(terms, PAGE_SIZE + 1, results[PAGE_SIZE - 1])
+            second.append((time.perf_counter() - started) * 1000)
+    return first, second
+
+
+def report(label, samples):
+    if not samples:
+        print(f"{label:<34} no results")
+        return
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:<34} p50 {statistics.median(samples):8.3f} ms   p99 {p99:8.3f} ms   max {samples[-1]:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [f"w{i}" for i in range(args.vocabulary)]
+
+    started = time.perf_counter()
+    index = build_index(args.posts, vocabulary, rng)
+    print(f"indexed {args.posts} posts in {time.perf_counter() - started:.1f}s")
+
+    common, middle, rare = vocabulary[:20], vocabulary[100:1000], vocabulary[5000:]
+    kinds = {
+        'one common term': lambda: [rng.choice(common)],
+        'one rare term': lambda: [rng.choice(rare)],
+        'two common terms': lambda: rng.sample(common, 2),
+        'common + mid-frequency term': lambda: [rng.choice(common), rng.choice(middle)],
+        'three mid-frequency terms': lambda: rng.sample(middle, 3),
+    }
+    for label, make_query in kinds.items():
+        first, second = time_queries(index, [make_query() for _ in range(args.queries)])
+        report(label, first)
+        report(f"{label} (next page)", second)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Measure the peak memory of feed, profile and post requests as history grows.
+
+For each size generates a synthetic dataset (see dataset.py), splits its
+posts.json into day shards with the data_store.py build step, then serves
+each request once through the Flask test client in a fresh process and
+reports that process's peak RSS. With sharded posts a request only reads
+the days it shows, so the peak should stay flat from 10k to 1M posts.
+
+Usage: python benchmarks/shard_memory.py [--posts 10000 100000] [--users 1000]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dataset
+
+# Each request as (name, path); {post} is a post from the middle of history
+REQUESTS = [
+    ('GET /', '/'),
+    ('GET /profile', '/profile'),
+    ('GET /api/users/1/posts', '/api/users/1/posts'),
+    ('GET post comments', '/api/posts/{post}/comments'),
+]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def serve_once(path):
+    """Request path as the busiest author; return (status, MB before, MB after)"""
+    from app import app
+
+    client = app.test_client()
+    # Logged in through the session: hashing the password would set the peak
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    # Warm up the app, templates and users on a page that reads no posts
+    client.get('/login')
+    before = peak_rss_mb()
+    status = client.get(path).status_code
+    return status, before, peak_rss_mb()
+
+
+def generate(data_dir, users, posts, seed):
+    # Returns nothing: the list of every post id would grow this process,
+    # and on Linux a spawned worker's peak RSS starts from its parent's
+    dataset.generate(data_dir, users, posts, seed)
+
+
+def measure(data_dir, path):
+    """Serve path from data_dir in a fresh process, so its peak RSS is this request's alone"""
+    os.environ.update(DATA_DIR=data_dir, STORAGE_BACKEND='json', NEWS_PREFETCH='0', HASH_WORKERS='0')
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(serve_once, (path,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'posts':>8} {'shards':>7} {'request':<24} {'status':>6} {'base MB':>8} {'peak MB':>8} {'added MB':>9}")
+    for count in args.posts:
+        data_dir = tempfile.mkdtemp(prefix='post-shards-')
+        try:
+            # Generated and split in other processes, so this one stays small
+            started = time.perf_counter()
+            with multiprocessing.get_context('spawn').Pool(1) as pool:
+                pool.apply(generate, (data_dir, args.users, count, args.seed))
+            subprocess.run([sys.executable, os.path.join(ROOT, 'data_store.py')], check=True,
+                           env=dict(os.environ, DATA_DIR=data_dir), stdout=subprocess.DEVNULL)
+            shards = len([name for name in os.listdir(os.path.join(data_dir, 'posts')) if name[:1].isdigit()])
+            print(f"({count} posts generated and split in {time.perf_counter() - started:.0f}s)")
+            for name, path in REQUESTS:
+                status, before, after = measure(data_dir, path.format(post=f"post-{count // 2}"))
+                print(f"{count:>8} {shards:>7} {name:<24} {status:>6} {before:>8.1f} {after:>8.1f} {after - before:>9.1f}")
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
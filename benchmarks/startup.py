@@ -0,0 +1,115 @@
+"""Measure cold start: importing the app and serving its first page.
+
+Prints the modules that take longest to import (python -X importtime),
+then times a cold `import app` plus the first GET / in --runs fresh
+interpreters on a small synthetic dataset, with news prefetching off as
+under api/index.py. Exits with status 1 if the median cold start is over
+--budget-ms (default BUDGET_MS; 0 turns the check off), so a plain run or
+CI catches a regression.
+
+Usage: python benchmarks/startup.py [--runs 5] [--top 15] [--budget-ms 600] [--compiled-templates]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dataset
+
+# Median import app plus first GET / allowed, in milliseconds: about twice
+# what it takes after the lazy imports, so a slow import added back fails
+BUDGET_MS = 600
+
+# Runs in a fresh interpreter; prints milliseconds to import and to answer GET /
+COLD_START = """
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+with client.session_transaction() as session:
+    session['_user_id'] = '1'
+    session['_fresh'] = True
+status = client.get('/').status_code
+assert status == 200, status
+print((imported - started) * 1000, (time.perf_counter() - imported) * 1000)
+"""
+
+
+def environment(data_dir, compiled_dir):
+    env = dict(os.environ, DATA_DIR=data_dir, NEWS_PREFETCH='0', HASH_WORKERS='0',
+               NEWS_SNAPSHOT_FILE=os.path.join(data_dir, 'news_snapshot.json'),
+               COMPILED_TEMPLATES_DIR=compiled_dir)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+
+def import_times(env, top):
+    """The slowest modules to import, as (cumulative us, self us, module)"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((int(cumulative), int(own), name.rstrip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def cold_starts(env, runs):
+    """(import ms, first request ms) for each fresh interpreter"""
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', COLD_START], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True)
+        imported, first_request = map(float, result.stdout.split())
+        timings.append((imported, first_request))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest modules to list')
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS,
+                        help='fail if the median import plus first request is slower (0 to not check)')
+    parser.add_argument('--compiled-templates', action='store_true', help='precompile the templates first')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='startup-')
+    try:
+        dataset.generate(data_dir, 50, 500)
+        compiled_dir = os.path.join(data_dir, 'templates_compiled')
+        env = environment(data_dir, compiled_dir)
+        if args.compiled_templates:
+            subprocess.run([sys.executable, 'page_cache.py'], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+        # Warm the bytecode and OS caches, so runs measure startup rather than the first compile
+        cold_starts(env, 1)
+
+        print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+        for cumulative, own, name in import_times(env, args.top):
+            print(f"{cumulative / 1000:>14.1f} {own / 1000:>8.1f}  {name}")
+
+        timings = cold_starts(env, args.runs)
+        imports = statistics.median(imported for imported, _ in timings)
+        requests = statistics.median(first_request for _, first_request in timings)
+        total = statistics.median(imported + first_request for imported, first_request in timings)
+        print(f"\ncold start over {args.runs} runs (median): import app {imports:.1f} ms, "
+              f"first GET / {requests:.1f} ms, total {total:.1f} ms")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.budget_ms and total > args.budget_ms:
+        print(f"over the {args.budget_ms:g} ms budget")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
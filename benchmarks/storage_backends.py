@@ -0,0 +1,96 @@
+"""Benchmark feed and profile queries on the JSON and SQLite storage engines.
+
+For each dataset size a scratch data directory is filled with synthetic
+users and posts, migrated into SQLite, and both engines are timed on the
+newest 20 posts of the feed and of one user's profile.
+
+Usage: python benchmarks/storage_backends.py [--sizes 1000,10000,50000]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_store
+from sqlite_store import SQLiteStorage, migrate_from_json
+from storage import JSONStorage
+
+USER_COUNT = 500
+
+
+def use_data_dir(data_dir):
+    """Point data_store at a scratch directory"""
+    data_store.DATA_DIR = data_dir
+    data_store.USERS_FILE = os.path.join(data_dir, 'users.json')
+    data_store.USERS_LOCK = os.path.join(data_dir, 'users.lock')
+    data_store.POSTS_FILE = os.path.join(data_dir, 'posts.json')
+    data_store.POSTS_DIR = os.path.join(data_dir, 'posts')
+    data_store.POSTS_MANIFEST = os.path.join(data_dir, 'posts', 'manifest.json')
+    data_store.POSTS_JOURNAL = os.path.join(data_dir, 'posts.journal')
+    data_store.POSTS_LOCK = os.path.join(data_dir, 'posts.lock')
+    data_store.clear_cache()
+
+
+def write_dataset(data_dir, post_count, seed=1):
+    rng = random.Random(seed)
+    users = [{'id': i, 'username': f"user{i}!", 'password_hash': None,
+              'profile_picture': None, 'created_at': '2025-01-01T00:00:00'}
+             for i in range(1, USER_COUNT + 1)]
+    start = datetime(2025, 1, 1)
+    posts = []
+    for i in range(post_count):
+        user_id = rng.randint(1, USER_COUNT)
+        posts.append({
+            'id': f"post-{i}",
+            'user_id': user_id,
+            'username': f"user{user_id}!",
+            'content': f"Synthetic post number {i}",
+            'timestamp': (start + timedelta(seconds=rng.randint(0, 10 ** 8))).isoformat(),
+            'likes': rng.sample(range(1, USER_COUNT + 1), rng.randint(0, 5)),
+            'comments': [],
+            'reactions': {'like': [], 'love': [], 'laugh': [], 'wow': [], 'angry': [], 'sad': []}
+        })
+    with open(os.path.join(data_dir, 'users.json'), 'w') as f:
+        json.dump(users, f)
+    with open(os.path.join(data_dir, 'posts.json'), 'w') as f:
+        json.dump(posts, f)
+
+
+def time_call(func, repeat=30):
+    """Return the median latency of func in milliseconds"""
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,50000')
+    args = parser.parse_args()
+
+    print(f"{'posts':>8} {'engine':>7} {'feed ms':>9} {'profile ms':>11}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        data_dir = tempfile.mkdtemp(prefix='socialfeed-bench-')
+        write_dataset(data_dir, size)
+        use_data_dir(data_dir)
+        db_path = os.path.join(data_dir, 'socialfeed.db')
+        migrate_from_json(db_path)
+        for name, engine in (('json', JSONStorage()), ('sqlite', SQLiteStorage(db_path))):
+            feed = time_call(lambda: engine.get_recent_posts(limit=20))
+            profile = time_call(lambda: engine.get_posts_by_user(7, limit=20))
+            print(f"{size:>8} {name:>7} {feed:>9.3f} {profile:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark authenticated request latency with and without the user cache.
+
+Generates a scratch data directory with 10k users, logs in as one of them
+through the Flask test client and times requests to /profile. The "uncached"
+run clears the data_store cache before every request, which reproduces the
+old behaviour of re-reading users.json in the user loader.
+
+Usage: python benchmarks/user_lookup.py [--users 10000] [--requests 200]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_users(data_dir, count):
+    """Write a users.json with count users"""
+    users = [{
+        'id': i,
+        'username': f"user{i}!",
+        'password_hash': 'scrypt:32768:8:1$benchmark$0',
+        'profile_picture': None,
+        'created_at': '2025-01-01T00:00:00'
+    } for i in range(1, count + 1)]
+    with open(os.path.join(data_dir, 'users.json'), 'w') as f:
+        json.dump(users, f)
+
+
+def time_requests(client, path, count, before_each=None):
+    """Return per-request latencies in milliseconds"""
+    timings = []
+    for _ in range(count):
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.status_code
+    return timings
+
+
+def summarize(label, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:<10} mean {statistics.mean(timings):8.3f} ms   "
+          f"p50 {statistics.median(timings):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='socialfeed-bench-')
+    write_users(data_dir, args.users)
+    os.environ['DATA_DIR'] = data_dir
+    sys.path.insert(0, ROOT)
+
+    import data_store
+    from app import app
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(args.users)
+
+    print(f"{args.users} users, {args.requests} requests to /profile")
+    summarize('uncached', time_requests(client, '/profile', args.requests,
+                                        before_each=data_store.clear_cache))
+    summarize('cached', time_requests(client, '/profile', args.requests))
+
+
+if __name__ == '__main__':
+    main()
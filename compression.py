@@ -0,0 +1,40 @@
+import gzip
+import os
+from flask import request
+
+# Smaller responses go out uncompressed; gzip's overhead would eat the saving
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+# Low enough to keep compressing a page well under a millisecond
+COMPRESS_LEVEL = 6
+COMPRESSED_MIMETYPES = {"text/html", "application/json"}
+
+def accepted_encoding(encodings):
+    """The first of encodings the client accepts, or None"""
+    for encoding in encodings:
+        if request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+def compress_response(response):
+    """Gzip a large HTML or JSON response for clients that accept it"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSED_MIMETYPES or "Content-Encoding" in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    if accepted_encoding(["gzip"]) is None:
+        return response
+    response.set_data(gzip.compress(data, COMPRESS_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+    # The gzipped bytes are a different representation, so a strong ETag
+    # becomes weak; If-None-Match still matches it (weak comparison)
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_app(app):
+    """Compress dynamic responses above COMPRESS_MIN_BYTES"""
+    app.after_request(compress_response)
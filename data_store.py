@@ -1,131 +1,1183 @@
+import bisect
+import copy
+import heapq
 import json
+import logging
 import os
+import threading
+import time
+import metrics
+from contextlib import contextmanager
 from models import User, Post, Comment
+from search_index import SearchIndex
+from timelines import HOME_TIMELINE_SIZE, FANOUT_FOLLOWER_LIMIT, split_authors, merge_newest
+from post_shards import SHARD_CACHE_SIZE, FileCache, shard_name, shard_file, id_bucket, author_bucket, counts
+from functools import partial
+from trending import TrendingScores, to_epoch
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, rely on the in-process lock only
+    fcntl = None
+
 # Data file paths
-DATA_DIR = "data"
+DATA_DIR = os.environ.get("DATA_DIR", "data")
 USERS_FILE = os.path.join(DATA_DIR, "users.json")
+USERS_LOCK = os.path.join(DATA_DIR, "users.lock")
+# Follower id -> ids of the users they follow
+FOLLOWS_FILE = os.path.join(DATA_DIR, "follows.json")
+FOLLOWS_LOCK = os.path.join(DATA_DIR, "follows.lock")
+# Posts snapshot, one file per day of posts plus id and author lookups (see
+# post_shards.py); the manifest names the current version of each file
+POSTS_DIR = os.path.join(DATA_DIR, "posts")
+POSTS_MANIFEST = os.path.join(POSTS_DIR, "manifest.json")
+# Single-file snapshot written by earlier versions, split into POSTS_DIR on first load
 POSTS_FILE = os.path.join(DATA_DIR, "posts.json")
+POSTS_JOURNAL = os.path.join(DATA_DIR, "posts.journal")
+POSTS_LOCK = os.path.join(DATA_DIR, "posts.lock")
+# Full comment history, one JSON-lines file per post
+COMMENTS_DIR = os.path.join(DATA_DIR, "comments")
+
+# Fold the journal into a new posts.json snapshot once it grows past this
+JOURNAL_COMPACT_BYTES = int(os.environ.get("JOURNAL_COMPACT_BYTES", 1024 * 1024))
+# Milliseconds a journal write waits for others to share its fsync with.
+# Writes queued while another commit is in progress are always shared.
+GROUP_COMMIT_WINDOW_MS = float(os.environ.get("GROUP_COMMIT_WINDOW_MS", 0))
+
+# Parsed data files and their lookup indexes, keyed by file path. Each entry
+# remembers the (mtime, size) signature of the file it was built from, so a
+# write made by another worker process is picked up on the next lookup.
+_cache = {}
+_cache_lock = threading.Lock()
+_users_lock = threading.Lock()
+_follows_lock = threading.Lock()
+_posts_lock = threading.Lock()
+_compaction_thread = None
+# Journal writes waiting for the next group commit, and the lock held by
+# the thread committing them
+_commit_queue = []
+_commit_queue_lock = threading.Lock()
+_commit_lock = threading.Lock()
+# Parsed day shards and lookup buckets, shared by every snapshot version
+_shard_cache = FileCache()
+_lookup_cache = FileCache(SHARD_CACHE_SIZE * 4)
+_EMPTY_MANIFEST = {'generation': 0, 'shards': {}, 'ids': {}, 'authors': {}}
+_EMPTY_SHARD = {'keys': [], 'by_id': {}, 'by_author': {}}
+_NO_AUTHOR = {'days': [], 'posts': 0, 'likes': 0, 'comments': 0}
+# The most recently synced search index, and the shard files it has every
+# post of. Posts are never deleted, so after a snapshot reload it only
+# needs the posts and comments it is missing.
+_search = None
+_search_files = set()
+# Trending scores, built on first use and carried across snapshot reloads
+_trending = TrendingScores()
 
 def ensure_data_directory():
     """Ensure data directory exists"""
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
-def load_users():
-    """Load users from JSON file"""
+def _storage_error(operation, message):
+    """Log the exception being handled and count it under operation in /metrics"""
+    logger.exception(message)
+    metrics.record_storage_error(operation)
+
+def _file_signature(path):
+    """Return an (inode, mtime, size) tuple identifying the file's contents"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def _get_cached(path, build):
+    """Return the cached index for path, rebuilding it if the file changed"""
+    signature = _file_signature(path)
+    entry = _cache.get(path)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+    with _cache_lock:
+        entry = _cache.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        index = build()
+        _cache[path] = (signature, index)
+        return index
+
+def _set_cached(path, index):
+    """Store an index for data we just wrote to path"""
+    with _cache_lock:
+        _cache[path] = (_file_signature(path), index)
+
+def clear_cache():
+    """Drop all cached data so the next lookup re-reads the files"""
+    global _search, _search_files, _trending
+    with _cache_lock:
+        _cache.clear()
+        _shard_cache.clear()
+        _lookup_cache.clear()
+        _search = None
+        _search_files = set()
+        _trending = TrendingScores()
+
+class UsernameTakenError(ValueError):
+    """Raised when creating a user whose username is already registered"""
+
+def _build_user_index(users):
+    """Build id and username lookup tables for a list of users"""
+    return {
+        'users': users,
+        'by_id': {str(user.id): user for user in users},
+        'by_username': {user.username: user for user in users},
+        # Ids are never reused, so the next one is always past the highest
+        'next_id': max((int(user.id) for user in users), default=0) + 1
+    }
+
+def _read_json(path, file):
+    """Read and decode a JSON data file, counting the work in the metrics"""
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        data = f.read()
+    read = time.perf_counter()
+    value = json.loads(data)
+    metrics.record_read(file, len(data), read - started, time.perf_counter() - read)
+    return value
+
+def _read_users():
+    """Read users from JSON file"""
     ensure_data_directory()
     try:
         if os.path.exists(USERS_FILE):
-            with open(USERS_FILE, 'r') as f:
-                users_data = json.load(f)
-                return [User.from_dict(user) for user in users_data]
+            return [User.from_dict(user) for user in _read_json(USERS_FILE, 'users')]
         return []
-    except Exception as e:
-        print(f"Error loading users: {e}")
+    except Exception:
+        _storage_error("load_users", "Error loading users")
         return []
 
+def _user_index():
+    """Get the cached user index"""
+    return _get_cached(USERS_FILE, lambda: _build_user_index(_read_users()))
+
+def load_users():
+    """Load users from JSON file"""
+    return list(_user_index()['users'])
+
+def _write_users(users):
+    """Atomically replace users.json and cache its new index"""
+    ensure_data_directory()
+    _write_json(USERS_FILE, [user.to_dict() for user in users], 'users')
+    _set_cached(USERS_FILE, _build_user_index(list(users)))
+
 def save_users(users):
     """Save users to JSON file"""
-    ensure_data_directory()
     try:
-        with open(USERS_FILE, 'w') as f:
-            json.dump([user.to_dict() for user in users], f, indent=2)
-    except Exception as e:
-        print(f"Error saving users: {e}")
+        with _users_file_lock():
+            _write_users(users)
+    except Exception:
+        _storage_error("save_users", "Error saving users")
 
 def save_user(user):
     """Save a single user"""
-    users = load_users()
-    
     if user is None:
-        return users
-    
-    # Check if user already exists
-    existing_user_index = None
-    for i, existing_user in enumerate(users):
-        if existing_user.id == user.id:
-            existing_user_index = i
-            break
-    
-    if existing_user_index is not None:
-        users[existing_user_index] = user
-    else:
-        users.append(user)
+        return load_users()
     
-    save_users(users)
+    with _users_file_lock():
+        users = load_users()
+        # Check if user already exists
+        existing_user = _user_index()['by_id'].get(str(user.id))
+        if existing_user is not None:
+            users[users.index(existing_user)] = user
+        else:
+            users.append(user)
+        
+        try:
+            _write_users(users)
+        except Exception:
+            _storage_error("save_users", "Error saving users")
     return users
 
+def create_user(user):
+    """Store a new user under the next free id, refusing a taken username"""
+    with _users_file_lock():
+        # The index is re-checked under the lock, so it includes users that
+        # another worker process registered a moment ago
+        index = _user_index()
+        if user.username in index['by_username']:
+            raise UsernameTakenError(f"Username already exists: {user.username}")
+        user.id = index['next_id']
+        _write_users(index['users'] + [user])
+    return user
+
 def get_user_by_id(user_id):
     """Get user by ID"""
-    users = load_users()
-    for user in users:
-        if str(user.id) == str(user_id):
-            return user
-    return None
+    return _user_index()['by_id'].get(str(user_id))
 
 def get_user_by_username(username):
     """Get user by username"""
-    users = load_users()
-    for user in users:
-        if user.username == username:
-            return user
-    return None
+    return _user_index()['by_username'].get(username)
 
-def load_posts():
-    """Load posts from JSON file"""
+def _build_follow_index(following):
+    """Build the follower lookup for a follower id -> followed ids map"""
+    followers = {}
+    for follower_id, followee_ids in following.items():
+        for followee_id in followee_ids:
+            followers.setdefault(followee_id, set()).add(follower_id)
+    return {'following': following, 'followers': followers}
+
+def _read_follows():
+    """Read the follow graph from JSON file"""
     ensure_data_directory()
     try:
-        if os.path.exists(POSTS_FILE):
-            with open(POSTS_FILE, 'r') as f:
-                posts_data = json.load(f)
-                return [Post.from_dict(post) for post in posts_data]
-        return []
-    except Exception as e:
-        print(f"Error loading posts: {e}")
-        return []
+        if os.path.exists(FOLLOWS_FILE):
+            return {int(follower_id): set(followee_ids)
+                    for follower_id, followee_ids in _read_json(FOLLOWS_FILE, 'follows').items()}
+        return {}
+    except Exception:
+        _storage_error("load_follows", "Error loading follows")
+        return {}
+
+def _follow_index():
+    """Get the cached follow graph"""
+    return _get_cached(FOLLOWS_FILE, lambda: _build_follow_index(_read_follows()))
+
+def _set_following(follower_id, followee_id, following):
+    """Follow or unfollow a user; returns False if that was already the case"""
+    with _follows_file_lock():
+        graph = _follow_index()['following']
+        followee_ids = graph.get(follower_id, set())
+        if (followee_id in followee_ids) == following:
+            return False
+        # The cached graph is shared with readers, so it is replaced rather than changed
+        graph = dict(graph)
+        graph[follower_id] = followee_ids | {followee_id} if following else followee_ids - {followee_id}
+        _write_json(FOLLOWS_FILE, {str(user_id): sorted(ids) for user_id, ids in graph.items() if ids}, 'follows')
+        _set_cached(FOLLOWS_FILE, _build_follow_index(graph))
+    return True
+
+def follow_user(follower_id, followee_id):
+    """Start following a user; returns False if already following"""
+    return _set_following(follower_id, followee_id, True)
+
+def unfollow_user(follower_id, followee_id):
+    """Stop following a user; returns False if not following"""
+    return _set_following(follower_id, followee_id, False)
 
-def save_posts(posts):
-    """Save posts to JSON file"""
+def load_follows():
+    """Load the follow graph as a follower id -> followed ids map"""
+    return {user_id: set(ids) for user_id, ids in _follow_index()['following'].items()}
+
+def get_following(user_id):
+    """Get the ids of the users a user follows"""
+    return set(_follow_index()['following'].get(user_id, ()))
+
+def get_follower_count(user_id):
+    """Count a user's followers"""
+    return len(_follow_index()['followers'].get(user_id, ()))
+
+def _build_post_index(manifest):
+    """Start a post index over a snapshot manifest, for journal records to be applied on top"""
+    return {
+        'manifest': manifest,
+        'days': sorted(manifest['shards']),
+        # Posts created by journal records, by id and as ascending keys per day and author
+        'new': {},
+        'new_by_day': {},
+        'new_by_author': {},
+        # Snapshot keys merged with new ones, as (day,) or (day, user_id) ->
+        # (number of new keys merged in, merged keys); new keys are only added
+        'merged_keys': {},
+        # Snapshot posts changed by journal records: private copies, the day
+        # each is stored in, and the (likes, comments) the snapshot has
+        'touched': {},
+        'touched_days': {},
+        'base_counts': {},
+        # (post_id, weight, time) of engagement replayed before trending was built or synced
+        'engagements': [],
+        # Built on the first search, then kept current by the journal appliers
+        'search': None,
+        # Likewise, on the first trending read
+        'trending': None,
+        # user_id -> journal offset of the last record touching their posts
+        'user_versions': {},
+        # user_id -> ascending keys of their home timeline, built on first
+        # read against the follow graph in 'follows', then fanned out to
+        'timelines': {},
+        'follows': None,
+        'signature': None,
+        'journal_signature': None,
+        'journal_offset': 0
+    }
+
+def _read_manifest():
+    """Read the posts manifest, or an empty one before any posts are written"""
+    if not os.path.exists(POSTS_MANIFEST):
+        return _EMPTY_MANIFEST
+    return _read_json(POSTS_MANIFEST, 'posts')
+
+def _parse_shard(name):
+    """Read a day shard into ascending keys, posts by id and keys by author"""
+    # Likes and reactions are only decoded for the posts that get used
+    posts = [Post.from_dict(record, lazy=True) for record in _read_json(os.path.join(POSTS_DIR, name), 'posts')]
+    by_author = {}
+    for post in posts:
+        by_author.setdefault(post.user_id, []).append((post.timestamp, post.id))
+    return {
+        'keys': [(post.timestamp, post.id) for post in posts],
+        'by_id': {post.id: post for post in posts},
+        'by_author': by_author
+    }
+
+def _shard(index, day):
+    """The snapshot posts of a day, shared by every index and never changed"""
+    entry = index['manifest']['shards'].get(day)
+    if entry is None:
+        return _EMPTY_SHARD
+    return _shard_cache.get(entry['file'], _parse_shard)
+
+def _lookup(index, kind, bucket):
+    """A bucket of the post id ('ids') or author ('authors') lookup"""
+    name = index['manifest'][kind].get(bucket)
+    if name is None:
+        return {}
+    return _lookup_cache.get(name, lambda name: _read_json(os.path.join(POSTS_DIR, name), f"post_{kind}"))
+
+def _post_day(index, post_id):
+    """The day of the shard a snapshot post is stored in, or None"""
+    return _lookup(index, 'ids', id_bucket(post_id)).get(post_id)
+
+def _author_entry(index, user_id):
+    """The days an author has posts on in the snapshot, and their post stats"""
+    return _lookup(index, 'authors', author_bucket(user_id)).get(str(user_id), _NO_AUTHOR)
+
+def _overlay(index, post_id):
+    """A post created or changed by the journal, or None"""
+    post = index['touched'].get(post_id)
+    return post if post is not None else index['new'].get(post_id)
+
+def _post_at(index, key):
+    """The current version of the post with a (timestamp, id) key, or None"""
+    post = _overlay(index, key[1])
+    return post if post is not None else _shard(index, shard_name(key[0]))['by_id'].get(key[1])
+
+def _get_post(index, post_id):
+    """The current version of a post, or None"""
+    post = _overlay(index, post_id)
+    if post is None:
+        day = _post_day(index, post_id)
+        if day is not None:
+            post = _shard(index, day)['by_id'].get(post_id)
+    return post
+
+def _read_posts_file():
+    """Read the single-file posts.json snapshot of earlier versions"""
     ensure_data_directory()
+    if not os.path.exists(POSTS_FILE):
+        return []
+    return _read_json(POSTS_FILE, 'posts')
+
+def _split_posts_file():
+    """Move a posts.json snapshot into day shards, once"""
     try:
-        with open(POSTS_FILE, 'w') as f:
-            json.dump([post.to_dict() for post in posts], f, indent=2)
-    except Exception as e:
-        print(f"Error saving posts: {e}")
-
-def save_post(post):
-    """Save a single post"""
-    posts = load_posts()
-    
-    # Check if post already exists
-    existing_post_index = None
-    for i, existing_post in enumerate(posts):
-        if existing_post.id == post.id:
-            existing_post_index = i
-            break
-    
-    if existing_post_index is not None:
-        posts[existing_post_index] = post
+        with _posts_file_lock(exclusive=True):
+            if not os.path.exists(POSTS_MANIFEST) and os.path.exists(POSTS_FILE):
+                changed = {}
+                for record in _read_posts_file():
+                    changed.setdefault(shard_name(record.get('timestamp')), []).append(record)
+                _write_snapshot(_EMPTY_MANIFEST, changed, replace=True)
+    except Exception:
+        _storage_error("split_posts", "Error splitting posts.json into shards")
+
+def _write_json(path, value, file):
+    """Write a JSON data file without ever truncating the old one"""
+    started = time.perf_counter()
+    data = json.dumps(value, indent=2).encode()
+    temp_file = path + ".tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, path)
+    _fsync_directory(os.path.dirname(path))
+    metrics.record_write(file, len(data), time.perf_counter() - started)
+
+def _fsync_directory(path):
+    """Make a rename in a directory durable"""
+    try:
+        fd = os.open(path or '.', os.O_RDONLY)
+    except OSError:
+        return  # Windows cannot open directories
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _manifest_files(manifest):
+    """Every file a manifest points at"""
+    return ({entry['file'] for entry in manifest['shards'].values()}
+            | set(manifest['ids'].values()) | set(manifest['authors'].values()))
+
+def _merge_author(entry, change):
+    if entry is None:
+        entry = _NO_AUTHOR
+    return {
+        'days': sorted(set(entry['days']) | change['days']),
+        'posts': entry['posts'] + change['posts'],
+        'likes': entry['likes'] + change['likes'],
+        'comments': entry['comments'] + change['comments']
+    }
+
+def _write_lookups(manifest, new_manifest, kind, changes, bucket_of, merge, replace):
+    """Write the lookup buckets of kind that changes touch, merging each change into its entry"""
+    by_bucket = {}
+    for key, change in changes.items():
+        by_bucket.setdefault(bucket_of(key), {})[key] = change
+    for bucket, bucket_changes in by_bucket.items():
+        old_file = None if replace else manifest[kind].get(bucket)
+        entries = _read_json(os.path.join(POSTS_DIR, old_file), f"post_{kind}") if old_file else {}
+        for key, change in bucket_changes.items():
+            entries[key] = merge(entries.get(key), change)
+        name = shard_file(f"{kind}-{bucket}", new_manifest['generation'])
+        _write_json(os.path.join(POSTS_DIR, name), entries, f"post_{kind}")
+        new_manifest[kind][bucket] = name
+
+def _write_snapshot(manifest, changed, replace=False, folded=False):
+    """Write post records into their day shards and update the lookups, then the manifest
+
+    changed maps a day to the post records to add to or replace in its
+    shard; with replace they are the whole snapshot. Every file is written
+    under a new name and the manifest last, so a crash leaves the previous
+    snapshot whole. Files older than the previous manifest are removed.
+    folded says the snapshot now contains the live journal, so the manifest
+    names the next journal generation.
+    """
+    generation = manifest['generation'] + 1
+    new_manifest = {
+        'generation': generation,
+        'journal': manifest.get('journal', 0) + (1 if folded else 0),
+        'shards': {} if replace else dict(manifest['shards']),
+        'ids': {} if replace else dict(manifest['ids']),
+        'authors': {} if replace else dict(manifest['authors'])
+    }
+    os.makedirs(POSTS_DIR, exist_ok=True)
+    new_ids, authors = {}, {}
+    for day, records in changed.items():
+        old_file = None if replace else manifest['shards'].get(day, {}).get('file')
+        stored = {record['id']: record for record in _read_json(os.path.join(POSTS_DIR, old_file), 'posts')} \
+            if old_file else {}
+        for record in records:
+            author = authors.setdefault(str(record['user_id']), {'days': set(), 'posts': 0, 'likes': 0,
+                                                                 'comments': 0})
+            likes, comments = counts(record)
+            old = stored.get(record['id'])
+            if old is None:
+                new_ids[record['id']] = day
+                author['days'].add(day)
+                author['posts'] += 1
+            else:
+                old_likes, old_comments = counts(old)
+                likes, comments = likes - old_likes, comments - old_comments
+            author['likes'] += likes
+            author['comments'] += comments
+            stored[record['id']] = record
+        name = shard_file(day, generation)
+        _write_json(os.path.join(POSTS_DIR, name),
+                    sorted(stored.values(), key=lambda record: (record.get('timestamp') or '', record['id'])),
+                    'posts')
+        new_manifest['shards'][day] = {'file': name, 'count': len(stored)}
+    _write_lookups(manifest, new_manifest, 'ids', new_ids, id_bucket, lambda entry, day: day, replace)
+    _write_lookups(manifest, new_manifest, 'authors', authors, author_bucket, _merge_author, replace)
+    _write_json(POSTS_MANIFEST, new_manifest, 'posts')
+    # Readers holding the previous manifest can still open its files
+    keep = _manifest_files(manifest) | _manifest_files(new_manifest) | {os.path.basename(POSTS_MANIFEST)}
+    for name in os.listdir(POSTS_DIR):
+        if name not in keep:
+            os.remove(os.path.join(POSTS_DIR, name))
+
+@contextmanager
+def _data_file_lock(thread_lock, lock_path, exclusive):
+    """Serialize access to a data file across threads and worker processes"""
+    with thread_lock:
+        try:
+            ensure_data_directory()
+            lock_file = open(lock_path, 'a')
+        except OSError:
+            # Read-only deployments can still read the data files
+            yield
+            return
+        with lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+def _posts_file_lock(exclusive):
+    """Serialize journal access across threads and worker processes"""
+    return _data_file_lock(_posts_lock, POSTS_LOCK, exclusive)
+
+def _users_file_lock():
+    """Serialize users.json writes across threads and worker processes"""
+    return _data_file_lock(_users_lock, USERS_LOCK, exclusive=True)
+
+def _follows_file_lock():
+    """Serialize follows.json writes across threads and worker processes"""
+    return _data_file_lock(_follows_lock, FOLLOWS_LOCK, exclusive=True)
+
+# Journal records are applied with set semantics (like/unlike/react set the
+# user's state, posts and comments are keyed by id). Comments are only
+# deduplicated against a post's recent ones, though, so a journal must never
+# be replayed onto a snapshot that already contains it: each journal starts
+# with a header naming its generation, and the manifest names the generation
+# its snapshot expects next.
+
+def _journal_generation(line):
+    """The generation a journal's first line names; 0 for journals written before headers"""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return 0
+    return record.get('generation', 0) if isinstance(record, dict) and record.get('op') == 'journal' else 0
+
+def _touch(index, post_id, day=None):
+    """The post a journal record changes: a new post, or a private copy of a snapshot post"""
+    post = _overlay(index, post_id)
+    if post is not None:
+        return post
+    day = day or _post_day(index, post_id)
+    snapshot = _shard(index, day)['by_id'].get(post_id) if day is not None else None
+    if snapshot is None:
+        return None
+    post = index['touched'][post_id] = copy.deepcopy(snapshot)
+    index['touched_days'][post_id] = day
+    index['base_counts'][post_id] = (snapshot.like_count, snapshot.comment_count)
+    return post
+
+def _touch_all(index, records):
+    """Copy out the snapshot posts records change, a day at a time so each shard is parsed once"""
+    days = {}
+    for record in records:
+        post_id = record.get('post_id')
+        if post_id is None or _overlay(index, post_id) is not None:
+            continue
+        # Records carry their post's timestamp, and so its day; older ones are looked up
+        day = shard_name(record['post_timestamp']) if 'post_timestamp' in record else _post_day(index, post_id)
+        if day is not None:
+            days.setdefault(day, set()).add(post_id)
+    for day in sorted(days):
+        for post_id in days[day]:
+            _touch(index, post_id, day)
+
+def _apply_create_post(index, record):
+    post = Post.from_dict(record['post'], lazy=True)
+    if _overlay(index, post.id) is None:
+        key = (post.timestamp, post.id)
+        index['new'][post.id] = post
+        bisect.insort(index['new_by_day'].setdefault(shard_name(post.timestamp), []), key)
+        bisect.insort(index['new_by_author'].setdefault(post.user_id, []), key)
+        if index['search'] is not None:
+            index['search'].add_post(post.id, post.timestamp, post.content)
+        _fan_out(index, post)
+
+def _fan_out(index, post):
+    """Add a new post to the built home timelines of its author and their followers"""
+    follows = index['follows']
+    if follows is None:
+        return
+    followers = follows['followers'].get(post.user_id, set())
+    if len(followers) >= FANOUT_FOLLOWER_LIMIT:
+        return
+    for user_id in followers | {post.user_id}:
+        keys = index['timelines'].get(user_id)
+        if keys is not None:
+            bisect.insort(keys, (post.timestamp, post.id))
+            if len(keys) > HOME_TIMELINE_SIZE:
+                del keys[0]
+
+def _record_engagement(index, post, op, at=None, user_id=None):
+    at = time.time() if at is None else at
+    engagement = _trending.engagement(post.id, op, at, user_id, to_epoch(post.timestamp))
+    if index['trending'] is not None:
+        index['trending'].record(*engagement)
     else:
-        posts.append(post)
-    
-    save_posts(posts)
+        index['engagements'].append(engagement)
+
+def _apply_like(index, record):
+    post = _touch(index, record['post_id'])
+    if post is not None and post.add_like(record['user_id']):
+        _record_engagement(index, post, 'like', record.get('at'), record['user_id'])
+
+def _apply_unlike(index, record):
+    post = _touch(index, record['post_id'])
+    if post is not None and post.remove_like(record['user_id']):
+        _record_engagement(index, post, 'unlike', record.get('at'), record['user_id'])
+
+def _apply_react(index, record):
+    post = _touch(index, record['post_id'])
+    if post is not None:
+        # Changing a reaction is not new engagement
+        if post.get_reaction(record['user_id']) is None:
+            _record_engagement(index, post, 'react', record.get('at'))
+        post.set_reaction(record['user_id'], record['reaction'])
+
+def _apply_comment(index, record):
+    post = _touch(index, record['post_id'])
+    comment = record['comment']
+    if post is not None and all(c.get('id') != comment['id'] for c in post.comments):
+        post.add_comment(comment)
+        if index['search'] is not None:
+            index['search'].add_comment(post.id, comment.get('content'))
+        _record_engagement(index, post, 'comment', to_epoch(comment.get('timestamp')))
+
+_MUTATIONS = {
+    'journal': lambda index, record: None,
+    'create_post': _apply_create_post,
+    'like': _apply_like,
+    'unlike': _apply_unlike,
+    'react': _apply_react,
+    'comment': _apply_comment
+}
+
+def _replay_journal(index):
+    """Apply journal records written since the index was last brought up to date"""
+    started = time.perf_counter()
+    try:
+        with open(POSTS_JOURNAL, 'rb') as f:
+            f.seek(index['journal_offset'])
+            data = f.read()
+    except FileNotFoundError:
+        return
+    read = time.perf_counter()
+    if (index['journal_offset'] == 0
+            and _journal_generation(data[:data.find(b'\n') + 1]) < index['manifest'].get('journal', 0)):
+        # A crash stopped the fold that wrote this snapshot before it emptied
+        # the journal; the snapshot contains it, and the next write empties it
+        return
+    decode_seconds = 0
+    # A record without its trailing newline was cut off by a crash; leave it
+    end = data.rfind(b'\n') + 1
+    offset = index['journal_offset']
+    records = []
+    for line in data[:end].split(b'\n')[:-1]:
+        offset += len(line) + 1
+        if not line.strip():
+            continue
+        try:
+            decode_started = time.perf_counter()
+            records.append((offset, json.loads(line)))
+            decode_seconds += time.perf_counter() - decode_started
+        except ValueError:
+            _storage_error("journal_record", "Skipping bad journal record")
+    _touch_all(index, [record for _, record in records])
+    for offset, record in records:
+        try:
+            _MUTATIONS[record['op']](index, record)
+            post = _overlay(index, record.get('post_id') or record.get('post', {}).get('id'))
+            if post is not None:
+                index['user_versions'][post.user_id] = offset
+        except Exception:
+            _storage_error("journal_record", "Skipping bad journal record")
+    index['journal_offset'] += end
+    metrics.record_read('journal', len(data), read - started, decode_seconds)
+
+def _post_index():
+    """Get the cached post index, replaying any new journal records"""
+    index = _cache.get(POSTS_MANIFEST)
+    if (index is not None and index['signature'] == _file_signature(POSTS_MANIFEST)
+            and index['journal_signature'] == _file_signature(POSTS_JOURNAL)):
+        return index
+    if not os.path.exists(POSTS_MANIFEST) and os.path.exists(POSTS_FILE):
+        _split_posts_file()
+    with _cache_lock, _posts_file_lock(exclusive=False):
+        signature = _file_signature(POSTS_MANIFEST)
+        index = _cache.get(POSTS_MANIFEST)
+        if index is None or index['signature'] != signature:
+            try:
+                manifest = _read_manifest()
+            except Exception:
+                _storage_error("load_posts", "Error loading posts")
+                manifest = _EMPTY_MANIFEST
+            index = _build_post_index(manifest)
+            index['signature'] = signature
+            if signature is None:
+                # posts.json could not be split into shards, as on a read-only
+                # deploy, so it is served from memory like journal posts
+                try:
+                    for record in _read_posts_file():
+                        _apply_create_post(index, {'post': record})
+                except Exception:
+                    _storage_error("load_posts", "Error loading posts")
+        _replay_journal(index)
+        if index['trending'] is None and _trending.built:
+            _build_trending(index)
+        index['journal_signature'] = _file_signature(POSTS_JOURNAL)
+        _cache[POSTS_MANIFEST] = index
+        return index
+
+def _append_lines(path, records, file):
+    """Durably append JSON records, one per line, and return the new file size"""
+    started = time.perf_counter()
+    data = b''.join((json.dumps(record) + '\n').encode() for record in records)
+    with open(path, 'a+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size:
+            f.seek(size - 1)
+            if f.read(1) != b'\n':
+                # Terminate a record torn by an earlier crash
+                data = b'\n' + data
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    metrics.record_write(file, len(data), time.perf_counter() - started)
+    return size + len(data)
+
+def _write_commit(batch):
+    """Append a batch of queued writes with one exclusive lock and one fsync per file"""
+    comments, inline, records = {}, {}, []
+    for write in batch:
+        for post_id, (post_inline, post_comments) in write['comments'].items():
+            inline.setdefault(post_id, post_inline)
+            comments.setdefault(post_id, []).extend(post_comments)
+        records.extend(write['records'])
+    with _posts_file_lock(exclusive=True):
+        for post_id, post_comments in comments.items():
+            comments_file = _comments_file(post_id)
+            if not os.path.exists(comments_file):
+                # Until a post has a comments file all its comments are inline
+                post_comments = inline[post_id] + post_comments
+                os.makedirs(COMMENTS_DIR, exist_ok=True)
+            _append_lines(comments_file, post_comments, 'comments')
+        return _append_lines(POSTS_JOURNAL, _journal_header() + records, 'journal')
+
+def _journal_header():
+    """The header to start the journal with if it is empty, emptying it first if already folded
+
+    Runs under the exclusive lock. Only the manifest's journal generation is
+    read, from the cached index while the manifest is unchanged.
+    """
+    index = _cache.get(POSTS_MANIFEST)
+    manifest = index['manifest'] if index is not None and index['signature'] == _file_signature(POSTS_MANIFEST) \
+        else _read_manifest()
+    generation = manifest.get('journal', 0)
+    try:
+        with open(POSTS_JOURNAL, 'rb') as f:
+            first = f.readline()
+    except FileNotFoundError:
+        first = b''
+    if first:
+        if _journal_generation(first) >= generation:
+            return []
+        os.truncate(POSTS_JOURNAL, 0)
+    return [{'op': 'journal', 'generation': generation}]
+
+def _commit(records, comments=None):
+    """Durably append records to the posts journal, and comments to their posts' comment files
+
+    Concurrent callers are group committed: whoever takes the commit lock
+    writes everything queued so far, so a burst of writes shares one fsync
+    instead of each waiting for its own. comments maps a post id to (its
+    inline comments, new comments); the inline ones start its comments file
+    if it has none yet.
+    """
+    write = {'records': records, 'comments': comments or {}, 'done': False, 'error': None}
+    with _commit_queue_lock:
+        _commit_queue.append(write)
+    with _commit_lock:
+        if not write['done']:
+            if GROUP_COMMIT_WINDOW_MS:
+                time.sleep(GROUP_COMMIT_WINDOW_MS / 1000)
+            with _commit_queue_lock:
+                batch = list(_commit_queue)
+                del _commit_queue[:]
+            try:
+                size = _write_commit(batch)
+            except Exception as e:
+                size = None
+                for queued in batch:
+                    queued['error'] = e
+            for queued in batch:
+                queued['done'] = True
+            metrics.record_group_commit(len(batch))
+            if size is not None and size >= JOURNAL_COMPACT_BYTES:
+                _schedule_compaction()
+    if write['error'] is not None:
+        raise write['error']
+
+def _append_mutation(record):
+    """Durably append a mutation record to the posts journal"""
+    _commit([record])
+
+def _fold_journal():
+    """Write the posts the journal created or changed into their day shards and empty the journal"""
+    manifest = _read_manifest()
+    index = _build_post_index(manifest)
+    _replay_journal(index)
+    changed = {}
+    for post_id, post in index['touched'].items():
+        changed.setdefault(index['touched_days'][post_id], {})[post_id] = post
+    for post in index['new'].values():
+        changed.setdefault(shard_name(post.timestamp), {})[post.id] = post
+    if index['journal_offset']:
+        # Readers skip a journal older than the manifest, so a crash before
+        # the truncate below cannot replay records onto the new snapshot
+        _write_snapshot(manifest, {day: [post.to_dict() for post in day_posts.values()]
+                                   for day, day_posts in changed.items()}, folded=True)
+    if os.path.exists(POSTS_JOURNAL):
+        os.truncate(POSTS_JOURNAL, 0)
+
+def compact_journal():
+    """Fold the journal into the day shards it changed and empty it"""
+    if _trending.built:
+        # Replay this process's own records first, so trending counts them
+        # from when they happened rather than from the reload
+        _post_index()
+    with _posts_file_lock(exclusive=True):
+        if not os.path.exists(POSTS_JOURNAL):
+            return
+        _fold_journal()
+
+def _compact_in_background():
+    try:
+        compact_journal()
+    except Exception:
+        _storage_error("compact_journal", "Error compacting posts journal")
+
+def _schedule_compaction():
+    """Start a background compaction unless one is already running"""
+    global _compaction_thread
+    with _cache_lock:
+        if _compaction_thread is not None and _compaction_thread.is_alive():
+            return
+        _compaction_thread = threading.Thread(target=_compact_in_background, daemon=True)
+        _compaction_thread.start()
+
+def load_posts():
+    """Load all posts, oldest first"""
+    index = _post_index()
+    posts = []
+    for day in sorted(set(index['days']).union(index['new_by_day'])):
+        posts.extend(post for post in (_post_at(index, key) for key in _day_keys(index, day)) if post is not None)
+    return posts
+
+def add_post(post):
+    """Record a new post"""
+    _append_mutation({'op': 'create_post', 'post': post.to_dict()})
+    return get_post_by_id(post.id)
+
+def _comments_file(post_id):
+    return os.path.join(COMMENTS_DIR, f"{post_id}.jsonl")
+
+def apply_mutations(mutations):
+    """Record like, unlike, react and comment mutations in order and return the updated posts by id
+
+    New comments go to their posts' comment files first, then every
+    mutation is appended to the journal in one durable write, shared with
+    any concurrent callers.
+    """
+    index = _post_index()
+    posts = {post_id: _get_post(index, post_id) for post_id in dict.fromkeys(m['post_id'] for m in mutations)}
+    # Stamped with when they happened, and the post's timestamp so replaying
+    # them reads the post's day shard without looking the post up
+    now = time.time()
+    mutations = [dict(mutation, at=now, post_timestamp=posts[mutation['post_id']].timestamp)
+                 for mutation in mutations if posts[mutation['post_id']] is not None]
+    if not mutations:
+        return {}
+    new_comments = {}
+    for mutation in mutations:
+        if mutation['op'] == 'comment':
+            post_id = mutation['post_id']
+            new_comments.setdefault(post_id, (posts[post_id].comments, []))[1].append(mutation['comment'])
+    _commit(mutations, new_comments)
+    return get_posts_by_ids([mutation['post_id'] for mutation in mutations])
+
+def like_post(post_id, user_id):
+    """Record a like and return the updated post"""
+    return apply_mutations([{'op': 'like', 'post_id': post_id, 'user_id': user_id}]).get(post_id)
+
+def unlike_post(post_id, user_id):
+    """Remove a like and return the updated post"""
+    return apply_mutations([{'op': 'unlike', 'post_id': post_id, 'user_id': user_id}]).get(post_id)
 
-def get_all_posts():
-    """Get all posts"""
-    return load_posts()
+def react_to_post(post_id, user_id, reaction):
+    """Set the user's reaction and return the updated post"""
+    return apply_mutations([{'op': 'react', 'post_id': post_id, 'user_id': user_id,
+                             'reaction': reaction}]).get(post_id)
+
+def add_post_comment(post_id, comment):
+    """Record a comment dict and return the updated post"""
+    return apply_mutations([{'op': 'comment', 'post_id': post_id, 'user_id': comment['user_id'],
+                             'comment': comment}]).get(post_id)
+
+def _comment_key(comment):
+    return (comment.get('timestamp') or '', comment['id'])
+
+def _read_comments(post):
+    """Read all of a post's comments, oldest first"""
+    comments = list(post.comments)
+    started = time.perf_counter()
+    try:
+        with open(_comments_file(post.id), 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        data = None
+    if data is not None:
+        read = time.perf_counter()
+        comments = []
+        for line in data.splitlines():
+            try:
+                comments.append(json.loads(line))
+            except ValueError:
+                # Skip a comment torn by a crash
+                continue
+        metrics.record_read('comments', len(data), read - started, time.perf_counter() - read)
+    comments.sort(key=_comment_key)
+    return comments
+
+def get_post_comments(post_id, limit=None, before=None):
+    """Get a post's comments newest first, optionally only those older than a (timestamp, id) key"""
+    post = _get_post(_post_index(), post_id)
+    if post is None:
+        return []
+    comments = _read_comments(post)
+    keys = [_comment_key(comment) for comment in comments]
+    end = len(keys) if before is None else bisect.bisect_left(keys, tuple(before))
+    start = 0 if limit is None else max(0, end - limit)
+    return comments[start:end][::-1]
+
+def _newest_keys(keys, limit, before):
+    """Slice keys newest first out of an ascending list of (timestamp, id) keys"""
+    end = len(keys) if before is None else bisect.bisect_left(keys, tuple(before))
+    start = 0 if limit is None else max(0, end - limit)
+    return keys[start:end][::-1]
+
+def _newest_day_keys(days, day_keys, limit, before):
+    """Keys newest first, older than the key before, from days given newest first
+
+    day_keys(day) gives the ascending keys of a day; the days older than
+    the ones limit needs are never read.
+    """
+    keys = []
+    last_day = shard_name(before[0]) if before is not None else None
+    for day in days:
+        if limit is not None and len(keys) >= limit:
+            break
+        if last_day is None or day <= last_day:
+            keys.extend(_newest_keys(day_keys(day), None if limit is None else limit - len(keys), before))
+    return keys
+
+def _merged_keys(index, name, keys, new):
+    """Ascending snapshot keys merged with new ones, reusing the last merge until more are new"""
+    if not new:
+        return keys
+    cached = index['merged_keys'].get(name)
+    if cached is not None and cached[0] == len(new):
+        return cached[1]
+    merged = []
+    for key in heapq.merge(keys, new):
+        # A post both in the snapshot and created again by the journal
+        if not merged or merged[-1] != key:
+            merged.append(key)
+    index['merged_keys'][name] = (len(new), merged)
+    return merged
+
+def _day_keys(index, day):
+    """Ascending keys of a day's posts"""
+    return _merged_keys(index, (day,), _shard(index, day)['keys'], index['new_by_day'].get(day))
+
+def _author_days(index, user_id):
+    """Days an author has posts on, newest first"""
+    days = set(_author_entry(index, user_id)['days'])
+    days.update(shard_name(timestamp) for timestamp, _ in index['new_by_author'].get(user_id, ()))
+    return sorted(days, reverse=True)
+
+def _author_keys(index, user_id, day):
+    """Ascending keys of an author's posts on a day"""
+    new = [key for key in index['new_by_author'].get(user_id, ()) if shard_name(key[0]) == day]
+    return _merged_keys(index, (day, user_id), _shard(index, day)['by_author'].get(user_id, []), new)
+
+def _user_keys(index, user_id, limit, before):
+    """Keys of a user's posts newest first, older than the key before"""
+    return _newest_day_keys(_author_days(index, user_id), partial(_author_keys, index, user_id), limit, before)
+
+def _posts_at(index, keys):
+    return [post for post in (_post_at(index, key) for key in keys) if post is not None]
+
+def get_recent_posts(limit=None, before=None):
+    """Get posts newest first, optionally only those older than a (timestamp, id) key"""
+    index = _post_index()
+    days = sorted(set(index['days']).union(index['new_by_day']), reverse=True)
+    return _posts_at(index, _newest_day_keys(days, partial(_day_keys, index), limit, before))
+
+def get_posts_by_user(user_id, limit=None, before=None):
+    """Get a user's posts newest first, optionally only those older than a (timestamp, id) key"""
+    index = _post_index()
+    return _posts_at(index, _user_keys(index, user_id, limit, before))
+
+def _changed_timelines(old, new):
+    """Users whose home timeline authors differ between two follow graphs"""
+    user_ids = set()
+    for follower_id in old['following'].keys() | new['following'].keys():
+        before, after = old['following'].get(follower_id, set()), new['following'].get(follower_id, set())
+        # Unchanged entries are shared by a graph replaced by _set_following
+        if before is after or before == after:
+            continue
+        user_ids.add(follower_id)
+        for author_id in before ^ after:
+            # An author crossing FANOUT_FOLLOWER_LIMIT moves between fanned
+            # out and merged in every follower's timeline
+            if ((len(old['followers'].get(author_id, ())) >= FANOUT_FOLLOWER_LIMIT)
+                    != (len(new['followers'].get(author_id, ())) >= FANOUT_FOLLOWER_LIMIT)):
+                user_ids |= new['followers'].get(author_id, set()) | {author_id}
+    return user_ids
+
+def _home_timeline(index, user_id):
+    """Get a user's home timeline keys, building them on first use, and its (fanned out, merged) authors"""
+    follows = _follow_index()
+    with _cache_lock:
+        if index['follows'] is not follows:
+            # Built against an older follow graph: only the timelines of
+            # users whose followed authors changed are rebuilt
+            if index['follows'] is not None:
+                for changed_id in _changed_timelines(index['follows'], follows):
+                    index['timelines'].pop(changed_id, None)
+            index['follows'] = follows
+        fanned_out, merged = split_authors(user_id, follows['following'].get(user_id, ()),
+                                           lambda author_id: len(follows['followers'].get(author_id, ())))
+        keys = index['timelines'].get(user_id)
+        if keys is None:
+            newest = merge_newest([_user_keys(index, author_id, HOME_TIMELINE_SIZE, None)
+                                   for author_id in fanned_out], HOME_TIMELINE_SIZE)
+            keys = index['timelines'][user_id] = newest[::-1]
+    return keys, fanned_out, merged
+
+def get_home_timeline(user_id, limit=None, before=None):
+    """Get the posts of a user and the users they follow newest first, older than the (timestamp, id) key before"""
+    index = _post_index()
+    keys, fanned_out, merged = _home_timeline(index, user_id)
+    page = _newest_keys(keys, limit, before)
+    if len(keys) >= HOME_TIMELINE_SIZE and (limit is None or len(page) < limit):
+        # Paged past the oldest post the timeline keeps
+        page, merged = [], fanned_out | merged
+    key_lists = [page] + [_user_keys(index, author_id, limit, before) for author_id in merged]
+    return _posts_at(index, merge_newest(key_lists, limit))
+
+def _sync_search(search, post):
+    """Add a post and any of its comments the search index is missing"""
+    if not search.has_post(post.id):
+        search.add_post(post.id, post.timestamp, post.content)
+    indexed = search.comment_count(post.id)
+    if indexed < post.comment_count:
+        for comment in _read_comments(post)[indexed:]:
+            search.add_comment(post.id, comment.get('content'))
+
+def _search_index(index):
+    """Get the search index for the current posts, building or syncing it on first use"""
+    global _search, _search_files
+    if index['search'] is not None:
+        return index['search']
+    # Under the cache lock so no journal record is applied mid-sync
+    with _cache_lock:
+        if index['search'] is None:
+            search = _search or SearchIndex()
+            if search is not _search:
+                _search_files = set()
+            shards = index['manifest']['shards']
+            for day in index['days']:
+                # A shard file is never changed, so one synced before has nothing new
+                if shards[day]['file'] not in _search_files:
+                    for key in _shard(index, day)['keys']:
+                        _sync_search(search, _post_at(index, key))
+            for post in list(index['touched'].values()) + list(index['new'].values()):
+                _sync_search(search, post)
+            _search_files = {entry['file'] for entry in shards.values()}
+            index['search'] = _search = search
+    return index['search']
+
+def _shard_posts(index, day):
+    return _shard(index, day)['by_id'].values()
+
+def _snapshot_post(index, post_id):
+    """The snapshot version of a post, or None for one created by the journal"""
+    day = index['touched_days'].get(post_id)
+    if day is None and post_id not in index['new']:
+        day = _post_day(index, post_id)
+    return _shard(index, day)['by_id'].get(post_id) if day is not None else None
+
+def _build_trending(index):
+    """Build or sync the trending scores with the index's snapshot and replayed journal, with _cache_lock held"""
+    shards = index['manifest']['shards']
+    snapshot = {shards[day]['file']: partial(_shard_posts, index, day) for day in index['days']}
+    _trending.sync(snapshot, index['engagements'], partial(_snapshot_post, index))
+    index['trending'] = _trending
+    index['engagements'] = []
+
+def _trending_index(index):
+    """Get the trending scores, building them from the posts on first use"""
+    if index['trending'] is None:
+        with _cache_lock:
+            if index['trending'] is None:
+                _build_trending(index)
+    return index['trending']
+
+def get_trending_posts(window, limit):
+    """Get (post, score) pairs for the highest scoring posts in a window, best first"""
+    index = _post_index()
+    trending = [(_get_post(index, post_id), score) for post_id, score in _trending_index(index).top(window, limit)]
+    return [(post, score) for post, score in trending if post is not None]
+
+def search_posts(terms, limit=None, before=None):
+    """Get (rank key, post) pairs for posts matching every term, best first"""
+    index = _post_index()
+    keys = _search_index(index).search(terms, limit, before)
+    results = [(key, _post_at(index, key[1:])) for key in keys]
+    return [(key, post) for key, post in results if post is not None]
+
+def get_data_version():
+    """Opaque version of all posts, changed by every write"""
+    index = _post_index()
+    return f"{index['signature']}:{index['journal_offset']}"
+
+def get_user_version(user_id):
+    """Opaque version of a user's posts and the likes, reactions and comments on them"""
+    index = _post_index()
+    return f"{index['signature']}:{index['user_versions'].get(user_id, 0)}"
+
+def get_user_stats(user_id):
+    """Count a user's posts and the likes and comments they received"""
+    index = _post_index()
+    # Kept per author when the journal is compacted; add what it changed since
+    entry = _author_entry(index, user_id)
+    stats = {'posts': entry['posts'], 'likes': entry['likes'], 'comments': entry['comments']}
+    for post_id, post in index['touched'].items():
+        if post.user_id == user_id:
+            likes, comments = index['base_counts'][post_id]
+            stats['likes'] += post.like_count - likes
+            stats['comments'] += post.comment_count - comments
+    for _, post_id in index['new_by_author'].get(user_id, ()):
+        post = index['new'][post_id]
+        stats['posts'] += 1
+        stats['likes'] += post.like_count
+        stats['comments'] += post.comment_count
+    return stats
 
 def get_post_by_id(post_id):
     """Get post by ID"""
-    posts = load_posts()
-    for post in posts:
-        if post.id == post_id:
-            return post
-    return None
-
-def save_comment(comment):
-    """Save a comment (this is handled within posts)"""
-    # Comments are saved as part of posts
-    pass
+    post = _get_post(_post_index(), post_id)
+    # Callers may modify the post, so hand out a private copy rather than
+    # the instance shared through the cache
+    return copy.deepcopy(post) if post is not None else None
+
+def get_posts_by_ids(post_ids):
+    """Get the posts that exist among post_ids, as a dict by id"""
+    index = _post_index()
+    posts = {post_id: _get_post(index, post_id) for post_id in dict.fromkeys(post_ids)}
+    return {post_id: copy.deepcopy(post) for post_id, post in posts.items() if post is not None}
+
+if __name__ == '__main__':
+    # Build step: split a bundled posts.json into day shards, for deploys
+    # whose data directory is read-only at runtime
+    _split_posts_file()
+    print(f"Split {POSTS_FILE} into {POSTS_DIR}")
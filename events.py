@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Recent events kept for clients catching up after a reconnect
+EVENT_BUFFER_SIZE = int(os.environ.get("EVENT_BUFFER_SIZE", 1000))
+
+# Ids start at the boot time in milliseconds, so they keep increasing across
+# restarts and an id from before a restart reads as too old to catch up from
+_last_id = int(time.time() * 1000)
+_events = deque(maxlen=EVENT_BUFFER_SIZE)
+_condition = threading.Condition()
+
+def publish(event_type, data):
+    """Record an event and wake every stream waiting for one"""
+    global _last_id
+    with _condition:
+        _last_id += 1
+        event = {"id": _last_id, "type": event_type, "data": data}
+        _events.append(event)
+        _condition.notify_all()
+    return event
+
+def last_event_id():
+    """Id of the newest event, for clients to resume from"""
+    with _condition:
+        return _last_id
+
+def events_since(event_id):
+    """Get the events after event_id, and whether none of them were dropped
+
+    When the id is older than the buffer (or from before a restart) the
+    events in between are gone, and the client has to reload instead.
+    """
+    with _condition:
+        events = [event for event in _events if event["id"] > event_id]
+        oldest = _events[0]["id"] if _events else _last_id + 1
+        complete = event_id >= oldest - 1 and event_id <= _last_id
+        return events, complete
+
+def wait_for_events(event_id, timeout):
+    """Block until there are events after event_id or timeout seconds pass"""
+    with _condition:
+        _condition.wait_for(lambda: _last_id > event_id, timeout)
+    return events_since(event_id)
@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+from flask import Response, g, request
+
+# Add a Server-Timing header breaking down where each request spent its time
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Every metric, in the order they are rendered. Values are kept per process,
+# like the live-update events: each worker exposes its own /metrics.
+_metrics = []
+_lock = threading.Lock()
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    """A count that only goes up, per combination of label values"""
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        _metrics.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        for label_values, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value:g}"
+
+class Gauge(Counter):
+    """A value that goes up and down"""
+    kind = "gauge"
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+class Histogram:
+    """Observations counted into cumulative buckets, with their sum and count"""
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, tuple(labels), tuple(buckets)
+        # label values -> [count per bucket..., count past the last bucket, sum]
+        self._values = {}
+        _metrics.append(self)
+
+    def observe(self, value, *label_values):
+        position = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with _lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[position] += 1
+            entry[-1] += value
+
+    def render(self):
+        for label_values, entry in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), entry):
+                cumulative += count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, [('le', le)])} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {entry[-1]:g}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        for metric in _metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+REQUEST_SECONDS = Histogram("socialfeed_request_duration_seconds",
+                            "Time to produce a response, up to the first byte of streamed ones",
+                            ["endpoint", "method"])
+REQUESTS = Counter("socialfeed_requests_total", "Responses sent", ["endpoint", "method", "status"])
+IN_FLIGHT = Gauge("socialfeed_requests_in_flight", "Requests being handled", ["endpoint"])
+
+STORAGE_READS = Counter("socialfeed_storage_reads_total", "Data files read", ["endpoint", "file"])
+STORAGE_BYTES_READ = Counter("socialfeed_storage_read_bytes_total", "Bytes read and parsed from data files",
+                             ["endpoint", "file"])
+STORAGE_DECODE_SECONDS = Counter("socialfeed_storage_decode_seconds_total",
+                                 "Time spent decoding JSON read from data files", ["endpoint", "file"])
+STORAGE_WRITES = Counter("socialfeed_storage_writes_total", "Data file writes", ["endpoint", "file"])
+STORAGE_BYTES_WRITTEN = Counter("socialfeed_storage_written_bytes_total", "Bytes written to data files",
+                                ["endpoint", "file"])
+STORAGE_ERRORS = Counter("socialfeed_storage_errors_total",
+                         "Storage operations that failed, or journal records skipped as corrupt", ["operation"])
+JOURNAL_COMMIT_WRITES = Histogram("socialfeed_journal_commit_writes",
+                                  "Writes group committed to the posts journal by one fsync",
+                                  buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+
+NEWS_UPSTREAM_SECONDS = Histogram("socialfeed_news_upstream_duration_seconds", "News upstream fetch latency",
+                                  ["category", "outcome"])
+NEWS_FALLBACKS = Counter("socialfeed_news_fallbacks_total",
+                         "News fetches that failed and produced the fallback payload", ["category", "reason"])
+
+# Storage and upstream work done for the request being handled
+_request_stats = ContextVar("request_stats", default=None)
+
+def _current_endpoint():
+    stats = _request_stats.get()
+    # Work outside a request, like journal compaction or news prefetching
+    return stats["endpoint"] if stats is not None else "background"
+
+def _add(name, seconds):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats[name] = stats.get(name, 0) + seconds
+
+def record_read(file, size, read_seconds, decode_seconds):
+    """Count a data file read and the JSON decoding of its contents"""
+    endpoint = _current_endpoint()
+    STORAGE_READS.inc(endpoint, file)
+    STORAGE_BYTES_READ.inc(endpoint, file, amount=size)
+    STORAGE_DECODE_SECONDS.inc(endpoint, file, amount=decode_seconds)
+    _add("storage-read", read_seconds)
+    _add("json-decode", decode_seconds)
+
+def record_write(file, size, seconds):
+    """Count a data file write"""
+    endpoint = _current_endpoint()
+    STORAGE_WRITES.inc(endpoint, file)
+    STORAGE_BYTES_WRITTEN.inc(endpoint, file, amount=size)
+    _add("storage-write", seconds)
+
+def record_storage_error(operation):
+    """Count a failed storage operation, e.g. load_posts or compact_journal"""
+    STORAGE_ERRORS.inc(operation)
+
+def record_group_commit(writes):
+    """Count the writes that shared one journal commit"""
+    JOURNAL_COMMIT_WRITES.observe(writes)
+
+def record_news_fetch(category, outcome, seconds):
+    """Record an upstream news fetch: ok, not_modified, http_error, timeout or error"""
+    NEWS_UPSTREAM_SECONDS.observe(seconds, category, outcome)
+    if outcome not in ("ok", "not_modified"):
+        NEWS_FALLBACKS.inc(category, outcome)
+    _add("news", seconds)
+
+def _start_request():
+    g.metrics_endpoint = request.endpoint or "unmatched"
+    g.metrics_started = time.perf_counter()
+    _request_stats.set({"endpoint": g.metrics_endpoint})
+    IN_FLIGHT.inc(g.metrics_endpoint)
+
+def _finish_request(response):
+    if "metrics_started" not in g:
+        return response
+    elapsed = time.perf_counter() - g.metrics_started
+    REQUEST_SECONDS.observe(elapsed, g.metrics_endpoint, request.method)
+    REQUESTS.inc(g.metrics_endpoint, request.method, str(response.status_code))
+    g.metrics_recorded = True
+    if SERVER_TIMING:
+        stats = _request_stats.get() or {}
+        timings = [f"app;dur={elapsed * 1000:.1f}"]
+        timings += [f"{name};dur={stats[name] * 1000:.1f}" for name in
+                    ("storage-read", "json-decode", "storage-write", "news") if name in stats]
+        response.headers["Server-Timing"] = ", ".join(timings)
+    return response
+
+def _end_request(error=None):
+    if "metrics_started" not in g:
+        return
+    if not g.get("metrics_recorded"):
+        # An unhandled exception skipped _finish_request
+        REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_started, g.metrics_endpoint, request.method)
+        REQUESTS.inc(g.metrics_endpoint, request.method, "500")
+    IN_FLIGHT.dec(g.metrics_endpoint)
+    _request_stats.set(None)
+
+def init_app(app):
+    """Time every request and serve the metrics at /metrics"""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+    app.add_url_rule("/metrics", "metrics",
+                     lambda: Response(render_metrics(), mimetype="text/plain; version=0.0.4"))
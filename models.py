@@ -1,25 +1,39 @@
 from flask_login import UserMixin
 import json
 import os
+import sys
+import threading
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from password_service import hash_password, verify_password, needs_rehash
 import re
 
+REACTION_TYPES = ('like', 'love', 'laugh', 'wow', 'angry', 'sad')
+
+# Lazy posts are shared through the storage cache, so only one thread decodes each
+_load_lock = threading.Lock()
+
 class User(UserMixin):
-    def __init__(self, id, username, password_hash=None, profile_picture=None):
+    # UserMixin has no slots, so instances keep a __dict__, but it stays empty
+    __slots__ = ('id', 'username', 'password_hash', 'profile_picture', 'created_at')
+
+    def __init__(self, id, username, password_hash=None, profile_picture=None, created_at=None):
         self.id = id
         self.username = username
         self.password_hash = password_hash
         self.profile_picture = profile_picture
-        self.created_at = datetime.now().isoformat()
+        self.created_at = created_at or datetime.now().isoformat()
     
     def set_password(self, password):
         """Set password hash"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check if provided password matches hash"""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """Check if the hash was made with outdated parameters"""
+        return needs_rehash(self.password_hash)
     
     @staticmethod
     def validate_username(username):
@@ -49,42 +63,178 @@ class User(UserMixin):
 
     @classmethod
     def from_dict(cls, data):
-        user = cls(data['id'], data['username'], data.get('password_hash'), data.get('profile_picture'))
-        user.created_at = data.get('created_at', datetime.now().isoformat())
-        return user
+        return cls(data['id'], data['username'], data.get('password_hash'), data.get('profile_picture'),
+                   data.get('created_at'))
 
 class Post:
-    def __init__(self, id, user_id, username, content, timestamp=None, likes=None, comments=None, reactions=None):
+    __slots__ = ('id', 'user_id', 'username', 'content', 'timestamp', 'comments', 'comment_count',
+                 '_likes', '_reactions', '_reaction_counts', '_serialized')
+
+    # Comments kept on the post record for the feed; the rest are stored per post
+    RECENT_COMMENTS = 3
+
+    def __init__(self, id, user_id, username, content, timestamp=None, likes=None, comments=None, reactions=None,
+                 comment_count=None, lazy=False):
         self.id = id
         self.user_id = user_id
         self.username = username
         self.content = content
         self.timestamp = timestamp or datetime.now().isoformat()
-        self.likes = likes or []
+        # Posts saved before comments moved out carry every comment here
         self.comments = comments or []
-        self.reactions = reactions or {
-            'like': [],
-            'love': [],
-            'laugh': [],
-            'wow': [],
-            'angry': [],
-            'sad': []
-        }
+        self.comment_count = len(self.comments) if comment_count is None else comment_count
+        # Likes and reactions are kept as user-keyed maps with running counts,
+        # so toggling and counting stay constant time on busy posts. to_dict
+        # still writes the list-per-type shape used in posts.json. A lazy post
+        # keeps the serialized lists until the maps are first needed, unless
+        # they are empty and the maps cost less.
+        self._likes = self._reactions = self._reaction_counts = None
+        # Serialized reactions list every type; only the used ones are kept
+        if reactions and any(reactions.values()):
+            reactions = {reaction: user_ids for reaction, user_ids in reactions.items() if user_ids}
+        else:
+            reactions = None
+        self._serialized = (likes, reactions)
+        if not lazy or not (likes or reactions):
+            self._load()
+
+    def _load(self):
+        """Build the like and reaction maps from the serialized lists"""
+        with _load_lock:
+            if self._serialized is None:
+                return
+            likes, reactions = self._serialized
+            by_user = {}
+            for reaction, user_ids in (reactions or {}).items():
+                reaction = sys.intern(reaction)
+                for user_id in user_ids:
+                    by_user[user_id] = reaction
+            counts = None
+            if by_user:
+                counts = dict.fromkeys(REACTION_TYPES, 0)
+                for reaction in by_user.values():
+                    counts[reaction] = counts.get(reaction, 0) + 1
+            self._likes, self._reactions, self._reaction_counts = dict.fromkeys(likes or ()), by_user, counts
+            # Last, so other threads never see a half-built post
+            self._serialized = None
+
+    @property
+    def likes(self):
+        """IDs of users who liked the post"""
+        if self._serialized is not None:
+            self._load()
+        return self._likes.keys()
+
+    @property
+    def like_count(self):
+        if self._serialized is not None:
+            self._load()
+        return len(self._likes)
+
+    @property
+    def interaction_count(self):
+        """Likes plus reactions, counted without decoding a lazy post"""
+        serialized = self._serialized
+        if serialized is not None:
+            likes, reactions = serialized
+            return len(likes or ()) + sum(len(user_ids) for user_ids in (reactions or {}).values())
+        return len(self._likes) + len(self._reactions)
+
+    def has_liked(self, user_id):
+        if self._serialized is not None:
+            self._load()
+        return user_id in self._likes
+
+    def add_like(self, user_id):
+        """Like the post; returns False if the user already liked it"""
+        if self._serialized is not None:
+            self._load()
+        if user_id in self._likes:
+            return False
+        self._likes[user_id] = None
+        return True
+
+    def remove_like(self, user_id):
+        """Unlike the post; returns False if the user had not liked it"""
+        if self._serialized is not None:
+            self._load()
+        if user_id not in self._likes:
+            return False
+        del self._likes[user_id]
+        return True
+
+    @property
+    def recent_comments(self):
+        """The latest comments, oldest first"""
+        return self.comments[-self.RECENT_COMMENTS:]
+
+    def add_comment(self, comment):
+        """Count a new comment dict and keep it among the recent ones"""
+        self.comment_count += 1
+        self.comments.append(comment)
+        del self.comments[:-self.RECENT_COMMENTS]
+
+    @property
+    def reactions(self):
+        """Reaction type -> IDs of users who reacted with it"""
+        reactions = {reaction: [] for reaction in REACTION_TYPES}
+        serialized = self._serialized
+        if serialized is not None:
+            # Written by to_dict, so already one reaction per user
+            for reaction, user_ids in (serialized[1] or {}).items():
+                reactions[reaction] = list(user_ids)
+            return reactions
+        for user_id, reaction in self._reactions.items():
+            reactions.setdefault(reaction, []).append(user_id)
+        return reactions
+
+    @property
+    def reaction_counts(self):
+        """Reaction type -> number of users who reacted with it"""
+        if self._serialized is not None:
+            self._load()
+        # Most posts have no reactions, so their counts are only built here
+        return self._reaction_counts or dict.fromkeys(REACTION_TYPES, 0)
+
+    def get_reaction(self, user_id):
+        if self._serialized is not None:
+            self._load()
+        return self._reactions.get(user_id)
+
+    def set_reaction(self, user_id, reaction):
+        """Set the user's reaction, replacing any earlier one"""
+        if self._serialized is not None:
+            self._load()
+        previous = self._reactions.get(user_id)
+        if previous == reaction:
+            return
+        counts = self._reaction_counts
+        if counts is None:
+            counts = self._reaction_counts = dict.fromkeys(REACTION_TYPES, 0)
+        if previous is not None:
+            counts[previous] -= 1
+        # Every user's reaction shares one string per type instead of a copy per decoded record
+        reaction = sys.intern(reaction)
+        self._reactions[user_id] = reaction
+        counts[reaction] = counts.get(reaction, 0) + 1
 
     def to_dict(self):
+        serialized = self._serialized
         return {
             'id': self.id,
             'user_id': self.user_id,
             'username': self.username,
             'content': self.content,
             'timestamp': self.timestamp,
-            'likes': self.likes,
+            'likes': list(serialized[0] or ()) if serialized is not None else list(self._likes),
             'comments': self.comments,
+            'comment_count': self.comment_count,
             'reactions': self.reactions
         }
 
     @classmethod
-    def from_dict(cls, data):
+    def from_dict(cls, data, lazy=False):
+        """Build a post from its posts.json record; lazy defers decoding likes and reactions"""
         return cls(
             data['id'],
             data['user_id'],
@@ -93,13 +243,14 @@ class Post:
             data.get('timestamp'),
             data.get('likes', []),
             data.get('comments', []),
-            data.get('reactions', {
-                'like': [], 'love': [], 'laugh': [], 
-                'wow': [], 'angry': [], 'sad': []
-            })
+            data.get('reactions'),
+            data.get('comment_count'),
+            lazy
         )
 
 class Comment:
+    __slots__ = ('id', 'post_id', 'user_id', 'username', 'content', 'timestamp')
+
     def __init__(self, id, post_id, user_id, username, content, timestamp=None):
         self.id = id
         self.post_id = post_id
@@ -1,91 +1,223 @@
-import requests
+import json
+import metrics
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Free News API configuration (no API key required)
-SAURAV_NEWS_BASE = "https://saurav.tech/NewsAPI"
+SAURAV_NEWS_BASE = os.environ.get("NEWS_API_BASE", "https://saurav.tech/NewsAPI")
+
+# Seconds a fetched category is served before it is refreshed in the background
+NEWS_CACHE_TTL = int(os.environ.get("NEWS_CACHE_TTL", 300))
+# Seconds to wait before retrying upstream after a failed fetch
+NEWS_RETRY_SECONDS = int(os.environ.get("NEWS_RETRY_SECONDS", 30))
+
+# Formatted news saved here so a fresh instance can serve it without fetching
+NEWS_SNAPSHOT_FILE = os.environ.get(
+    "NEWS_SNAPSHOT_FILE", os.path.join(os.environ.get("DATA_DIR", "data"), "news_snapshot.json"))
+
+# Threads (and pooled upstream connections) used to fetch categories in parallel
+NEWS_WORKERS = int(os.environ.get("NEWS_WORKERS", 5))
+
+# category -> (upstream category, display title)
+NEWS_CATEGORIES = {
+    "general": ("general", "General"),
+    "sports": ("sports", "Sports"),
+    "technology": ("technology", "Technology"),
+    "finance": ("business", "Financial"),
+    "entertainment": ("entertainment", "Entertainment")
+}
+
+_session = None
+_executor = None
+
+# category -> {"payload": formatted news, "expires_at": monotonic deadline,
+#              "fetched_at": wall-clock time, "etag"/"last_modified": validators}
+_news_cache = {}
+# category -> Event set when the in-flight fetch for it finishes
+_refreshing = {}
+_news_lock = threading.Lock()
+_snapshot_lock = threading.Lock()
+
+def _get_session():
+    """Get the HTTP session shared by all upstream fetches, so connections are reused"""
+    global _session
+    if _session is None:
+        with _news_lock:
+            if _session is None:
+                # Imported on first fetch: requests is the slowest import in the app,
+                # and news served from the cache or snapshot never needs it
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=NEWS_WORKERS)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def _get_executor():
+    """Get the bounded thread pool used for parallel category fetches"""
+    global _executor
+    if _executor is None:
+        with _news_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=NEWS_WORKERS, thread_name_prefix="news")
+    return _executor
 
 def get_news_by_category(category):
-    """Fetch news from various APIs based on category"""
+    """Get news for a category, served from cache and refreshed in the background"""
+    if category not in NEWS_CATEGORIES:
+        category = "general"
     
-    if category == "general":
-        return get_general_news()
-    elif category == "sports":
-        return get_sports_news()
-    elif category == "technology":
-        return get_tech_news()
-    elif category == "finance":
-        return get_financial_news()
-    elif category == "entertainment":
-        return get_entertainment_news()
-    else:
-        return get_general_news()
-
-def get_general_news():
-    """Fetch general news from free API"""
-    try:
-        url = f"{SAURAV_NEWS_BASE}/top-headlines/category/general/us.json"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return format_news_data(data.get("articles", []), "General News")
-        else:
-            return get_fallback_news("General")
-    except Exception as e:
-        return get_fallback_news("General")
+    with _news_lock:
+        entry = _news_cache.get(category)
+        event, claimed = None, False
+        if entry is None or time.monotonic() >= entry["expires_at"]:
+            event, claimed = _claim_refresh(category)
+    
+    if entry is not None:
+        # Serve what we have, even if stale, and let one thread refresh it
+        if claimed:
+            _get_executor().submit(_refresh_news, category, event)
+        return entry["payload"]
+    
+    # Nothing cached yet: one caller fetches, concurrent callers wait for it
+    if claimed:
+        _refresh_news(category, event)
+    elif not event.wait(timeout=15):
+        return get_fallback_news(NEWS_CATEGORIES[category][1])
+    return _news_cache[category]["payload"]
+
+def get_news_for_categories(categories):
+    """Get news for several categories at once, fetching cache misses in parallel"""
+    categories = list(dict.fromkeys(categories))
+    return dict(zip(categories, _get_executor().map(get_news_by_category, categories)))
+
+def warm_news_cache(wait=True):
+    """Fetch every category in parallel so the first visitors hit a warm cache"""
+    if wait:
+        return get_news_for_categories(NEWS_CATEGORIES)
+    threading.Thread(target=get_news_for_categories, args=(list(NEWS_CATEGORIES),), daemon=True).start()
+
+def _claim_refresh(category):
+    """Return the category's in-flight refresh event and whether the caller must run it"""
+    event = _refreshing.get(category)
+    if event is not None:
+        return event, False
+    event = _refreshing[category] = threading.Event()
+    return event, True
 
-def get_sports_news():
-    """Fetch sports news from free API"""
+def _refresh_news(category, event):
+    """Fetch a category from upstream and update the cache"""
     try:
-        url = f"{SAURAV_NEWS_BASE}/top-headlines/category/sports/us.json"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return format_news_data(data.get("articles", []), "Sports News")
-        else:
-            return get_fallback_news("Sports")
-    except Exception as e:
-        return get_fallback_news("Sports")
+        with _news_lock:
+            previous = _news_cache.get(category)
+        # Only revalidate a payload we got from upstream, never a fallback
+        validators = previous if previous and "error" not in previous["payload"] else {}
+        try:
+            payload, headers = fetch_news(category, validators.get("etag"), validators.get("last_modified"))
+        except Exception as e:
+            payload, headers = get_fallback_news(NEWS_CATEGORIES[category][1]), {}
+        
+        now = time.monotonic()
+        with _news_lock:
+            if payload is None:
+                # 304 Not Modified: the payload we have is current again
+                entry = dict(previous, expires_at=now + NEWS_CACHE_TTL, fetched_at=time.time())
+                entry["payload"] = dict(previous["payload"], last_updated=datetime.now().isoformat())
+            elif "error" not in payload:
+                entry = {
+                    "payload": payload,
+                    "expires_at": now + NEWS_CACHE_TTL,
+                    "fetched_at": time.time(),
+                    "etag": headers.get("ETag"),
+                    "last_modified": headers.get("Last-Modified")
+                }
+            else:
+                # Keep serving the last good payload until upstream recovers
+                entry = dict(previous or {"payload": payload}, expires_at=now + NEWS_RETRY_SECONDS)
+            _news_cache[category] = entry
+    finally:
+        with _news_lock:
+            del _refreshing[category]
+        event.set()
+    if payload is None or "error" not in payload:
+        save_news_snapshot()
 
-def get_tech_news():
-    """Fetch technology news from free API"""
+def save_news_snapshot():
+    """Write the good cached payloads to NEWS_SNAPSHOT_FILE"""
+    with _news_lock:
+        snapshot = {
+            category: {key: value for key, value in entry.items() if key != "expires_at"}
+            for category, entry in _news_cache.items()
+            if "error" not in entry["payload"]
+        }
     try:
-        url = f"{SAURAV_NEWS_BASE}/top-headlines/category/technology/us.json"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return format_news_data(data.get("articles", []), "Technology News")
-        else:
-            return get_fallback_news("Technology")
-    except Exception as e:
-        return get_fallback_news("Technology")
+        with _snapshot_lock:
+            temp_file = NEWS_SNAPSHOT_FILE + ".tmp"
+            with open(temp_file, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(temp_file, NEWS_SNAPSHOT_FILE)
+    except OSError as e:
+        # Read-only deployments still serve from memory
+        pass
 
-def get_financial_news():
-    """Fetch financial news from free API"""
+def load_news_snapshot():
+    """Seed the cache from NEWS_SNAPSHOT_FILE, keeping each entry's remaining TTL"""
     try:
-        url = f"{SAURAV_NEWS_BASE}/top-headlines/category/business/us.json"
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            return format_news_data(data.get("articles", []), "Financial News")
-        else:
-            return get_fallback_news("Financial")
-    except Exception as e:
-        return get_fallback_news("Financial")
+        with open(NEWS_SNAPSHOT_FILE) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        return
+    now, wall_now = time.monotonic(), time.time()
+    with _news_lock:
+        for category, entry in snapshot.items():
+            if category in NEWS_CATEGORIES and category not in _news_cache:
+                age = max(0, wall_now - entry.get("fetched_at", 0))
+                _news_cache[category] = dict(entry, expires_at=now + NEWS_CACHE_TTL - age)
+
+def clear_news_cache():
+    """Drop all cached news"""
+    with _news_lock:
+        _news_cache.clear()
 
-def get_entertainment_news():
-    """Fetch entertainment news from free API"""
+def fetch_news(category, etag=None, last_modified=None):
+    """Fetch a category from the free news API.
+
+    Sends the validators from an earlier response so an unchanged feed costs
+    a 304. Returns (payload, response headers), with payload None on a 304.
+    """
+    path, title = NEWS_CATEGORIES[category]
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    started = time.perf_counter()
+    session = _get_session()
+    import requests
     try:
-        url = f"{SAURAV_NEWS_BASE}/top-headlines/category/entertainment/us.json"
-        response = requests.get(url, timeout=10)
+        url = f"{SAURAV_NEWS_BASE}/top-headlines/category/{path}/us.json"
+        response = session.get(url, headers=headers, timeout=10)
+        if response.status_code == 304 and headers:
+            metrics.record_news_fetch(category, "not_modified", time.perf_counter() - started)
+            return None, response.headers
         if response.status_code == 200:
             data = response.json()
-            return format_news_data(data.get("articles", []), "Entertainment News")
+            metrics.record_news_fetch(category, "ok", time.perf_counter() - started)
+            return format_news_data(data.get("articles", []), f"{title} News"), response.headers
         else:
-            return get_fallback_news("Entertainment")
+            metrics.record_news_fetch(category, "http_error", time.perf_counter() - started)
+            return get_fallback_news(title), {}
+    except requests.Timeout:
+        metrics.record_news_fetch(category, "timeout", time.perf_counter() - started)
+        return get_fallback_news(title), {}
     except Exception as e:
-        return get_fallback_news("Entertainment")
-
+        metrics.record_news_fetch(category, "error", time.perf_counter() - started)
+        return get_fallback_news(title), {}
 
 def format_news_data(articles, category_title):
     """Format news articles for display"""
@@ -119,3 +251,11 @@ def get_fallback_news(category):
         "last_updated": datetime.now().isoformat(),
         "error": "News service temporarily unavailable. Please check your API configuration."
     }
+
+load_news_snapshot()
+
+if __name__ == '__main__':
+    # Build step: fetch every category and write the snapshot bundled with a deploy
+    warm_news_cache()
+    save_news_snapshot()
+    print(f"Saved news snapshot to {NEWS_SNAPSHOT_FILE}")
@@ -0,0 +1,113 @@
+import compileall
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from flask import render_template, request, session, make_response, g
+from flask_login import current_user
+from jinja2 import ChoiceLoader, ModuleLoader
+from markupsafe import Markup
+from static_assets import assets_version
+from storage import get_storage
+
+# Rendered post cards kept in memory, least recently used dropped first
+POST_FRAGMENT_CACHE_SIZE = int(os.environ.get("POST_FRAGMENT_CACHE_SIZE", 2000))
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+def _templates_version():
+    """Hash the templates, so a deploy that changes them changes every ETag"""
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(TEMPLATES_DIR)):
+        digest.update(name.encode())
+        with open(os.path.join(TEMPLATES_DIR, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+RENDER_VERSION = _templates_version()
+
+# Templates compiled to Python modules by a build step (python page_cache.py)
+COMPILED_TEMPLATES_DIR = os.environ.get(
+    "COMPILED_TEMPLATES_DIR", os.path.join(os.path.dirname(TEMPLATES_DIR), "templates_compiled"))
+
+_fragments = OrderedDict()
+_fragments_lock = threading.Lock()
+
+def viewer_key():
+    """What a rendered page depends on about the logged-in user"""
+    if current_user.is_authenticated:
+        return (current_user.get_id(), current_user.username, current_user.profile_picture)
+    return None
+
+def following_ids():
+    """IDs of the users the logged-in user follows, read once per request"""
+    if not current_user.is_authenticated:
+        return set()
+    if "following_ids" not in g:
+        g.following_ids = get_storage().get_following(current_user.id)
+    return g.following_ids
+
+def render_post_card(template, post):
+    """Render a post card, reusing the html of an earlier render of the same post version"""
+    viewer = viewer_key()
+    # Posts only change through likes, reactions and (append-only) comments
+    key = (template, post.id, post.like_count, post.comment_count, tuple(post.reaction_counts.items()),
+           viewer, viewer is not None and post.has_liked(current_user.id), post.user_id in following_ids())
+    with _fragments_lock:
+        html = _fragments.get(key)
+        if html is not None:
+            _fragments.move_to_end(key)
+            return html
+    html = Markup(render_template(template, post=post))
+    with _fragments_lock:
+        _fragments[key] = html
+        while len(_fragments) > POST_FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
+    return html
+
+def use_compiled_templates(app):
+    """Load templates from COMPILED_TEMPLATES_DIR if it was built from the current ones"""
+    try:
+        with open(os.path.join(COMPILED_TEMPLATES_DIR, "VERSION")) as f:
+            if f.read().strip() != RENDER_VERSION:
+                return False
+    except OSError:
+        return False
+    # Templates missing from the build still load from the templates directory
+    app.jinja_env.loader = ChoiceLoader([ModuleLoader(COMPILED_TEMPLATES_DIR), app.jinja_env.loader])
+    return True
+
+def compile_templates(app, target=COMPILED_TEMPLATES_DIR):
+    """Compile every template to a Python module (and its bytecode) in target"""
+    app.jinja_env.compile_templates(target, zip=None)
+    compileall.compile_dir(target, quiet=1)
+    with open(os.path.join(target, "VERSION"), "w") as f:
+        f.write(RENDER_VERSION)
+
+def make_etag(*versions):
+    """Strong ETag for the current request, given the versions of the data it shows"""
+    # Post cards show whether the viewer follows their authors, and pages
+    # link to the static files by fingerprint
+    key = (RENDER_VERSION, assets_version(), request.full_path, viewer_key(), sorted(following_ids())) + versions
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+def not_modified(etag):
+    """A 304 response if the client already has etag, else None"""
+    # Flashed messages are rendered into pages without being part of the ETag.
+    # Compressed responses carry the ETag weakened, so compare weakly.
+    if not request.if_none_match.contains_weak(etag) or session.get("_flashes"):
+        return None
+    return with_etag(make_response("", 304), etag)
+
+def with_etag(response, etag):
+    """Tag a response so the browser revalidates it with If-None-Match"""
+    response = make_response(response)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+if __name__ == '__main__':
+    # Build step: compile the templates bundled with a deploy
+    from app import app
+    compile_templates(app)
+    print(f"Compiled templates to {COMPILED_TEMPLATES_DIR}")
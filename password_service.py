@@ -0,0 +1,86 @@
+import os
+import threading
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+# Hash parameters for new and upgraded passwords (Werkzeug method string)
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+
+# Processes that run password hashing; 0 hashes on the calling thread instead
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", min(os.cpu_count() or 1, 4)))
+# Hashing jobs allowed to queue or run at once before callers are turned away
+HASH_QUEUE_LIMIT = int(os.environ.get("HASH_QUEUE_LIMIT", max(HASH_WORKERS, 1) * 8))
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+
+class HashingBusyError(Exception):
+    """Raised when too many password hashing jobs are already queued"""
+
+def _get_executor():
+    """Get the process pool, or None when hashing runs inline"""
+    global _executor, HASH_WORKERS
+    if HASH_WORKERS <= 0:
+        return None
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                # Imported on first use; multiprocessing is slow to import on a cold start
+                from concurrent.futures import ProcessPoolExecutor
+                try:
+                    _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+                except (OSError, NotImplementedError) as e:
+                    # Some serverless sandboxes have no multiprocessing support
+                    HASH_WORKERS = 0
+                    return None
+    return _executor
+
+def _release(future):
+    global _pending
+    with _lock:
+        _pending -= 1
+
+def _run(func, *args):
+    """Run a hashing function in the pool, refusing work past the queue limit"""
+    global _pending
+    with _lock:
+        if _pending >= HASH_QUEUE_LIMIT:
+            raise HashingBusyError("Password hashing queue is full")
+        _pending += 1
+    try:
+        executor = _get_executor()
+        if executor is None:
+            try:
+                return func(*args)
+            finally:
+                _release(None)
+        future = executor.submit(func, *args)
+    except Exception:
+        _release(None)
+        raise
+    future.add_done_callback(_release)
+    return future.result()
+
+def hash_password(password):
+    """Hash a password with PASSWORD_HASH_METHOD"""
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash"""
+    return _run(check_password_hash, password_hash, password)
+
+def _expand_method(method):
+    """A Werkzeug method string as written into hashes, defaults filled in (scrypt -> scrypt:32768:8:1)"""
+    name, *args = method.split(":")
+    if name == "scrypt":
+        args = [int(arg) for arg in args] or [2 ** 15, 8, 1]
+    elif name == "pbkdf2":
+        args = (args or ["sha256"])[:1] + [int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS]
+    return ":".join([name] + [str(arg) for arg in args])
+
+# PASSWORD_HASH_METHOD with Werkzeug's defaults filled in, to compare stored hashes with
+HASH_METHOD_PREFIX = _expand_method(PASSWORD_HASH_METHOD)
+
+def needs_rehash(password_hash):
+    """Whether a stored hash was made with different parameters than PASSWORD_HASH_METHOD"""
+    return password_hash.split("$", 1)[0] != HASH_METHOD_PREFIX
@@ -0,0 +1,67 @@
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+# The posts snapshot is split into one file per day of posts, so reading the
+# newest page or one post only parses the days it needs. Post ids and
+# authors are mapped to their days by lookup files split into buckets.
+ID_BUCKETS = 256
+AUTHOR_BUCKETS = 64
+# Parsed shard and lookup files kept in memory per process
+SHARD_CACHE_SIZE = int(os.environ.get("POST_SHARD_CACHE_SIZE", 16))
+# Day of posts without a timestamp, which sort before every other post
+UNDATED = "0000-00-00"
+
+def shard_name(timestamp):
+    """The day shard a post with this ISO timestamp is stored in"""
+    return (timestamp or "")[:10] or UNDATED
+
+def id_bucket(post_id):
+    """The lookup bucket mapping this post id to its day"""
+    return str(zlib.crc32(post_id.encode()) % ID_BUCKETS)
+
+def author_bucket(user_id):
+    """The lookup bucket listing this author's days and post stats"""
+    return str(zlib.crc32(str(user_id).encode()) % AUTHOR_BUCKETS)
+
+def shard_file(name, generation):
+    """File name of a shard or lookup bucket as written by a compaction generation"""
+    return f"{name}.{generation}.json"
+
+def counts(record):
+    """(likes, comments) of a post record"""
+    comment_count = record.get('comment_count')
+    if comment_count is None:
+        comment_count = len(record.get('comments') or ())
+    return len(record.get('likes') or ()), comment_count
+
+class FileCache:
+    """Parsed files by name, dropping the least recently used past SHARD_CACHE_SIZE
+
+    Files are never changed once written (a compaction writes new names),
+    so an entry never goes stale.
+    """
+
+    def __init__(self, size=SHARD_CACHE_SIZE):
+        self._size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name, load):
+        with self._lock:
+            value = self._entries.get(name)
+            if value is not None:
+                self._entries.move_to_end(name)
+                return value
+        # Parsed outside the lock; two threads may both load a file once
+        value = load(name)
+        with self._lock:
+            self._entries[name] = value
+            while len(self._entries) > self._size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -1,35 +1,235 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, g, Response, \
+    current_app, stream_with_context
 from flask_login import login_required, current_user
-from models import Post, Comment
-from data_store import save_post, get_all_posts, get_post_by_id, save_comment
-from news_service import get_news_by_category
+from models import Post, Comment, REACTION_TYPES
+from storage import get_storage, encode_cursor, decode_cursor, encode_search_cursor, decode_search_cursor
+from search_index import parse_query
+from page_cache import render_post_card, following_ids, make_etag, not_modified, with_etag
+from trending import TRENDING_WINDOWS, DEFAULT_WINDOW
+import events
+import json
+import os
+import time
 import uuid
 from datetime import datetime
+from functools import partial
 
 main_routes = Blueprint("main_routes", __name__)
+main_routes.add_app_template_global(render_post_card)
+main_routes.add_app_template_global(following_ids)
+
+# Posts per feed page, and the most a client may ask for at once
+FEED_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+# Older comments fetched per "load more"
+COMMENTS_PAGE_SIZE = 20
+
+# Operations accepted by /api/batch, and the most it applies at once
+OPERATIONS = ("like", "unlike", "toggle_like", "react", "comment")
+BATCH_MAX_OPERATIONS = int(os.environ.get("BATCH_MAX_OPERATIONS", 100))
+
+# Seconds between keep-alive comments on an idle event stream
+STREAM_HEARTBEAT = 15
+# Seconds before a stream is closed; browsers reconnect and resume from the
+# last event id, which keeps worker threads from being held indefinitely
+STREAM_TIMEOUT = int(os.environ.get("STREAM_TIMEOUT", 300))
+# Each open stream holds a worker thread, so pages poll /api/events unless
+# the server has threads to spare for every open tab
+EVENT_STREAM = os.environ.get("EVENT_STREAM", "0") == "1"
+
+@main_routes.before_request
+def remember_last_event_id():
+    """Note the newest event before reading any data, so the page resumes from it"""
+    g.last_event_id = events.last_event_id()
+    g.event_stream = EVENT_STREAM
+
+def api_error(message):
+    """Log the exception being handled and answer with a JSON 500 error"""
+    current_app.logger.exception(message)
+    return jsonify({"error": message}), 500
+
+def get_posts_page(fetch, cursor=None, limit=FEED_PAGE_SIZE):
+    """Get a page of posts from fetch(limit, before) and the cursor of the page after it"""
+    before = decode_cursor(cursor) if cursor else None
+    posts = fetch(limit + 1, before)
+    next_cursor = encode_cursor(posts[limit - 1].timestamp, posts[limit - 1].id) if len(posts) > limit else None
+    return posts[:limit], next_cursor
+
+def get_search_page(query, cursor=None, limit=FEED_PAGE_SIZE):
+    """Get a page of posts matching a search query and the cursor of the page after it"""
+    before = decode_search_cursor(cursor) if cursor else None
+    results = get_storage().search_posts(parse_query(query), limit + 1, before)
+    next_cursor = encode_search_cursor(results[limit - 1][0]) if len(results) > limit else None
+    return [post for _, post in results[:limit]], next_cursor
+
+def publish_reaction_counts(post):
+    """Publish a post's new like and reaction counts"""
+    events.publish("reactions", {
+        "post_id": post.id,
+        "like_count": post.like_count,
+        "reaction_counts": dict(post.reaction_counts),
+        "html": render_template("reaction_summary.html", post=post)
+    })
+
+def validate_operation(operation, posts):
+    """Get the (error message, status) that makes an operation invalid, or None"""
+    if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+        return "Unknown operation", 400
+    if not isinstance(operation.get("post_id"), str) or operation["post_id"] not in posts:
+        return "Post not found", 404
+    if operation["op"] == "react" and operation.get("reaction") not in REACTION_TYPES:
+        return "Invalid reaction type", 400
+    if operation["op"] == "comment":
+        content = operation.get("content")
+        if not isinstance(content, str) or not content.strip():
+            return "Comment content cannot be empty", 400
+    return None
+
+def apply_operations(operations):
+    """Apply post operations for the current user, reading the posts once and writing once
+
+    Returns (results, errors). When any operation is invalid nothing is
+    applied and errors has a (message, status) or None for each one.
+    Results show each post's counts as they are after the whole batch.
+    """
+    storage = get_storage()
+    posts = storage.get_posts_by_ids([operation["post_id"] for operation in operations
+                                      if isinstance(operation, dict) and isinstance(operation.get("post_id"), str)])
+    errors = [validate_operation(operation, posts) for operation in operations]
+    if any(errors):
+        return None, errors
+    
+    # Likes are resolved against the state left by the operations before them
+    liked = {post_id: post.has_liked(current_user.id) for post_id, post in posts.items()}
+    # Per operation: the new comment dict, or whether the post ends up liked
+    mutations, outcomes = [], []
+    for operation in operations:
+        post_id, op = operation["post_id"], operation["op"]
+        mutation = {"op": op, "post_id": post_id, "user_id": current_user.id}
+        outcome = None
+        if op == "react":
+            mutations.append(dict(mutation, reaction=operation["reaction"]))
+        elif op == "comment":
+            outcome = Comment(
+                id=str(uuid.uuid4()),
+                post_id=post_id,
+                user_id=current_user.id,
+                username=current_user.username,
+                content=operation["content"].strip()
+            ).to_dict()
+            mutations.append(dict(mutation, comment=outcome))
+        else:
+            outcome = not liked[post_id] if op == "toggle_like" else op == "like"
+            if outcome != liked[post_id]:
+                mutations.append(dict(mutation, op="like" if outcome else "unlike"))
+                liked[post_id] = outcome
+        outcomes.append(outcome)
+    if mutations:
+        posts.update(storage.apply_mutations(mutations))
+    
+    results = []
+    for operation, outcome in zip(operations, outcomes):
+        post = posts[operation["post_id"]]
+        if operation["op"] == "comment":
+            result = {
+                "post_id": post.id,
+                "comment": outcome,
+                "comment_count": post.comment_count,
+                "html": render_template("comment.html", comment=outcome)
+            }
+            events.publish("comment", result)
+        elif operation["op"] == "react":
+            result = {"post_id": post.id, "reactions": dict(post.reaction_counts)}
+        else:
+            result = {"post_id": post.id, "liked": outcome, "like_count": post.like_count}
+        results.append(result)
+    for post_id in dict.fromkeys(m["post_id"] for m in mutations if m["op"] != "comment"):
+        publish_reaction_counts(posts[post_id])
+    return results, None
+
+def operation_response(operation):
+    """Apply one operation and respond with its result, as the single-action routes do"""
+    results, errors = apply_operations([operation])
+    if errors:
+        message, status = errors[0]
+        return jsonify({"error": message}), status
+    return jsonify(dict(results[0], success=True))
+
+def render_event(event):
+    """Add the html a client needs to apply an event to its page"""
+    if event["type"] == "post":
+        # Post cards depend on the viewer, so they are rendered per client
+        post = Post.from_dict(event["data"]["post"])
+        event = dict(event, data=dict(event["data"], html=render_post_card("post_card.html", post)))
+    return event
+
+def format_sse(event):
+    """Format an event for a text/event-stream response"""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+def get_page_limit(default=FEED_PAGE_SIZE):
+    """Read the requested page size, clamped to MAX_PAGE_SIZE"""
+    return min(max(request.args.get("limit", default, type=int), 1), MAX_PAGE_SIZE)
+
+@main_routes.app_template_global()
+def older_comments_cursor(post):
+    """Cursor for the comments before the ones shown with a post"""
+    oldest = post.recent_comments[0]
+    return encode_cursor(oldest.get('timestamp') or '', oldest['id'])
+
+def home_timeline_fetch():
+    """fetch(limit, before) for the logged-in user's home timeline"""
+    return partial(get_storage().get_home_timeline, current_user.id)
 
 @main_routes.route("/")
 def index():
-    """Main social media feed"""
-    posts = get_all_posts()
-    # Sort posts by timestamp (newest first)
-    posts.sort(key=lambda x: x.timestamp, reverse=True)
-    return render_template("index.html", posts=posts)
+    """Main social media feed: everyone's posts, or with ?feed=following the user's home timeline
+    and with ?feed=trending the most engaging posts lately"""
+    storage = get_storage()
+    feed = request.args.get("feed")
+    if feed not in ("following", "trending") or (feed == "following" and not current_user.is_authenticated):
+        feed = "everyone"
+    # Decay never reorders trending posts, so their order too only changes
+    # with the data. The event id the page embeds is left out: it is per
+    # worker, and a page served from cache catches up from its older one.
+    etag = make_etag(storage.get_data_version())
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    if feed == "trending":
+        posts = [post for post, _ in storage.get_trending_posts(DEFAULT_WINDOW, FEED_PAGE_SIZE)]
+        next_cursor = None
+    else:
+        posts, next_cursor = get_posts_page(home_timeline_fetch() if feed == "following" else storage.get_recent_posts)
+    return with_etag(render_template("index.html", posts=posts, next_cursor=next_cursor, feed=feed), etag)
 
 @main_routes.route("/news")
 def news():
     """News aggregation page"""
+    from news_service import get_news_by_category
     category = request.args.get('category', 'general')
     news_data = get_news_by_category(category)
     return render_template("news.html", news_data=news_data, category=category)
 
+@main_routes.route("/search")
+def search():
+    """Search results page"""
+    query = request.args.get('q', '').strip()
+    posts, next_cursor = get_search_page(query)
+    return render_template("search.html", posts=posts, query=query, next_cursor=next_cursor)
+
 @main_routes.route("/profile")
 @login_required
 def profile():
     """User profile page"""
-    user_posts = [post for post in get_all_posts() if post.user_id == current_user.id]
-    user_posts.sort(key=lambda x: x.timestamp, reverse=True)
-    return render_template("profile.html", posts=user_posts)
+    storage = get_storage()
+    etag = make_etag(storage.get_user_version(current_user.id))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    user_posts, next_cursor = get_posts_page(partial(storage.get_posts_by_user, current_user.id))
+    stats = storage.get_user_stats(current_user.id)
+    return with_etag(render_template("profile.html", posts=user_posts, stats=stats, next_cursor=next_cursor), etag)
 
 @main_routes.route("/api/posts", methods=["POST"])
 @login_required
@@ -48,109 +248,323 @@ def create_post():
             content=content
         )
         
-        save_post(post)
+        post = get_storage().add_post(post)
+        events.publish("post", {"post": post.to_dict()})
         return jsonify({
             "success": True,
-            "post": post.to_dict()
+            "post": post.to_dict(),
+            "html": render_post_card("post_card.html", post)
         })
     
-    except Exception as e:
-        return jsonify({"error": "Failed to create post"}), 500
+    except Exception:
+        return api_error("Failed to create post")
 
 @main_routes.route("/api/posts/<post_id>/like", methods=["POST"])
 @login_required
 def toggle_like(post_id):
     """API endpoint to like/unlike a post"""
     try:
-        post = get_post_by_id(post_id)
-        if not post:
+        return operation_response({"op": "toggle_like", "post_id": post_id})
+    except Exception:
+        return api_error("Failed to toggle like")
+
+@main_routes.route("/api/posts/<post_id>/react", methods=["POST"])
+@login_required
+def add_reaction(post_id):
+    """API endpoint to add reaction to a post"""
+    try:
+        # Replaces any reaction the user had already given
+        return operation_response({"op": "react", "post_id": post_id, "reaction": request.json.get("reaction")})
+    except Exception:
+        return api_error("Failed to add reaction")
+
+@main_routes.route("/api/posts/<post_id>/comments", methods=["POST"])
+@login_required
+def add_comment(post_id):
+    """API endpoint to add a comment to a post"""
+    try:
+        return operation_response({"op": "comment", "post_id": post_id, "content": request.json.get("content", "")})
+    except Exception:
+        return api_error("Failed to add comment")
+
+@main_routes.route("/api/batch", methods=["POST"])
+@login_required
+def batch():
+    """API endpoint to apply a list of likes, reactions and comments in one write"""
+    try:
+        body = request.get_json(silent=True)
+        operations = body.get("operations") if isinstance(body, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return jsonify({"error": "Expected a non-empty list of operations"}), 400
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            return jsonify({"error": f"At most {BATCH_MAX_OPERATIONS} operations per batch"}), 400
+        
+        results, errors = apply_operations(operations)
+        if errors:
+            # Nothing was applied
+            return jsonify({
+                "error": "Invalid operations",
+                "errors": [{"error": error[0]} if error else None for error in errors]
+            }), 400
+        return jsonify({"success": True, "results": results})
+    
+    except Exception:
+        return api_error("Failed to apply operations")
+
+@main_routes.route("/api/posts/<post_id>/comments", methods=["GET"])
+def get_comments_api(post_id):
+    """API endpoint to get a page of a post's comments"""
+    try:
+        storage = get_storage()
+        if not storage.get_post_by_id(post_id):
             return jsonify({"error": "Post not found"}), 404
         
-        if current_user.id in post.likes:
-            post.likes.remove(current_user.id)
-            liked = False
-        else:
-            post.likes.append(current_user.id)
-            liked = True
+        cursor = request.args.get("cursor")
+        limit = get_page_limit(COMMENTS_PAGE_SIZE)
+        try:
+            before = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
         
-        save_post(post)
+        comments = storage.get_post_comments(post_id, limit + 1, before)
+        next_cursor = None
+        if len(comments) > limit:
+            comments = comments[:limit]
+            next_cursor = encode_cursor(comments[-1].get('timestamp') or '', comments[-1]['id'])
+        
+        # Comments are returned newest first; the html is oldest first, ready to prepend
         return jsonify({
-            "success": True,
-            "liked": liked,
-            "like_count": len(post.likes)
+            "comments": comments,
+            "html": "".join(render_template("comment.html", comment=comment) for comment in reversed(comments)),
+            "next_cursor": next_cursor
         })
     
-    except Exception as e:
-        return jsonify({"error": "Failed to toggle like"}), 500
+    except Exception:
+        return api_error("Failed to load comments")
 
-@main_routes.route("/api/posts/<post_id>/react", methods=["POST"])
-@login_required
-def add_reaction(post_id):
-    """API endpoint to add reaction to a post"""
+@main_routes.route("/api/feed")
+def get_feed_api():
+    """API endpoint to get a page of the feed"""
     try:
-        post = get_post_by_id(post_id)
-        if not post:
-            return jsonify({"error": "Post not found"}), 404
+        storage = get_storage()
+        etag = make_etag(storage.get_data_version())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        try:
+            posts, next_cursor = get_posts_page(storage.get_recent_posts,
+                                                request.args.get("cursor"), get_page_limit())
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
         
-        reaction_type = request.json.get("reaction")
-        if reaction_type not in post.reactions:
-            return jsonify({"error": "Invalid reaction type"}), 400
+        return with_etag(jsonify({
+            "posts": [post.to_dict() for post in posts],
+            "html": "".join(render_post_card("post_card.html", post) for post in posts),
+            "next_cursor": next_cursor
+        }), etag)
+    
+    except Exception:
+        return api_error("Failed to load feed")
+
+@main_routes.route("/api/timeline")
+@login_required
+def get_timeline_api():
+    """API endpoint to get a page of the logged-in user's home timeline"""
+    try:
+        etag = make_etag(get_storage().get_data_version())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        try:
+            posts, next_cursor = get_posts_page(home_timeline_fetch(), request.args.get("cursor"), get_page_limit())
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
         
-        # Remove user from all reaction types first
-        for reaction_list in post.reactions.values():
-            if current_user.id in reaction_list:
-                reaction_list.remove(current_user.id)
+        return with_etag(jsonify({
+            "posts": [post.to_dict() for post in posts],
+            "html": "".join(render_post_card("post_card.html", post) for post in posts),
+            "next_cursor": next_cursor
+        }), etag)
+    
+    except Exception:
+        return api_error("Failed to load timeline")
+
+@main_routes.route("/api/trending")
+def get_trending_api():
+    """API endpoint to get the highest scoring posts of a window (hour, day or week)"""
+    try:
+        window = request.args.get("window", DEFAULT_WINDOW)
+        if window not in TRENDING_WINDOWS:
+            return jsonify({"error": f"Invalid window, expected one of: {', '.join(TRENDING_WINDOWS)}"}), 400
         
-        # Add user to the selected reaction
-        post.reactions[reaction_type].append(current_user.id)
+        # Scores decay continuously, so unlike the feed this is not cached by ETag
+        trending = get_storage().get_trending_posts(window, get_page_limit())
+        return jsonify({
+            "window": window,
+            "posts": [dict(post.to_dict(), trending_score=round(score, 4)) for post, score in trending],
+            "html": "".join(render_post_card("post_card.html", post) for post, _ in trending)
+        })
+    
+    except Exception:
+        return api_error("Failed to load trending posts")
+
+@main_routes.route("/api/users/<int:user_id>/follow", methods=["POST", "DELETE"])
+@login_required
+def follow(user_id):
+    """API endpoint to follow (POST) or unfollow (DELETE) a user"""
+    try:
+        storage = get_storage()
+        if user_id == current_user.id:
+            return jsonify({"error": "You cannot follow yourself"}), 400
+        if not storage.get_user_by_id(user_id):
+            return jsonify({"error": "User not found"}), 404
         
-        save_post(post)
+        if request.method == "POST":
+            storage.follow_user(current_user.id, user_id)
+        else:
+            storage.unfollow_user(current_user.id, user_id)
         return jsonify({
             "success": True,
-            "reactions": {k: len(v) for k, v in post.reactions.items()}
+            "following": request.method == "POST",
+            "follower_count": storage.get_follower_count(user_id)
         })
     
-    except Exception as e:
-        return jsonify({"error": "Failed to add reaction"}), 500
+    except Exception:
+        return api_error("Failed to update follow")
 
-@main_routes.route("/api/posts/<post_id>/comments", methods=["POST"])
-@login_required
-def add_comment(post_id):
-    """API endpoint to add a comment to a post"""
+@main_routes.route("/api/search")
+def search_api():
+    """API endpoint to get a page of search results"""
     try:
-        post = get_post_by_id(post_id)
-        if not post:
-            return jsonify({"error": "Post not found"}), 404
+        etag = make_etag(get_storage().get_data_version())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        try:
+            posts, next_cursor = get_search_page(request.args.get("q", ""),
+                                                 request.args.get("cursor"), get_page_limit())
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
         
-        content = request.json.get("content", "").strip()
-        if not content:
-            return jsonify({"error": "Comment content cannot be empty"}), 400
+        return with_etag(jsonify({
+            "posts": [post.to_dict() for post in posts],
+            "html": "".join(render_post_card("post_card.html", post) for post in posts),
+            "next_cursor": next_cursor
+        }), etag)
+    
+    except Exception:
+        return api_error("Search failed")
+
+@main_routes.route("/api/users/<int:user_id>/posts")
+def get_user_posts_api(user_id):
+    """API endpoint to get a page of a user's posts"""
+    try:
+        storage = get_storage()
+        if not storage.get_user_by_id(user_id):
+            return jsonify({"error": "User not found"}), 404
         
-        comment_id = str(uuid.uuid4())
-        comment = Comment(
-            id=comment_id,
-            post_id=post_id,
-            user_id=current_user.id,
-            username=current_user.username,
-            content=content
-        )
+        etag = make_etag(storage.get_user_version(user_id))
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        try:
+            posts, next_cursor = get_posts_page(partial(storage.get_posts_by_user, user_id),
+                                                request.args.get("cursor"), get_page_limit())
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
         
-        post.comments.append(comment.to_dict())
-        save_post(post)
+        return with_etag(jsonify({
+            "posts": [post.to_dict() for post in posts],
+            "html": "".join(render_post_card("profile_post_card.html", post) for post in posts),
+            "next_cursor": next_cursor
+        }), etag)
+    
+    except Exception:
+        return api_error("Failed to load posts")
+
+@main_routes.route("/api/stream")
+def stream_events():
+    """Server-sent events stream of new posts, comments and reaction counts"""
+    if not EVENT_STREAM:
+        return jsonify({"error": "Event stream disabled; poll /api/events"}), 404
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+    try:
+        event_id = int(since) if since else events.last_event_id()
+    except ValueError:
+        return jsonify({"error": "Invalid event id"}), 400
+    
+    @stream_with_context
+    def generate(event_id):
+        deadline = time.monotonic() + STREAM_TIMEOUT
+        yield "retry: 3000\n\n"
+        pending, complete = events.events_since(event_id)
+        while True:
+            if not complete:
+                # Missed events are gone; the client reloads instead
+                yield f"event: reset\ndata: {json.dumps({'last_event_id': events.last_event_id()})}\n\n"
+                return
+            for event in pending:
+                yield format_sse(render_event(event))
+                event_id = event["id"]
+            if not pending:
+                yield ": keep-alive\n\n"
+            if time.monotonic() >= deadline:
+                return
+            pending, complete = events.wait_for_events(event_id, STREAM_HEARTBEAT)
+    
+    return Response(generate(event_id), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@main_routes.route("/api/events")
+def get_events_api():
+    """API endpoint to catch up on the events after since, for reconnects and polling"""
+    try:
+        try:
+            since = int(request.args.get("since", ""))
+        except ValueError:
+            return jsonify({"error": "Invalid event id"}), 400
         
+        pending, complete = events.events_since(since)
         return jsonify({
-            "success": True,
-            "comment": comment.to_dict()
+            "events": [render_event(event) for event in pending] if complete else [],
+            "last_event_id": (pending[-1]["id"] if pending else since) if complete else events.last_event_id(),
+            "reset": not complete
         })
     
-    except Exception as e:
-        return jsonify({"error": "Failed to add comment"}), 500
+    except Exception:
+        return api_error("Failed to load events")
+
+@main_routes.route("/api/news")
+def get_bulk_news_api():
+    """API endpoint to get news for several categories in one request"""
+    from news_service import get_news_for_categories, NEWS_CATEGORIES
+    try:
+        categories = [c.strip() for c in request.args.get("categories", "").split(",") if c.strip()]
+        categories = categories or list(NEWS_CATEGORIES)
+        unknown = [c for c in categories if c not in NEWS_CATEGORIES]
+        if unknown:
+            return jsonify({"error": f"Unknown news categories: {', '.join(unknown)}"}), 400
+        
+        news = get_news_for_categories(categories)
+        # A cached payload keeps its last_updated until it is refreshed
+        etag = make_etag([news_data["last_updated"] for news_data in news.values()])
+        return not_modified(etag) or with_etag(jsonify(news), etag)
+    except Exception:
+        return api_error("Failed to fetch news")
 
 @main_routes.route("/api/news/<category>")
 def get_news_api(category):
     """API endpoint to get news by category"""
+    from news_service import get_news_by_category
     try:
         news_data = get_news_by_category(category)
-        return jsonify(news_data)
-    except Exception as e:
-        return jsonify({"error": "Failed to fetch news"}), 500
+        etag = make_etag(news_data["last_updated"])
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        if request.args.get("html"):
+            # For refreshing the news page in place
+            news_data = dict(news_data, html=render_template("news_articles.html", news_data=news_data))
+        return with_etag(jsonify(news_data), etag)
+    except Exception:
+        return api_error("Failed to fetch news")
@@ -0,0 +1,132 @@
+import bisect
+import re
+
+# Terms are runs of letters and digits, compared case-insensitively
+TOKEN_RE = re.compile(r"[^\W_]+")
+# Query terms beyond this many are ignored
+MAX_QUERY_TERMS = 8
+# Posting list entries checked one by one before the rest of the matches
+# are found with a set intersection: at least WALK_LIMIT, and for long lists
+# the share that costs about as much as intersecting the whole list
+WALK_LIMIT = 200
+WALK_SHARE = 16
+
+# Result tiers, best first: every term is in the post itself, or only
+# found once the post's comments are included
+TIER_CONTENT = 0
+TIER_COMMENTS = 1
+
+def tokenize(text):
+    """Split text into its distinct lowercase terms"""
+    return set(TOKEN_RE.findall((text or "").casefold()))
+
+def parse_query(query):
+    """Split a search query into the terms to look up, in order"""
+    return list(dict.fromkeys(TOKEN_RE.findall(query.casefold())))[:MAX_QUERY_TERMS]
+
+class SearchIndex:
+    """In-memory inverted index from terms to the posts containing them.
+
+    Every term has two posting lists: posts whose content contains it, and
+    posts whose content or comments contain it. A posting list is the
+    ascending list of the posts' (timestamp, id) keys, walked newest first,
+    plus a set of their ids so the other query terms are checked in O(1).
+    """
+
+    def __init__(self):
+        self._content = {}
+        self._any = {}
+        self._keys = {}
+        # Comments indexed per post, so a reloaded snapshot can be synced
+        self._comment_counts = {}
+
+    def _add(self, postings, term, key):
+        entry = postings.get(term)
+        if entry is None:
+            entry = postings[term] = ([], set())
+        keys, ids = entry
+        if key[1] in ids:
+            return
+        ids.add(key[1])
+        if not keys or keys[-1] < key:
+            keys.append(key)
+        else:
+            bisect.insort(keys, key)
+
+    def has_post(self, post_id):
+        return post_id in self._keys
+
+    def comment_count(self, post_id):
+        return self._comment_counts.get(post_id, 0)
+
+    def add_post(self, post_id, timestamp, content):
+        """Index a post's content"""
+        key = (timestamp or '', post_id)
+        self._keys[post_id] = key
+        self._comment_counts.setdefault(post_id, 0)
+        for term in tokenize(content):
+            self._add(self._content, term, key)
+            self._add(self._any, term, key)
+
+    def add_comment(self, post_id, content):
+        """Index a comment under the post it belongs to"""
+        key = self._keys.get(post_id)
+        if key is None:
+            return
+        self._comment_counts[post_id] += 1
+        for term in tokenize(content):
+            self._add(self._any, term, key)
+
+    def search(self, terms, limit=None, before=None):
+        """Get (tier, timestamp, post_id) keys of the posts matching every term.
+
+        Results come in tier order and newest first within a tier. before
+        is the key of the last result already returned.
+        """
+        results = []
+        for tier, postings in ((TIER_CONTENT, self._content), (TIER_COMMENTS, self._any)):
+            if before is not None and tier < before[0]:
+                continue
+            lists = [postings.get(term) for term in terms]
+            if not terms or None in lists:
+                continue
+            lists.sort(key=lambda entry: len(entry[1]))
+            keys, others = lists[0][0], [ids for _, ids in lists[1:]]
+            # Posts already returned in the content tier are skipped here
+            exclude = None
+            if tier == TIER_COMMENTS:
+                content_lists = [self._content.get(term) for term in terms]
+                if None not in content_lists:
+                    exclude = [ids for _, ids in content_lists]
+
+            bound = tuple(before[1:]) if before is not None and tier == before[0] else None
+            for timestamp, post_id in self._matches(keys, lists[0][1], others, exclude, bound):
+                if limit is not None and len(results) >= limit:
+                    return results
+                results.append((tier, timestamp, post_id))
+        return results
+
+    def _matches(self, keys, ids, others, exclude, bound):
+        """Yield the keys of posts in every posting list, newest first.
+
+        Walking the rarest term's list fills a page quickly when matches are
+        common. When they are rare, the rest of the list is intersected with
+        the other terms' id sets instead of checked one post at a time.
+        """
+        position = len(keys) if bound is None else bisect.bisect_left(keys, bound)
+        stop = max(0, position - max(WALK_LIMIT, len(keys) // WALK_SHARE))
+        while position > stop:
+            position -= 1
+            post_id = keys[position][1]
+            if all(post_id in other for other in others) and not (
+                    exclude and all(post_id in other for other in exclude)):
+                yield keys[position]
+        if position == 0:
+            return
+        matched = ids.intersection(*others)
+        if exclude:
+            matched -= matched.intersection(*exclude)
+        rest = sorted(self._keys[post_id] for post_id in matched)
+        if position < len(keys):
+            rest = rest[:bisect.bisect_left(rest, keys[position])]
+        yield from reversed(rest)
@@ -0,0 +1,650 @@
+import copy
+import os
+import sqlite3
+import threading
+import time
+from models import User, Post, REACTION_TYPES
+from search_index import TIER_CONTENT, TIER_COMMENTS
+from timelines import HOME_TIMELINE_SIZE, FANOUT_FOLLOWER_LIMIT, split_authors, merge_newest
+from trending import TRENDING_WINDOWS, WEIGHTS, decay, growth, needs_rebase, stored_engagement, to_epoch
+from storage import StorageBackend, UsernameTakenError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    password_hash TEXT,
+    profile_picture TEXT,
+    created_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users(username);
+
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    comment_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_posts_timestamp ON posts(timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_posts_user_id ON posts(user_id, timestamp, id);
+
+CREATE TABLE IF NOT EXISTS likes (
+    post_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (post_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS reactions (
+    post_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    reaction TEXT NOT NULL,
+    PRIMARY KEY (post_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS comments (
+    id TEXT PRIMARY KEY,
+    post_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_comments_post_id ON comments(post_id, timestamp, id);
+
+CREATE TABLE IF NOT EXISTS follows (
+    follower_id INTEGER NOT NULL,
+    followee_id INTEGER NOT NULL,
+    PRIMARY KEY (follower_id, followee_id)
+);
+CREATE INDEX IF NOT EXISTS idx_follows_followee_id ON follows(followee_id);
+CREATE TABLE IF NOT EXISTS follower_counts (
+    user_id INTEGER PRIMARY KEY,
+    followers INTEGER NOT NULL
+);
+
+-- Each user's newest posts by themselves and the users they follow, copied
+-- in as they are posted; authors with many followers are merged in on read
+CREATE TABLE IF NOT EXISTS timelines (
+    user_id INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    author_id INTEGER NOT NULL,
+    PRIMARY KEY (user_id, timestamp, post_id)
+) WITHOUT ROWID;
+
+-- Time-decayed engagement scores, stored relative to each window's base
+-- time (see trending.py) so the index on score serves the top posts
+CREATE TABLE IF NOT EXISTS trending (
+    window_name TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (window_name, post_id)
+);
+CREATE INDEX IF NOT EXISTS idx_trending_score ON trending(window_name, score);
+CREATE TABLE IF NOT EXISTS trending_bases (
+    window_name TEXT PRIMARY KEY,
+    base REAL NOT NULL
+);
+-- When each like given since trending was built was given, so an unlike
+-- takes back what it added; older likes count from their post's time
+CREATE TABLE IF NOT EXISTS like_times (
+    post_id TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    at REAL NOT NULL,
+    PRIMARY KEY (post_id, user_id)
+) WITHOUT ROWID;
+
+-- Full-text index with one document per post: its content and its comments
+CREATE VIRTUAL TABLE IF NOT EXISTS post_search USING fts5(
+    content, comments, tokenize = 'unicode61 remove_diacritics 0'
+);
+CREATE TABLE IF NOT EXISTS post_search_ids (
+    doc_id INTEGER PRIMARY KEY,
+    post_id TEXT NOT NULL UNIQUE
+);
+
+-- Write counters for HTTP caching: 'global', 'user:<id>' per post author,
+-- and a random 'epoch' so a recreated database never reuses a version
+CREATE TABLE IF NOT EXISTS versions (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO versions (key, version) VALUES ('epoch', abs(random()));
+"""
+
+POST_COLUMNS = "id, user_id, username, content, timestamp, comment_count"
+COMMENT_COLUMNS = "id, post_id, user_id, username, content, timestamp"
+
+class SQLiteStorage(StorageBackend):
+    """Storage in an indexed SQLite database"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM post_search_ids)").fetchone()[0]:
+                self._index_existing_posts(conn)
+            if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM timelines) AND EXISTS (SELECT 1 FROM posts)").fetchone()[0]:
+                self._build_timelines(conn)
+            if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM trending_bases)").fetchone()[0]:
+                self._build_trending(conn)
+
+    def _connect(self):
+        """Get this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _user_from_row(self, row):
+        if row is None:
+            return None
+        user = User(row['id'], row['username'], row['password_hash'], row['profile_picture'])
+        user.created_at = row['created_at']
+        return user
+
+    def _posts_from_rows(self, rows):
+        """Build Post objects, fetching likes, reactions and comments in bulk"""
+        if not rows:
+            return []
+        posts = [Post(row['id'], row['user_id'], row['username'], row['content'], row['timestamp'],
+                      comment_count=row['comment_count'])
+                 for row in rows]
+        by_id = {post.id: post for post in posts}
+        placeholders = ",".join("?" * len(by_id))
+        ids = list(by_id)
+        conn = self._connect()
+        for row in conn.execute(
+                f"SELECT post_id, user_id FROM likes WHERE post_id IN ({placeholders}) ORDER BY rowid", ids):
+            by_id[row['post_id']].add_like(row['user_id'])
+        for row in conn.execute(
+                f"SELECT post_id, user_id, reaction FROM reactions WHERE post_id IN ({placeholders}) ORDER BY rowid", ids):
+            by_id[row['post_id']].set_reaction(row['user_id'], row['reaction'])
+        # Only each post's latest comments; the rest come from get_post_comments
+        for row in conn.execute(
+                f"SELECT {COMMENT_COLUMNS} FROM ("
+                f"SELECT {COMMENT_COLUMNS}, ROW_NUMBER() OVER "
+                f"(PARTITION BY post_id ORDER BY timestamp DESC, id DESC) AS position "
+                f"FROM comments WHERE post_id IN ({placeholders})) "
+                f"WHERE position <= ? ORDER BY timestamp, id", ids + [Post.RECENT_COMMENTS]):
+            by_id[row['post_id']].comments.append(dict(row))
+        return posts
+
+    def get_user_by_id(self, user_id):
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        row = self._connect().execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
+        return self._user_from_row(row)
+
+    def get_user_by_username(self, username):
+        row = self._connect().execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        return self._user_from_row(row)
+
+    def create_user(self, user):
+        try:
+            with self._connect() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO users (username, password_hash, profile_picture, created_at) VALUES (?, ?, ?, ?)",
+                    (user.username, user.password_hash, user.profile_picture, user.created_at))
+        except sqlite3.IntegrityError:
+            raise UsernameTakenError(f"Username already exists: {user.username}")
+        user.id = cursor.lastrowid
+        return user
+
+    def update_password_hash(self, user_id, password_hash):
+        with self._connect() as conn:
+            conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+
+    def _follower_counts(self, conn, user_ids):
+        user_ids = list(user_ids)
+        rows = conn.execute(
+            f"SELECT user_id, followers FROM follower_counts WHERE user_id IN ({','.join('?' * len(user_ids))})",
+            user_ids).fetchall()
+        return {row['user_id']: row['followers'] for row in rows}
+
+    def follow_user(self, follower_id, followee_id):
+        with self._connect() as conn:
+            cursor = conn.execute("INSERT OR IGNORE INTO follows (follower_id, followee_id) VALUES (?, ?)",
+                                  (follower_id, followee_id))
+            if not cursor.rowcount:
+                return False
+            conn.execute(
+                "INSERT INTO follower_counts (user_id, followers) VALUES (?, 1) "
+                "ON CONFLICT(user_id) DO UPDATE SET followers = followers + 1", (followee_id,))
+            if self._follower_counts(conn, [followee_id])[followee_id] < FANOUT_FOLLOWER_LIMIT:
+                self._copy_to_timeline(conn, follower_id, followee_id)
+                self._trim_timelines(conn, [follower_id])
+        return True
+
+    def unfollow_user(self, follower_id, followee_id):
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM follows WHERE follower_id = ? AND followee_id = ?",
+                                  (follower_id, followee_id))
+            if not cursor.rowcount:
+                return False
+            conn.execute("UPDATE follower_counts SET followers = followers - 1 WHERE user_id = ?", (followee_id,))
+            conn.execute("DELETE FROM timelines WHERE user_id = ? AND author_id = ?", (follower_id, followee_id))
+            # Refill the room the author's posts leave, so a timeline holding
+            # fewer than HOME_TIMELINE_SIZE posts still holds all of them
+            following = [row[0] for row in conn.execute(
+                "SELECT followee_id FROM follows WHERE follower_id = ?", (follower_id,))]
+            self._fill_timeline(conn, follower_id, following,
+                                self._follower_counts(conn, following + [follower_id]))
+            if self._follower_counts(conn, [followee_id]).get(followee_id) == FANOUT_FOLLOWER_LIMIT - 1:
+                # Fanned out again from now on, so the followers need the posts merged in until now
+                follower_ids = [row[0] for row in conn.execute(
+                    "SELECT follower_id FROM follows WHERE followee_id = ?", (followee_id,))] + [followee_id]
+                for user_id in follower_ids:
+                    self._copy_to_timeline(conn, user_id, followee_id)
+                self._trim_timelines(conn, follower_ids)
+        return True
+
+    def get_following(self, user_id):
+        return {row[0] for row in self._connect().execute(
+            "SELECT followee_id FROM follows WHERE follower_id = ?", (user_id,))}
+
+    def get_follower_count(self, user_id):
+        return self._follower_counts(self._connect(), [user_id]).get(user_id, 0)
+
+    def _copy_to_timeline(self, conn, user_id, author_id):
+        """Copy an author's newest posts into a user's home timeline"""
+        conn.execute(
+            "INSERT OR IGNORE INTO timelines (user_id, timestamp, post_id, author_id) "
+            "SELECT ?, timestamp, id, user_id FROM posts WHERE user_id = ? "
+            "ORDER BY timestamp DESC, id DESC LIMIT ?", (user_id, author_id, HOME_TIMELINE_SIZE))
+
+    def _trim_timelines(self, conn, user_ids):
+        """Drop the posts past HOME_TIMELINE_SIZE from users' home timelines"""
+        conn.executemany(
+            "DELETE FROM timelines WHERE user_id = ? AND (timestamp, post_id) <= ("
+            "SELECT timestamp, post_id FROM timelines WHERE user_id = ? "
+            "ORDER BY timestamp DESC, post_id DESC LIMIT 1 OFFSET ?)",
+            [(user_id, user_id, HOME_TIMELINE_SIZE) for user_id in user_ids])
+
+    def _fan_out(self, conn, post):
+        """Copy a new post into the home timelines of its author and their followers"""
+        if self._follower_counts(conn, [post.user_id]).get(post.user_id, 0) >= FANOUT_FOLLOWER_LIMIT:
+            return
+        user_ids = [post.user_id] + [row[0] for row in conn.execute(
+            "SELECT follower_id FROM follows WHERE followee_id = ?", (post.user_id,))]
+        conn.executemany(
+            "INSERT OR IGNORE INTO timelines (user_id, timestamp, post_id, author_id) VALUES (?, ?, ?, ?)",
+            [(user_id, post.timestamp, post.id, post.user_id) for user_id in user_ids])
+        self._trim_timelines(conn, user_ids)
+
+    def _fill_timeline(self, conn, user_id, following, counts):
+        """Copy the newest posts of every author fanned out to a user into their home timeline"""
+        fanned_out, _ = split_authors(user_id, following, lambda author_id: counts.get(author_id, 0))
+        for author_id in fanned_out:
+            self._copy_to_timeline(conn, user_id, author_id)
+        self._trim_timelines(conn, [user_id])
+
+    def _build_timelines(self, conn):
+        """Fill every user's home timeline from the posts and follows already stored"""
+        counts = {row['user_id']: row['followers'] for row in conn.execute("SELECT * FROM follower_counts")}
+        for (user_id,) in conn.execute("SELECT id FROM users").fetchall():
+            following = [row[0] for row in conn.execute(
+                "SELECT followee_id FROM follows WHERE follower_id = ?", (user_id,))]
+            self._fill_timeline(conn, user_id, following, counts)
+
+    def _newest_post_keys(self, conn, author_id, limit, before):
+        """An author's (timestamp, id) post keys newest first, older than before"""
+        if before is None:
+            rows = conn.execute(
+                "SELECT timestamp, id FROM posts WHERE user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (author_id, limit))
+        else:
+            rows = conn.execute(
+                "SELECT timestamp, id FROM posts WHERE user_id = ? AND (timestamp, id) < (?, ?) "
+                "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (author_id, before[0], before[1], limit))
+        return [tuple(row) for row in rows]
+
+    def get_home_timeline(self, user_id, limit=None, before=None):
+        conn = self._connect()
+        following = self.get_following(user_id)
+        counts = self._follower_counts(conn, following | {user_id})
+        fanned_out, merged = split_authors(user_id, following, lambda author_id: counts.get(author_id, 0))
+        sql_limit = -1 if limit is None else limit
+        if before is None:
+            rows = conn.execute(
+                "SELECT timestamp, post_id FROM timelines WHERE user_id = ? "
+                "ORDER BY timestamp DESC, post_id DESC LIMIT ?", (user_id, sql_limit))
+        else:
+            rows = conn.execute(
+                "SELECT timestamp, post_id FROM timelines WHERE user_id = ? AND (timestamp, post_id) < (?, ?) "
+                "ORDER BY timestamp DESC, post_id DESC LIMIT ?", (user_id, before[0], before[1], sql_limit))
+        page = [tuple(row) for row in rows]
+        if limit is None or len(page) < limit:
+            stored = conn.execute("SELECT COUNT(*) FROM timelines WHERE user_id = ?", (user_id,)).fetchone()[0]
+            if stored >= HOME_TIMELINE_SIZE:
+                # Paged past the oldest post the timeline keeps
+                page, merged = [], fanned_out | merged
+        keys = merge_newest([page] + [self._newest_post_keys(conn, author_id, sql_limit, before)
+                                      for author_id in merged], limit)
+        posts = self.get_posts_by_ids([post_id for _, post_id in keys])
+        return [posts[post_id] for _, post_id in keys if post_id in posts]
+
+    def get_recent_posts(self, limit=None, before=None):
+        limit = -1 if limit is None else limit
+        if before is None:
+            rows = self._connect().execute(
+                f"SELECT {POST_COLUMNS} FROM posts ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (limit,)).fetchall()
+        else:
+            rows = self._connect().execute(
+                f"SELECT {POST_COLUMNS} FROM posts WHERE (timestamp, id) < (?, ?) "
+                f"ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (before[0], before[1], limit)).fetchall()
+        return self._posts_from_rows(rows)
+
+    def get_posts_by_user(self, user_id, limit=None, before=None):
+        limit = -1 if limit is None else limit
+        if before is None:
+            rows = self._connect().execute(
+                f"SELECT {POST_COLUMNS} FROM posts WHERE user_id = ? "
+                f"ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (user_id, limit)).fetchall()
+        else:
+            rows = self._connect().execute(
+                f"SELECT {POST_COLUMNS} FROM posts WHERE user_id = ? AND (timestamp, id) < (?, ?) "
+                f"ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (user_id, before[0], before[1], limit)).fetchall()
+        return self._posts_from_rows(rows)
+
+    def get_user_stats(self, user_id):
+        conn = self._connect()
+        return {
+            'posts': conn.execute(
+                "SELECT COUNT(*) FROM posts WHERE user_id = ?", (user_id,)).fetchone()[0],
+            'likes': conn.execute(
+                "SELECT COUNT(*) FROM posts JOIN likes ON likes.post_id = posts.id "
+                "WHERE posts.user_id = ?", (user_id,)).fetchone()[0],
+            'comments': conn.execute(
+                "SELECT COALESCE(SUM(comment_count), 0) FROM posts WHERE user_id = ?",
+                (user_id,)).fetchone()[0]
+        }
+
+    def _bump_versions(self, conn, post_id):
+        """Advance the global version and the version of the post's author"""
+        conn.execute(
+            "INSERT INTO versions (key, version) VALUES ('global', 1) "
+            "ON CONFLICT(key) DO UPDATE SET version = version + 1")
+        conn.execute(
+            "INSERT INTO versions (key, version) SELECT 'user:' || user_id, 1 FROM posts WHERE id = ? "
+            "ON CONFLICT(key) DO UPDATE SET version = version + 1", (post_id,))
+
+    def _versions(self, *keys):
+        rows = self._connect().execute(
+            f"SELECT key, version FROM versions WHERE key IN ({','.join('?' * len(keys))})", keys).fetchall()
+        versions = {row['key']: row['version'] for row in rows}
+        return ":".join(str(versions.get(key, 0)) for key in keys)
+
+    def get_data_version(self):
+        return self._versions('epoch', 'global')
+
+    def get_user_version(self, user_id):
+        return self._versions('epoch', f"user:{user_id}")
+
+    def get_post_by_id(self, post_id):
+        rows = self._connect().execute(
+            f"SELECT {POST_COLUMNS} FROM posts WHERE id = ?", (post_id,)).fetchall()
+        posts = self._posts_from_rows(rows)
+        return posts[0] if posts else None
+
+    def get_posts_by_ids(self, post_ids):
+        post_ids = list(dict.fromkeys(post_ids))
+        if not post_ids:
+            return {}
+        rows = self._connect().execute(
+            f"SELECT {POST_COLUMNS} FROM posts WHERE id IN ({','.join('?' * len(post_ids))})", post_ids).fetchall()
+        return {post.id: post for post in self._posts_from_rows(rows)}
+
+    def add_post(self, post):
+        with self._connect() as conn:
+            self._insert_post(conn, post)
+            self._bump_versions(conn, post.id)
+            self._fan_out(conn, post)
+        return self.get_post_by_id(post.id)
+
+    def _index_for_search(self, conn, post_id, content, comments):
+        """Add a post's search document"""
+        cursor = conn.execute("INSERT OR IGNORE INTO post_search_ids (post_id) VALUES (?)", (post_id,))
+        if cursor.rowcount:
+            conn.execute("INSERT INTO post_search (rowid, content, comments) VALUES (?, ?, ?)",
+                         (cursor.lastrowid, content, comments))
+
+    def _index_existing_posts(self, conn):
+        """Build search documents for a database created before search existed"""
+        rows = conn.execute(
+            "SELECT id, content, (SELECT group_concat(content, ' ') FROM comments "
+            "WHERE comments.post_id = posts.id) AS comments FROM posts").fetchall()
+        for row in rows:
+            self._index_for_search(conn, row['id'], row['content'], row['comments'] or '')
+
+    def _insert_post(self, conn, post):
+        cursor = conn.execute(
+            f"INSERT OR IGNORE INTO posts ({POST_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+            (post.id, post.user_id, post.username, post.content, post.timestamp, post.comment_count))
+        if cursor.rowcount:
+            self._index_for_search(conn, post.id, post.content, " ".join(c['content'] for c in post.comments))
+        conn.executemany(
+            "INSERT OR IGNORE INTO likes (post_id, user_id) VALUES (?, ?)",
+            [(post.id, user_id) for user_id in post.likes])
+        conn.executemany(
+            "INSERT OR REPLACE INTO reactions (post_id, user_id, reaction) VALUES (?, ?, ?)",
+            [(post.id, user_id, reaction)
+             for reaction, user_ids in post.reactions.items() for user_id in user_ids])
+        conn.executemany(
+            "INSERT OR IGNORE INTO comments (id, post_id, user_id, username, content, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(c['id'], post.id, c['user_id'], c['username'], c['content'], c.get('timestamp'))
+             for c in post.comments])
+
+    def apply_mutations(self, mutations):
+        now = time.time()
+        with self._connect() as conn:
+            existing = {row['id'] for row in conn.execute(
+                f"SELECT id FROM posts WHERE id IN ({','.join('?' * len(mutations))})",
+                [mutation['post_id'] for mutation in mutations])} if mutations else set()
+            for mutation in mutations:
+                post_id, user_id = mutation['post_id'], mutation['user_id']
+                if post_id not in existing:
+                    continue
+                at = now
+                if mutation['op'] == 'like':
+                    engaged = conn.execute("INSERT OR IGNORE INTO likes (post_id, user_id) VALUES (?, ?)",
+                                           (post_id, user_id)).rowcount
+                    if engaged:
+                        conn.execute("INSERT OR REPLACE INTO like_times (post_id, user_id, at) VALUES (?, ?, ?)",
+                                     (post_id, user_id, now))
+                elif mutation['op'] == 'unlike':
+                    engaged = conn.execute("DELETE FROM likes WHERE post_id = ? AND user_id = ?",
+                                           (post_id, user_id)).rowcount
+                    if engaged:
+                        at = self._like_time(conn, post_id, user_id)
+                elif mutation['op'] == 'react':
+                    if mutation['reaction'] not in REACTION_TYPES:
+                        raise ValueError(f"Invalid reaction type: {mutation['reaction']}")
+                    # Changing a reaction is not new engagement
+                    engaged = conn.execute("SELECT NOT EXISTS (SELECT 1 FROM reactions WHERE post_id = ? "
+                                           "AND user_id = ?)", (post_id, user_id)).fetchone()[0]
+                    conn.execute(
+                        "INSERT OR REPLACE INTO reactions (post_id, user_id, reaction) VALUES (?, ?, ?)",
+                        (post_id, user_id, mutation['reaction']))
+                elif mutation['op'] == 'comment':
+                    if not self._insert_comment(conn, post_id, mutation['comment']):
+                        continue
+                    engaged = True
+                else:
+                    raise ValueError(f"Unknown mutation: {mutation['op']}")
+                if engaged:
+                    self._record_engagement(conn, post_id, WEIGHTS[mutation['op']], at)
+                self._bump_versions(conn, post_id)
+        return self.get_posts_by_ids([mutation['post_id'] for mutation in mutations])
+
+    def _insert_comment(self, conn, post_id, comment):
+        """Add a comment and index it for search; False if it was already stored"""
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO comments (id, post_id, user_id, username, content, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (comment['id'], post_id, comment['user_id'], comment['username'],
+             comment['content'], comment.get('timestamp')))
+        if not cursor.rowcount:
+            return False
+        conn.execute("UPDATE posts SET comment_count = comment_count + 1 WHERE id = ?", (post_id,))
+        conn.execute(
+            "UPDATE post_search SET comments = comments || ' ' || ? "
+            "WHERE rowid = (SELECT doc_id FROM post_search_ids WHERE post_id = ?)",
+            (comment['content'], post_id))
+        return True
+
+    def _trending_base(self, conn, window, at):
+        """A window's base time, moved to at (dividing its scores down) once they grow too large"""
+        row = conn.execute("SELECT base FROM trending_bases WHERE window_name = ?", (window,)).fetchone()
+        if row is not None and not needs_rebase(window, row['base'], at):
+            return row['base']
+        if row is not None:
+            conn.execute("UPDATE trending SET score = score * ? WHERE window_name = ?",
+                         (decay(window, row['base'], at), window))
+            conn.execute("DELETE FROM trending WHERE window_name = ? AND score <= 0", (window,))
+        conn.execute("INSERT OR REPLACE INTO trending_bases (window_name, base) VALUES (?, ?)", (window, at))
+        return at
+
+    def _like_time(self, conn, post_id, user_id):
+        """When a like being taken back was given, forgetting it; the post's time if not known"""
+        row = conn.execute("SELECT at FROM like_times WHERE post_id = ? AND user_id = ?",
+                           (post_id, user_id)).fetchone()
+        if row is None:
+            return to_epoch(conn.execute("SELECT timestamp FROM posts WHERE id = ?", (post_id,)).fetchone()[0])
+        conn.execute("DELETE FROM like_times WHERE post_id = ? AND user_id = ?", (post_id, user_id))
+        return row['at']
+
+    def _record_engagement(self, conn, post_id, weight, at):
+        """Add weight to a post's trending scores for an interaction at time at"""
+        for window in TRENDING_WINDOWS:
+            score = weight * growth(window, self._trending_base(conn, window, at), at)
+            conn.execute(
+                "INSERT INTO trending (window_name, post_id, score) VALUES (?, ?, max(?, 0)) "
+                "ON CONFLICT(window_name, post_id) DO UPDATE SET score = max(score + ?, 0)",
+                (window, post_id, score, score))
+
+    def _build_trending(self, conn):
+        """Score the posts already stored, by the same rules as the JSON engine (see trending.py)"""
+        now = time.time()
+        conn.execute("DELETE FROM trending")
+        conn.execute("DELETE FROM like_times")
+        for window in TRENDING_WINDOWS:
+            conn.execute("INSERT OR REPLACE INTO trending_bases (window_name, base) VALUES (?, ?)", (window, now))
+        comment_timestamps = {}
+        for row in conn.execute("SELECT post_id, timestamp FROM comments"):
+            comment_timestamps.setdefault(row['post_id'], []).append(row['timestamp'])
+        rows = conn.execute(
+            "SELECT id, timestamp, "
+            "(SELECT COUNT(*) FROM likes WHERE post_id = posts.id) "
+            "+ (SELECT COUNT(*) FROM reactions WHERE post_id = posts.id) AS interactions FROM posts").fetchall()
+        for row in rows:
+            for post_id, weight, at in stored_engagement(row['id'], row['timestamp'], row['interactions'],
+                                                         comment_timestamps.get(row['id'], ())):
+                self._record_engagement(conn, post_id, weight, at)
+
+    def get_trending_posts(self, window, limit):
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT post_id, score, base FROM trending JOIN trending_bases USING (window_name) "
+            "WHERE window_name = ? AND score > 0 ORDER BY score DESC LIMIT ?", (window, limit)).fetchall()
+        posts = self.get_posts_by_ids([row['post_id'] for row in rows])
+        now = time.time()
+        return [(posts[row['post_id']], row['score'] * decay(window, row['base'], now))
+                for row in rows if row['post_id'] in posts]
+
+    def get_post_comments(self, post_id, limit=None, before=None):
+        limit = -1 if limit is None else limit
+        if before is None:
+            rows = self._connect().execute(
+                f"SELECT {COMMENT_COLUMNS} FROM comments WHERE post_id = ? "
+                f"ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (post_id, limit)).fetchall()
+        else:
+            rows = self._connect().execute(
+                f"SELECT {COMMENT_COLUMNS} FROM comments WHERE post_id = ? AND (timestamp, id) < (?, ?) "
+                f"ORDER BY timestamp DESC, id DESC LIMIT ?",
+                (post_id, before[0], before[1], limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def search_posts(self, terms, limit=None, before=None):
+        if not terms:
+            return []
+        all_terms = " AND ".join(f'"{term}"' for term in terms)
+        tiers = ((TIER_CONTENT, f"content : ({all_terms})"),
+                 (TIER_COMMENTS, f"({all_terms}) NOT content : ({all_terms})"))
+        results = []
+        for tier, match in tiers:
+            if before is not None and tier < before[0]:
+                continue
+            remaining = -1 if limit is None else limit - len(results)
+            if remaining == 0:
+                break
+            query = (f"SELECT {POST_COLUMNS} FROM posts WHERE id IN ("
+                     f"SELECT post_id FROM post_search_ids WHERE doc_id IN ("
+                     f"SELECT rowid FROM post_search WHERE post_search MATCH ?))")
+            params = [match]
+            if before is not None and tier == before[0]:
+                query += " AND (timestamp, id) < (?, ?)"
+                params += [before[1], before[2]]
+            rows = self._connect().execute(
+                query + " ORDER BY timestamp DESC, id DESC LIMIT ?", params + [remaining]).fetchall()
+            results += [((tier, post.timestamp, post.id), post) for post in self._posts_from_rows(rows)]
+        return results
+
+    def import_data(self, users, posts, follows=None):
+        """Copy users, posts and a follower id -> followed ids map into the database, skipping ones already present"""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (id, username, password_hash, profile_picture, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(u.id, u.username, u.password_hash, u.profile_picture, u.created_at) for u in users])
+            for post in posts:
+                self._insert_post(conn, post)
+                self._bump_versions(conn, post.id)
+            conn.executemany(
+                "INSERT OR IGNORE INTO follows (follower_id, followee_id) VALUES (?, ?)",
+                [(follower_id, followee_id) for follower_id, followee_ids in (follows or {}).items()
+                 for followee_id in followee_ids])
+            conn.execute("DELETE FROM follower_counts")
+            conn.execute(
+                "INSERT INTO follower_counts (user_id, followers) "
+                "SELECT followee_id, COUNT(*) FROM follows GROUP BY followee_id")
+            self._build_timelines(conn)
+            self._build_trending(conn)
+
+def migrate_from_json(path):
+    """One-shot copy of data/*.json (including the journal) into a SQLite database"""
+    import data_store
+    users = data_store.load_users()
+    posts = [copy.copy(post) for post in data_store.load_posts()]
+    for post in posts:
+        # Posts only carry their recent comments; copy the full history
+        post.comments = data_store.get_post_comments(post.id)[::-1]
+    SQLiteStorage(path).import_data(users, posts, data_store.load_follows())
+    return len(users), len(posts)
+
+if __name__ == '__main__':
+    import sys
+    from storage import SQLITE_PATH
+    target = sys.argv[1] if len(sys.argv) > 1 else SQLITE_PATH
+    user_count, post_count = migrate_from_json(target)
+    print(f"Migrated {user_count} users and {post_count} posts to {target}")
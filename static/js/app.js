@@ -2,6 +2,11 @@
 
 // Global variables
 let isLoading = false;
+let isLoadingFeed = false;
+let lastEventId = null;
+
+// Seconds between catch-up requests when the server has no event stream
+const EVENT_POLL_SECONDS = 10;
 
 // DOM Content Loaded
 document.addEventListener('DOMContentLoaded', function() {
@@ -19,6 +24,12 @@ function initializeApp() {
     // Initialize tooltips and popovers
     initializeBootstrapComponents();
     
+    // Load further feed pages on scroll
+    initializeInfiniteScroll();
+    
+    // Apply posts, comments and reactions from other users as they happen
+    initializeLiveUpdates();
+    
     console.log('SocialFeed app initialized');
 }
 
@@ -57,6 +68,13 @@ function initializeEventListeners() {
         }
     });
     
+    // Follow buttons
+    document.addEventListener('click', function(e) {
+        if (e.target.closest('.follow-btn')) {
+            handleFollow(e);
+        }
+    });
+    
     // Comment forms
     document.addEventListener('submit', function(e) {
         if (e.target.classList.contains('comment-form')) {
@@ -64,6 +82,21 @@ function initializeEventListeners() {
         }
     });
     
+    // Earlier comments buttons
+    document.addEventListener('click', function(e) {
+        if (e.target.closest('.load-comments-btn')) {
+            handleLoadComments(e);
+        }
+    });
+    
+    // Load more posts button
+    document.addEventListener('click', function(e) {
+        if (e.target.closest('.load-more-posts-btn')) {
+            e.preventDefault();
+            loadMorePosts();
+        }
+    });
+    
     // News refresh buttons
     document.addEventListener('click', function(e) {
         if (e.target.closest('.refresh-news-btn')) {
@@ -87,6 +120,164 @@ function initializeBootstrapComponents() {
     });
 }
 
+// Fetch the next feed page when the sentinel below the feed scrolls into view
+function initializeInfiniteScroll() {
+    const sentinel = document.getElementById('feedSentinel');
+    if (!sentinel || !('IntersectionObserver' in window)) return;
+    
+    const observer = new IntersectionObserver(function(entries) {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMorePosts();
+        }
+    }, { rootMargin: '400px' });
+    observer.observe(sentinel);
+}
+
+// Subscribe to the event stream on pages that show posts
+function initializeLiveUpdates() {
+    const main = document.querySelector('main[data-last-event-id]');
+    if (!main || !document.getElementById('postsContainer') || !main.getAttribute('data-last-event-id')) return;
+    lastEventId = main.getAttribute('data-last-event-id');
+    // A page reloaded after a reset may come from the browser cache with its
+    // old event id; the data is unchanged, so resume from the reset's id
+    const resumeEventId = sessionStorage.getItem('resumeEventId');
+    if (resumeEventId) {
+        sessionStorage.removeItem('resumeEventId');
+        lastEventId = String(Math.max(Number(lastEventId), Number(resumeEventId)));
+    }
+    
+    if (!main.hasAttribute('data-event-stream') || !('EventSource' in window)) {
+        setInterval(pollEvents, EVENT_POLL_SECONDS * 1000);
+        return;
+    }
+    
+    // On reconnect the browser resumes from the last event it received
+    const source = new EventSource(`/api/stream?since=${encodeURIComponent(lastEventId)}`);
+    ['post', 'comment', 'reactions'].forEach(function(type) {
+        source.addEventListener(type, function(e) {
+            lastEventId = e.lastEventId;
+            applyEvent(type, JSON.parse(e.data));
+        });
+    });
+    source.addEventListener('reset', function(e) {
+        // Too far behind to catch up
+        source.close();
+        reloadAfterReset(JSON.parse(e.data).last_event_id);
+    });
+}
+
+// Fetch the events since the last one applied
+async function pollEvents() {
+    try {
+        const response = await fetch(`/api/events?since=${encodeURIComponent(lastEventId)}`);
+        const data = await response.json();
+        if (!response.ok) return;
+        if (data.reset) {
+            reloadAfterReset(data.last_event_id);
+            return;
+        }
+        data.events.forEach(event => applyEvent(event.type, event.data));
+        lastEventId = data.last_event_id;
+    } catch (error) {
+        console.error('Error fetching updates:', error);
+    }
+}
+
+// Reload a page too far behind to catch up, resuming from the current event
+function reloadAfterReset(eventId) {
+    sessionStorage.setItem('resumeEventId', eventId);
+    window.location.reload();
+}
+
+// Patch the page for one event
+function applyEvent(type, data) {
+    if (type === 'post') {
+        applyNewPost(data.post.id, data.html);
+    } else if (type === 'comment') {
+        applyNewComment(data);
+    } else if (type === 'reactions') {
+        applyReactionCounts(data);
+    }
+}
+
+// Add a post card to the top of the live feed, unless it is already shown
+function applyNewPost(postId, html) {
+    const postsContainer = document.querySelector('#postsContainer[data-live-posts]');
+    if (!postsContainer || document.querySelector(`.post-card[data-post-id="${postId}"]`)) return;
+    
+    const emptyMessage = postsContainer.querySelector('.feed-empty');
+    if (emptyMessage) emptyMessage.remove();
+    postsContainer.insertAdjacentHTML('afterbegin', html);
+}
+
+// Append a comment to every card of its post and update the count
+function applyNewComment(data) {
+    document.querySelectorAll(`.post-card[data-post-id="${data.post_id}"]`).forEach(function(postCard) {
+        const commentCount = postCard.querySelector('.comment-count');
+        if (commentCount) {
+            commentCount.innerHTML = `<i class="fas fa-comment me-1"></i>${data.comment_count} comments`;
+        }
+        if (postCard.querySelector(`.comment[data-comment-id="${data.comment.id}"]`)) return;
+        
+        const commentsSection = postCard.querySelector('.comments-section');
+        if (!commentsSection) return;
+        commentsSection.classList.remove('d-none');
+        commentsSection.querySelector('.comments-list').insertAdjacentHTML('beforeend', data.html);
+    });
+}
+
+// Update the like count and reaction badges of every card of a post
+function applyReactionCounts(data) {
+    document.querySelectorAll(`.post-card[data-post-id="${data.post_id}"]`).forEach(function(postCard) {
+        const likeCount = postCard.querySelector('.like-count');
+        if (likeCount) {
+            likeCount.innerHTML = `<i class="fas fa-thumbs-up me-1"></i>${data.like_count} likes`;
+        }
+        const reactionSummary = postCard.querySelector('.reaction-summary');
+        if (reactionSummary) {
+            reactionSummary.outerHTML = data.html;
+        }
+    });
+}
+
+// Append the next page of posts to the feed or profile
+async function loadMorePosts() {
+    const sentinel = document.getElementById('feedSentinel');
+    const postsContainer = document.getElementById('postsContainer');
+    if (!sentinel || !postsContainer || isLoadingFeed) return;
+    
+    const feedUrl = sentinel.getAttribute('data-feed-url');
+    const cursor = sentinel.getAttribute('data-next-cursor');
+    const button = sentinel.querySelector('.load-more-posts-btn');
+    isLoadingFeed = true;
+    setButtonLoading(button, true);
+    
+    try {
+        const url = new URL(feedUrl, window.location.origin);
+        url.searchParams.set('cursor', cursor);
+        const response = await fetch(url);
+        const data = await response.json();
+        
+        if (!response.ok) {
+            showToast(data.error || 'Failed to load more posts', 'error');
+            return;
+        }
+        
+        postsContainer.insertAdjacentHTML('beforeend', data.html);
+        if (data.next_cursor) {
+            sentinel.setAttribute('data-next-cursor', data.next_cursor);
+        } else {
+            sentinel.remove();
+        }
+    } catch (error) {
+        console.error('Error loading posts:', error);
+        showToast('Failed to load more posts. Please try again.', 'error');
+    } finally {
+        setButtonLoading(button, false);
+        isLoadingFeed = false;
+    }
+}
+
 // Handle create post
 async function handleCreatePost(e) {
     e.preventDefault();
@@ -120,11 +311,7 @@ async function handleCreatePost(e) {
         if (data.success) {
             showToast('Post created successfully!', 'success');
             contentTextarea.value = '';
-            
-            // Refresh the page to show the new post
-            setTimeout(() => {
-                window.location.reload();
-            }, 1000);
+            applyNewPost(data.post.id, data.html);
         } else {
             showToast(data.error || 'Failed to create post', 'error');
         }
@@ -167,8 +354,7 @@ async function handleLikePost(e) {
             button.innerHTML = icon + (data.liked ? 'Unlike' : 'Like');
             
             // Update like count display
-            const postCard = button.closest('.post-card');
-            const likeCountSpan = postCard.querySelector('.fa-thumbs-up').parentElement;
+            const likeCountSpan = button.closest('.post-card').querySelector('.like-count');
             likeCountSpan.innerHTML = `<i class="fas fa-thumbs-up me-1"></i>${data.like_count} likes`;
             
             // Add animation
@@ -186,6 +372,40 @@ async function handleLikePost(e) {
     }
 }
 
+// Handle follow and unfollow
+async function handleFollow(e) {
+    e.preventDefault();
+    
+    const button = e.target.closest('.follow-btn');
+    const userId = button.getAttribute('data-user-id');
+    if (!userId) return;
+    
+    const follow = button.textContent.trim() === 'Follow';
+    setButtonLoading(button, true);
+    
+    try {
+        const response = await fetch(`/api/users/${userId}/follow`, {
+            method: follow ? 'POST' : 'DELETE'
+        });
+        
+        const data = await response.json();
+        
+        if (data.success) {
+            // Every card by the same author shows the new state
+            document.querySelectorAll(`.follow-btn[data-user-id="${userId}"]`).forEach(function(followButton) {
+                followButton.textContent = data.following ? 'Unfollow' : 'Follow';
+            });
+        } else {
+            showToast(data.error || 'Failed to update follow', 'error');
+        }
+    } catch (error) {
+        console.error('Error updating follow:', error);
+        showToast('Failed to update follow. Please try again.', 'error');
+    } finally {
+        setButtonLoading(button, false);
+    }
+}
+
 // Handle reaction
 async function handleReaction(e) {
     e.preventDefault();
@@ -263,11 +483,7 @@ async function handleAddComment(e) {
         if (data.success) {
             showToast('Comment added successfully!', 'success');
             commentInput.value = '';
-            
-            // Refresh the page to show the new comment
-            setTimeout(() => {
-                window.location.reload();
-            }, 1000);
+            applyNewComment(data);
         } else {
             showToast(data.error || 'Failed to add comment', 'error');
         }
@@ -279,15 +495,69 @@ async function handleAddComment(e) {
     }
 }
 
-// Handle refresh news
-function handleRefreshNews(e) {
+// Handle loading earlier comments on a post
+async function handleLoadComments(e) {
+    e.preventDefault();
+    
+    const button = e.target.closest('.load-comments-btn');
+    const postId = button.getAttribute('data-post-id');
+    const cursor = button.getAttribute('data-next-cursor');
+    const commentsList = button.parentElement.querySelector('.comments-list');
+    
+    if (!postId || !commentsList) return;
+    
+    setButtonLoading(button, true);
+    
+    try {
+        const response = await fetch(`/api/posts/${postId}/comments?cursor=${encodeURIComponent(cursor)}`);
+        const data = await response.json();
+        
+        if (!response.ok) {
+            showToast(data.error || 'Failed to load comments', 'error');
+            return;
+        }
+        
+        commentsList.insertAdjacentHTML('afterbegin', data.html);
+        if (data.next_cursor) {
+            button.setAttribute('data-next-cursor', data.next_cursor);
+        } else {
+            button.remove();
+        }
+    } catch (error) {
+        console.error('Error loading comments:', error);
+        showToast('Failed to load comments. Please try again.', 'error');
+    } finally {
+        setButtonLoading(button, false);
+    }
+}
+
+// Handle refresh news by replacing just the articles
+async function handleRefreshNews(e) {
     e.preventDefault();
     
     const button = e.target.closest('.refresh-news-btn');
+    const newsArticles = document.getElementById('newsArticles');
+    if (!newsArticles) return;
+    
+    const category = newsArticles.getAttribute('data-category');
     setButtonLoading(button, true);
     
-    // Simple page reload for news refresh
-    window.location.reload();
+    try {
+        const response = await fetch(`/api/news/${encodeURIComponent(category)}?html=1`);
+        const data = await response.json();
+        
+        if (!response.ok) {
+            showToast(data.error || 'Failed to refresh news', 'error');
+            return;
+        }
+        
+        newsArticles.innerHTML = data.html;
+    } catch (error) {
+        console.error('Error refreshing news:', error);
+        showToast('Failed to refresh news. Please try again.', 'error');
+    } finally {
+        if (button.isConnected) setButtonLoading(button, false);
+    }
 }
 
 // Utility function to set button loading state
@@ -0,0 +1,165 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from flask import Response, abort, request, url_for
+from werkzeug.security import safe_join
+from compression import accepted_encoding
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+# Fingerprinted, precompressed copies of the static files written by a build
+# step (python static_assets.py); without them assets are compressed on the
+# first request for them
+STATIC_BUILD_DIR = os.environ.get(
+    "STATIC_BUILD_DIR", os.path.join(os.path.dirname(STATIC_DIR), "static_build"))
+# A fingerprinted URL's content never changes, so browsers keep it for a
+# year without revalidating
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Encodings assets are precompressed with, best first; br needs Brotli installed
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+COMPRESSED_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+
+_fingerprints = {}
+_version = None
+_encodings = {}
+_encoded = {}
+_encoded_lock = threading.Lock()
+
+def fingerprinted(filename):
+    """Name of a static file with a hash of its content, e.g. css/custom.1a2b3c4d5e6f.css"""
+    name = _fingerprints.get(filename)
+    if name is None:
+        with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        root, extension = os.path.splitext(filename)
+        name = _fingerprints[filename] = f"{root}.{digest}{extension}"
+    return name
+
+def assets_version():
+    """Hash of every static file, so pages linking to them change ETag when any does"""
+    global _version
+    if _version is None:
+        digest = hashlib.sha1()
+        for filename in _static_files():
+            digest.update(fingerprinted(filename).encode())
+        _version = digest.hexdigest()
+    return _version
+
+def asset_url_for(endpoint, **values):
+    """url_for for templates, sending static files to their fingerprinted URL"""
+    if endpoint == "static" and set(values) == {"filename"}:
+        try:
+            return url_for("assets", filename=fingerprinted(values["filename"]))
+        except OSError:
+            pass
+    return url_for(endpoint, **values)
+
+def _compress(data, encoding):
+    if encoding == "gzip":
+        # mtime=0 keeps the output, and so the build, reproducible
+        return gzip.compress(data, 9, mtime=0)
+    import brotli
+    return brotli.compress(data, quality=11)
+
+def _brotli_installed():
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def _available_encodings(filename):
+    """Encodings a static file can be served in, best first"""
+    encodings = _encodings.get(filename)
+    if encodings is None:
+        encodings = []
+        if os.path.splitext(filename)[1] in COMPRESSED_EXTENSIONS:
+            built = os.path.join(STATIC_BUILD_DIR, fingerprinted(filename))
+            encodings = [encoding for encoding, suffix in ENCODINGS.items()
+                         if encoding == "gzip" or os.path.exists(built + suffix) or _brotli_installed()]
+        _encodings[filename] = encodings
+    return encodings
+
+def _encoded_asset(filename, name, encoding):
+    """A static file's bytes in encoding (None for identity), read from the build if present"""
+    key = (name, encoding)
+    with _encoded_lock:
+        data = _encoded.get(key)
+    if data is not None:
+        return data
+    built = os.path.join(STATIC_BUILD_DIR, name + ENCODINGS.get(encoding, ""))
+    try:
+        with open(built, 'rb') as f:
+            data = f.read()
+    except OSError:
+        with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+            data = f.read()
+        if encoding is not None:
+            data = _compress(data, encoding)
+    with _encoded_lock:
+        _encoded[key] = data
+    return data
+
+def serve_asset(filename):
+    """Serve a fingerprinted static file, compressed as the client accepts, cached for a year"""
+    root, extension = os.path.splitext(filename)
+    source = os.path.splitext(root)[0] + extension
+    if safe_join(STATIC_DIR, source) is None:
+        abort(404)
+    try:
+        current = fingerprinted(source)
+    except OSError:
+        abort(404)
+    if current != filename:
+        # An old fingerprint: its content is gone, and must not be cached under it
+        abort(404)
+    encodings = _available_encodings(source)
+    encoding = accepted_encoding(encodings)
+    response = Response(_encoded_asset(source, filename, encoding),
+                        mimetype=mimetypes.guess_type(source)[0] or "application/octet-stream")
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    if encodings:
+        response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    response.set_etag(f"{filename}-{encoding or 'identity'}")
+    return response.make_conditional(request)
+
+def init_app(app):
+    """Serve fingerprinted static files at /assets and link to them from the templates"""
+    app.add_url_rule("/assets/<path:filename>", "assets", serve_asset)
+    app.jinja_env.globals["url_for"] = asset_url_for
+
+def _static_files():
+    """Paths of the static files relative to STATIC_DIR, in a stable order"""
+    filenames = []
+    for directory, _, files in os.walk(STATIC_DIR):
+        filenames += [os.path.relpath(os.path.join(directory, file), STATIC_DIR).replace(os.sep, "/")
+                      for file in files]
+    return sorted(filenames)
+
+def build(target=STATIC_BUILD_DIR):
+    """Write a fingerprinted copy of every static file, and its compressed copies, to target"""
+    written = []
+    for filename in _static_files():
+        name = fingerprinted(filename)
+        with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+            data = f.read()
+        copies = {"": data}
+        if os.path.splitext(filename)[1] in COMPRESSED_EXTENSIONS:
+            for encoding, suffix in ENCODINGS.items():
+                if encoding == "gzip" or _brotli_installed():
+                    copies[suffix] = _compress(data, encoding)
+        for suffix, content in copies.items():
+            path = os.path.join(target, name + suffix)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(content)
+        written.append(name)
+    return written
+
+if __name__ == '__main__':
+    # Build step: precompress the static files bundled with a deploy
+    for name in build():
+        print(f"Wrote {name} to {STATIC_BUILD_DIR}")
@@ -0,0 +1,260 @@
+import base64
+import binascii
+import os
+import threading
+import data_store
+from data_store import UsernameTakenError
+
+# Storage engine selection: "json" (data/*.json files) or "sqlite"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
+SQLITE_PATH = os.environ.get("SQLITE_PATH", os.path.join(data_store.DATA_DIR, "socialfeed.db"))
+
+_storage = None
+_storage_lock = threading.Lock()
+
+class StorageBackend:
+    """Operations the routes need from a storage engine"""
+
+    def get_user_by_id(self, user_id):
+        """Get user by ID, or None"""
+        raise NotImplementedError
+
+    def get_user_by_username(self, username):
+        """Get user by username, or None"""
+        raise NotImplementedError
+
+    def create_user(self, user):
+        """Store a new user, assigning its id, and return it
+
+        Raises UsernameTakenError if the username is already registered.
+        """
+        raise NotImplementedError
+
+    def update_password_hash(self, user_id, password_hash):
+        """Replace a user's stored password hash"""
+        raise NotImplementedError
+
+    def follow_user(self, follower_id, followee_id):
+        """Start following a user; returns False if already following"""
+        raise NotImplementedError
+
+    def unfollow_user(self, follower_id, followee_id):
+        """Stop following a user; returns False if not following"""
+        raise NotImplementedError
+
+    def get_following(self, user_id):
+        """Get the set of ids of the users a user follows"""
+        raise NotImplementedError
+
+    def get_follower_count(self, user_id):
+        """Count a user's followers"""
+        raise NotImplementedError
+
+    def get_recent_posts(self, limit=None, before=None):
+        """Get posts newest first, older than the (timestamp, id) key before"""
+        raise NotImplementedError
+
+    def get_home_timeline(self, user_id, limit=None, before=None):
+        """Get the posts of a user and the users they follow newest first, older than the (timestamp, id) key before
+
+        Each user's newest HOME_TIMELINE_SIZE posts are kept as a timeline that
+        new posts are copied into, so a page is one bounded read. SQLite
+        stores the timelines; the JSON engine builds one in memory on a user's
+        first read in each process and rebuilds it after a reload or when the
+        user's followed authors change. Authors with FANOUT_FOLLOWER_LIMIT or
+        more followers are merged in when read instead.
+        """
+        raise NotImplementedError
+
+    def get_trending_posts(self, window, limit):
+        """Get (post, score) pairs for the highest scoring posts in a window, best first
+
+        Likes, reactions and comments add to a post's score for every window
+        in TRENDING_WINDOWS, decaying by half every quarter window.
+        """
+        raise NotImplementedError
+
+    def get_posts_by_user(self, user_id, limit=None, before=None):
+        """Get a user's posts newest first, older than the (timestamp, id) key before"""
+        raise NotImplementedError
+
+    def get_user_stats(self, user_id):
+        """Count a user's posts and the likes and comments they received"""
+        raise NotImplementedError
+
+    def get_post_by_id(self, post_id):
+        """Get post by ID, or None"""
+        raise NotImplementedError
+
+    def get_posts_by_ids(self, post_ids):
+        """Get the posts that exist among post_ids, as a dict by id"""
+        raise NotImplementedError
+
+    def add_post(self, post):
+        """Store a new post and return it"""
+        raise NotImplementedError
+
+    def apply_mutations(self, mutations):
+        """Apply post mutations in order with a single durable write
+
+        Each mutation is a dict with 'op', 'post_id' and 'user_id': op is
+        'like', 'unlike', 'react' (with a 'reaction') or 'comment' (with a
+        'comment' dict). Mutations of missing posts are skipped. Returns the
+        updated posts as a dict by id.
+        """
+        raise NotImplementedError
+
+    def like_post(self, post_id, user_id):
+        """Record a like and return the updated post"""
+        return self.apply_mutations([{'op': 'like', 'post_id': post_id, 'user_id': user_id}]).get(post_id)
+
+    def unlike_post(self, post_id, user_id):
+        """Remove a like and return the updated post"""
+        return self.apply_mutations([{'op': 'unlike', 'post_id': post_id, 'user_id': user_id}]).get(post_id)
+
+    def react_to_post(self, post_id, user_id, reaction):
+        """Set the user's reaction and return the updated post"""
+        return self.apply_mutations([{'op': 'react', 'post_id': post_id, 'user_id': user_id,
+                                      'reaction': reaction}]).get(post_id)
+
+    def add_post_comment(self, post_id, comment):
+        """Store a comment dict and return the updated post"""
+        return self.apply_mutations([{'op': 'comment', 'post_id': post_id, 'user_id': comment['user_id'],
+                                      'comment': comment}]).get(post_id)
+
+    def get_post_comments(self, post_id, limit=None, before=None):
+        """Get a post's comments newest first, older than the (timestamp, id) key before"""
+        raise NotImplementedError
+
+    def get_data_version(self):
+        """Opaque version of all posts, changed by every write"""
+        raise NotImplementedError
+
+    def get_user_version(self, user_id):
+        """Opaque version of a user's posts and the likes, reactions and comments on them"""
+        raise NotImplementedError
+
+    def search_posts(self, terms, limit=None, before=None):
+        """Get (rank key, post) pairs for posts matching every term, best first.
+
+        A rank key is (tier, timestamp, id): posts whose content has every
+        term (tier 0) come before posts that match only with their comments,
+        newest first within a tier. before is the key of the last result shown.
+        """
+        raise NotImplementedError
+
+class JSONStorage(StorageBackend):
+    """Storage in data/users.json, data/posts.json and data/follows.json via data_store"""
+
+    def get_user_by_id(self, user_id):
+        return data_store.get_user_by_id(user_id)
+
+    def get_user_by_username(self, username):
+        return data_store.get_user_by_username(username)
+
+    def create_user(self, user):
+        return data_store.create_user(user)
+
+    def update_password_hash(self, user_id, password_hash):
+        user = data_store.get_user_by_id(user_id)
+        if user is not None:
+            user.password_hash = password_hash
+            data_store.save_user(user)
+
+    def follow_user(self, follower_id, followee_id):
+        return data_store.follow_user(follower_id, followee_id)
+
+    def unfollow_user(self, follower_id, followee_id):
+        return data_store.unfollow_user(follower_id, followee_id)
+
+    def get_following(self, user_id):
+        return data_store.get_following(user_id)
+
+    def get_follower_count(self, user_id):
+        return data_store.get_follower_count(user_id)
+
+    def get_recent_posts(self, limit=None, before=None):
+        return data_store.get_recent_posts(limit, before)
+
+    def get_home_timeline(self, user_id, limit=None, before=None):
+        return data_store.get_home_timeline(user_id, limit, before)
+
+    def get_trending_posts(self, window, limit):
+        return data_store.get_trending_posts(window, limit)
+
+    def get_posts_by_user(self, user_id, limit=None, before=None):
+        return data_store.get_posts_by_user(user_id, limit, before)
+
+    def get_user_stats(self, user_id):
+        return data_store.get_user_stats(user_id)
+
+    def get_post_by_id(self, post_id):
+        return data_store.get_post_by_id(post_id)
+
+    def add_post(self, post):
+        return data_store.add_post(post)
+
+    def get_posts_by_ids(self, post_ids):
+        return data_store.get_posts_by_ids(post_ids)
+
+    def apply_mutations(self, mutations):
+        return data_store.apply_mutations(mutations)
+
+    def get_post_comments(self, post_id, limit=None, before=None):
+        return data_store.get_post_comments(post_id, limit, before)
+
+    def get_data_version(self):
+        return data_store.get_data_version()
+
+    def get_user_version(self, user_id):
+        return data_store.get_user_version(user_id)
+
+    def search_posts(self, terms, limit=None, before=None):
+        return data_store.search_posts(terms, limit, before)
+
+def encode_cursor(timestamp, item_id):
+    """Encode a (timestamp, id) sort key as an opaque page cursor"""
+    key = f"{timestamp}|{item_id}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Decode a page cursor back into a (timestamp, id) key"""
+    try:
+        key = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    timestamp, sep, post_id = key.partition("|")
+    if not sep:
+        raise ValueError("Invalid cursor")
+    return (timestamp, post_id)
+
+def encode_search_cursor(key):
+    """Encode a search rank key (tier, timestamp, id) as a page cursor"""
+    tier, timestamp, post_id = key
+    return encode_cursor(f"{tier}:{timestamp}", post_id)
+
+def decode_search_cursor(cursor):
+    """Decode a search page cursor back into a (tier, timestamp, id) key"""
+    ranked_timestamp, post_id = decode_cursor(cursor)
+    tier, sep, timestamp = ranked_timestamp.partition(":")
+    if not sep or not tier.isdigit():
+        raise ValueError("Invalid cursor")
+    return (int(tier), timestamp, post_id)
+
+def create_storage(backend=STORAGE_BACKEND):
+    """Create a storage engine by name"""
+    if backend == "json":
+        return JSONStorage()
+    if backend == "sqlite":
+        from sqlite_store import SQLiteStorage
+        return SQLiteStorage(SQLITE_PATH)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+def get_storage():
+    """Get the configured storage engine"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
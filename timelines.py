@@ -0,0 +1,32 @@
+import heapq
+import os
+
+# Newest posts kept in each user's home timeline; older pages are merged
+# from the followed authors' posts when read
+HOME_TIMELINE_SIZE = int(os.environ.get("HOME_TIMELINE_SIZE", 800))
+# Authors with at least this many followers are not copied into their
+# followers' timelines on every post; their posts are merged in on read
+FANOUT_FOLLOWER_LIMIT = int(os.environ.get("FANOUT_FOLLOWER_LIMIT", 1000))
+
+def split_authors(user_id, following, follower_count):
+    """Split the authors of a user's home timeline into (fanned out on write, merged on read)
+
+    The timeline shows the user's own posts and those of everyone they
+    follow; follower_count(author_id) decides which way each author goes.
+    """
+    fanned_out, merged = set(), set()
+    for author_id in set(following) | {user_id}:
+        (merged if follower_count(author_id) >= FANOUT_FOLLOWER_LIMIT else fanned_out).add(author_id)
+    return fanned_out, merged
+
+def merge_newest(key_lists, limit=None):
+    """Merge newest-first lists of (timestamp, id) keys into one, skipping repeated ids"""
+    keys, seen = [], set()
+    for key in heapq.merge(*key_lists, reverse=True):
+        if key[1] in seen:
+            continue
+        seen.add(key[1])
+        keys.append(key)
+        if limit is not None and len(keys) >= limit:
+            break
+    return keys
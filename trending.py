@@ -0,0 +1,237 @@
+import bisect
+import os
+import time
+from collections import deque
+from datetime import datetime
+
+# Windows posts can trend over, in seconds. An interaction's weight halves
+# every quarter window, so one from a full window ago counts 1/16.
+TRENDING_WINDOWS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+DEFAULT_WINDOW = os.environ.get("TRENDING_DEFAULT_WINDOW", "day")
+# Score each interaction adds; unliking takes a like's weight back, as of
+# when the like was given
+WEIGHTS = {"like": 1, "unlike": -1, "react": 1, "comment": 3}
+# Scores are stored multiplied by 2 ** (half-lives since a base time), so
+# older interactions never need decaying and the order only changes on new
+# ones. Past this many half-lives the scores are divided down to a new base
+# before they overflow.
+REBASE_HALF_LIVES = 64
+
+def half_life(window):
+    return TRENDING_WINDOWS[window] / 4
+
+def growth(window, base, at):
+    """Factor an interaction at time at is stored with, for scores relative to base"""
+    return 2 ** ((at - base) / half_life(window))
+
+def decay(window, base, at):
+    """Factor turning a score relative to base into its value at time at
+
+    Unlike 1 / growth it reaches 0 rather than overflowing when at is many
+    half-lives past base, as after days without any interaction.
+    """
+    return 2 ** -((at - base) / half_life(window))
+
+def needs_rebase(window, base, at):
+    return at - base > REBASE_HALF_LIVES * half_life(window)
+
+# Seconds a like's time is remembered for its unlike. Past this it adds
+# under 2 ** -16 of its weight to any window, and an unlike takes it back
+# as of the post's time, as a like whose time is not stored counts from.
+LIKE_TIME_HORIZON = 16 * half_life(max(TRENDING_WINDOWS, key=TRENDING_WINDOWS.get))
+
+def to_epoch(timestamp):
+    """Seconds since the epoch for a stored ISO timestamp, or now if it has none"""
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+def stored_engagement(post_id, timestamp, interactions, comment_timestamps, other_comments=0):
+    """(post_id, weight, at) interactions for engagement already stored on a post
+
+    When likes and reactions were given is not stored, so those count from
+    the post's own time, as do comments whose timestamps are not at hand.
+    """
+    engagement = []
+    weight = WEIGHTS["like"] * interactions + WEIGHTS["comment"] * other_comments
+    if weight:
+        engagement.append((post_id, weight, to_epoch(timestamp)))
+    for comment_timestamp in comment_timestamps:
+        engagement.append((post_id, WEIGHTS["comment"], to_epoch(comment_timestamp)))
+    return engagement
+
+def engagement_weight(post):
+    """Trending weight of all the engagement a post has"""
+    return WEIGHTS["like"] * post.interaction_count + WEIGHTS["comment"] * post.comment_count
+
+class TrendingIndex:
+    """Time-decayed engagement scores per window, each kept in a sorted list.
+
+    Recording an interaction is O(log n) plus a list insert; reading the top
+    K posts is a slice of the sorted list.
+    """
+
+    def __init__(self, now=None):
+        now = time.time() if now is None else now
+        # window -> (base time, post_id -> stored score, ascending (-score, post_id) keys)
+        self._windows = {window: (now, {}, []) for window in TRENDING_WINDOWS}
+
+    def record(self, post_id, weight, at=None):
+        """Add weight to a post's score for an interaction at time at"""
+        at = time.time() if at is None else at
+        for window in TRENDING_WINDOWS:
+            base, scores, ranked = self._windows[window]
+            if needs_rebase(window, base, at):
+                base, scores, ranked = self._rebase(window, at)
+            old = scores.get(post_id)
+            if old is not None:
+                del ranked[bisect.bisect_left(ranked, (-old, post_id))]
+            score = max((old or 0) + weight * growth(window, base, at), 0)
+            if score > 0:
+                scores[post_id] = score
+                bisect.insort(ranked, (-score, post_id))
+            else:
+                scores.pop(post_id, None)
+
+    def record_many(self, interactions):
+        """Add (post_id, weight, at) interactions at once, sorting each window just once"""
+        interactions = list(interactions)
+        latest = max((at for _, _, at in interactions), default=None)
+        for window in TRENDING_WINDOWS:
+            base, scores, ranked = self._windows[window]
+            if latest is not None and needs_rebase(window, base, latest):
+                base, scores, ranked = self._rebase(window, latest)
+            for post_id, weight, at in interactions:
+                scores[post_id] = scores.get(post_id, 0) + weight * growth(window, base, at)
+            scores = {post_id: score for post_id, score in scores.items() if score > 0}
+            self._windows[window] = (base, scores, sorted((-score, post_id) for post_id, score in scores.items()))
+
+    def _rebase(self, window, now):
+        """Divide a window's scores down to a base of now"""
+        base, scores, ranked = self._windows[window]
+        factor = decay(window, base, now)
+        scores = {post_id: score * factor for post_id, score in scores.items() if score * factor > 0}
+        # Scores that became equal are now ordered by id, so re-sort
+        ranked = sorted((-score, post_id) for post_id, score in scores.items())
+        self._windows[window] = (now, scores, ranked)
+        return self._windows[window]
+
+    def top(self, window, limit):
+        """The limit best (post_id, current score) pairs in a window, best first"""
+        base, _, ranked = self._windows[window]
+        factor = decay(window, base, time.time())
+        return [(post_id, -score * factor) for score, post_id in ranked[:limit]]
+
+
+class TrendingScores:
+    """Trending scores of posts stored as snapshot files plus a replayed journal
+
+    The scores are built on first use and carried across snapshot reloads.
+    Another process may compact journal records into the snapshot before
+    this one replays them, and a reload replays records this one already
+    counted, so each reload is synced. Invariants:
+
+    - counted maps a post id to the total weight recorded for it, so a post
+      is only ever scored by what it has beyond that
+    - files are the snapshot files all of whose posts are counted; a file
+      is never changed, so one counted before has nothing new
+    - liked_at holds the time of each like replayed within
+      LIKE_TIME_HORIZON and not since unliked
+    """
+
+    def __init__(self):
+        self.index = None
+        self._counted = {}
+        self._files = set()
+        self._liked_at = {}
+        # (at, (post_id, user_id)) of remembered likes, oldest first
+        self._like_times = deque()
+
+    @property
+    def built(self):
+        return self.index is not None
+
+    def engagement(self, post_id, op, at, user_id=None, posted_at=None):
+        """The (post_id, weight, at) an interaction adds; an unlike is timed as its like"""
+        key = (post_id, user_id)
+        if op == "like":
+            self._liked_at[key] = at
+            self._like_times.append((at, key))
+            while self._like_times and self._like_times[0][0] < at - LIKE_TIME_HORIZON:
+                old_at, old_key = self._like_times.popleft()
+                if self._liked_at.get(old_key) == old_at:
+                    del self._liked_at[old_key]
+        elif op == "unlike":
+            at = self._liked_at.pop(key, posted_at if posted_at is not None else at)
+        return post_id, WEIGHTS[op], at
+
+    def record(self, post_id, weight, at):
+        """Add an interaction to built scores"""
+        self.index.record(post_id, weight, at)
+        self._counted[post_id] = self._counted.get(post_id, 0) + weight
+
+    def sync(self, snapshot, engagements, snapshot_post):
+        """Build or bring the scores up to date with a snapshot and the engagements replayed on top of it
+
+        snapshot maps each snapshot file to a function returning its posts,
+        engagements are (post_id, weight, at) interactions replayed since
+        the snapshot, and snapshot_post(post_id) is a post's snapshot
+        version, or None.
+        """
+        if self.index is None:
+            self.index = TrendingIndex()
+            interactions = self._score(snapshot, engagements)
+        else:
+            interactions = self._reconcile(snapshot, engagements, snapshot_post)
+        self.index.record_many(interactions)
+        self._files = set(snapshot)
+
+    def _score(self, snapshot, engagements):
+        """Interactions for every post of a first snapshot, counting them"""
+        interactions = []
+        for posts in snapshot.values():
+            for post in posts():
+                self._counted[post.id] = engagement_weight(post)
+                interactions += stored_engagement(post.id, post.timestamp, post.interaction_count,
+                                                  [comment.get("timestamp") for comment in post.comments],
+                                                  post.comment_count - len(post.comments))
+        for post_id, weight, _ in engagements:
+            self._counted[post_id] = self._counted.get(post_id, 0) + weight
+        return interactions + list(engagements)
+
+    def _reconcile(self, snapshot, engagements, snapshot_post):
+        """Interactions for the weight each changed or replayed post has beyond what was counted
+
+        That is recorded as the engagements replayed last, if they add up to
+        it, or else as of now: it was compacted in by another process.
+        """
+        replayed = {}
+        for engagement in engagements:
+            replayed.setdefault(engagement[0], []).append(engagement)
+        changed = {post.id: post for file, posts in snapshot.items() if file not in self._files
+                   for post in posts()}
+        interactions = []
+        now = time.time()
+        for post_id in changed.keys() | replayed.keys():
+            post = changed[post_id] if post_id in changed else snapshot_post(post_id)
+            post_engagements = replayed.get(post_id, [])
+            weight = ((engagement_weight(post) if post is not None else 0)
+                      + sum(weight for _, weight, _ in post_engagements))
+            added = weight - self._counted.get(post_id, 0)
+            if not added:
+                continue
+            self._counted[post_id] = weight
+            total = 0
+            for start in range(len(post_engagements) - 1, -1, -1):
+                total += post_engagements[start][1]
+                if total == added:
+                    interactions += post_engagements[start:]
+                    break
+            else:
+                interactions.append((post_id, added, now))
+        return interactions
+
+    def top(self, window, limit):
+        """The limit best (post_id, current score) pairs in a window, best first"""
+        return self.index.top(window, limit)